@@ -67,19 +67,28 @@ public class ImageProcessingController {
         @Parameter(description = "Image file to process (JPG, PNG, JPEG)", required = true)
         @RequestParam("image") MultipartFile imageFile,
         
-        @Parameter(description = "Minimum face size (default: 10)", required = false)
-        @RequestParam(value = "minSize", defaultValue = "10") int minSize,
+        @Parameter(description = "Minimum face size (default: 10, or the profile's value when a profile is given)", required = false)
+        @RequestParam(value = "minSize", required = false) Integer minSize,
         
-        @Parameter(description = "Scale factor for detection (default: 1.1)", required = false)
-        @RequestParam(value = "scaleFactor", defaultValue = "1.1") double scaleFactor,
+        @Parameter(description = "Scale factor for detection (default: 1.1, or the profile's value when a profile is given)", required = false)
+        @RequestParam(value = "scaleFactor", required = false) Double scaleFactor,
         
-        @Parameter(description = "Minimum neighbors (default: 1)", required = false)
-        @RequestParam(value = "minNeighbors", defaultValue = "1") int minNeighbors
+        @Parameter(description = "Minimum neighbors (default: 1, or the profile's value when a profile is given)", required = false)
+        @RequestParam(value = "minNeighbors", required = false) Integer minNeighbors,
+        
+        @Parameter(description = "Detection profile: fast, balanced, thorough or a tuned profile (default: configured profile)", required = false)
+        @RequestParam(value = "profile", required = false) String profile,
+        
+        @Parameter(description = "Smallest face as a fraction of the shorter image side, e.g. 0.05 (optional)", required = false)
+        @RequestParam(value = "minFaceRatio", required = false) Double minFaceRatio,
+        
+        @Parameter(description = "Largest face as a fraction of the longer image side, e.g. 0.4 (optional)", required = false)
+        @RequestParam(value = "maxFaceRatio", required = false) Double maxFaceRatio
     ) {
         
         // Process the image and detect faces
         FaceDetectionResponse response = imageProcessingService.detectFaces(
-            imageFile, minSize, scaleFactor, minNeighbors
+            imageFile, minSize, scaleFactor, minNeighbors, profile, minFaceRatio, maxFaceRatio
         );
         
         return ResponseEntity.ok(response);
@@ -126,6 +135,21 @@ public class ImageProcessingController {
                 public final int minValue = 1;
                 public final int maxValue = 10;
             };
+            public final Object minFaceRatio = new Object() {
+                public final String description = "Smallest face as a fraction of the shorter image side; skips finer pyramid levels";
+                public final double minValue = 0.0;
+                public final double maxValue = 1.0;
+            };
+            public final Object maxFaceRatio = new Object() {
+                public final String description = "Largest face as a fraction of the longer image side; skips coarser pyramid levels";
+                public final double minValue = 0.0;
+                public final double maxValue = 1.0;
+            };
+            public final Object profile = new Object() {
+                public final String description = "Speed/recall preset: preprocessing, detection passes and overlap filtering";
+                public final String defaultValue = "thorough";
+                public final String[] values = {"fast", "balanced", "thorough"};
+            };
         });
     }
 }
@@ -0,0 +1,107 @@
+package com.facedetect.service;
+
+import java.io.ByteArrayInputStream;
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.util.ArrayList;
+import java.util.List;
+
+import com.facedetect.dto.FaceCoordinate;
+import com.facedetect.dto.FaceDetectionResponse;
+import com.facedetect.dto.FaceDetectionResponse.FaceDetectionData;
+import com.fasterxml.jackson.databind.JsonNode;
+import com.fasterxml.jackson.databind.ObjectMapper;
+
+/**
+ * Binary detection record written by the Python scripts with output format "binary"
+ *
+ * Layout (little endian): magic "FDR1", version u8, flags u8 (bit 0: success),
+ * reserved u16, face count u32, image width u32, image height u32, metadata
+ * length u32; then face count x 4 int32 (x, y, width, height); then the
+ * remaining result fields as UTF-8 JSON. See python-scripts/output_format.py.
+ *
+ * @author Nguyen Tuan Khanh
+ */
+final class BinaryDetectionRecord {
+
+    static final int MAGIC_SIZE = 4;
+
+    static final int HEADER_SIZE = 24;
+
+    private static final byte[] MAGIC = {'F', 'D', 'R', '1'};
+
+    private static final int VERSION = 1;
+
+    private static final int FLAG_SUCCESS = 0x01;
+
+    private static final int BOX_SIZE = 16;
+
+    private BinaryDetectionRecord() {
+    }
+
+    /**
+     * Whether the data starts with the binary record magic
+     */
+    static boolean isBinary(byte[] data) {
+        if (data == null || data.length < MAGIC_SIZE) {
+            return false;
+        }
+        for (int i = 0; i < MAGIC_SIZE; i++) {
+            if (data[i] != MAGIC[i]) {
+                return false;
+            }
+        }
+        return true;
+    }
+
+    /**
+     * Number of bytes following a header: the box array and the metadata
+     *
+     * @param header At least HEADER_SIZE bytes starting with the magic
+     */
+    static int bodyLength(byte[] header) throws IOException {
+        ByteBuffer buffer = ByteBuffer.wrap(header).order(ByteOrder.LITTLE_ENDIAN);
+        long faceCount = Integer.toUnsignedLong(buffer.getInt(8));
+        long metadataLength = Integer.toUnsignedLong(buffer.getInt(20));
+        long length = faceCount * BOX_SIZE + metadataLength;
+        if (length > Integer.MAX_VALUE - HEADER_SIZE) {
+            throw new IOException("Binary detection record too large: " + length + " bytes");
+        }
+        return (int) length;
+    }
+
+    /**
+     * Convert a complete record into the API response
+     */
+    static FaceDetectionResponse toResponse(byte[] record, ObjectMapper objectMapper) throws IOException {
+        if (record.length < HEADER_SIZE || record.length < HEADER_SIZE + bodyLength(record)) {
+            throw new IOException("Truncated binary detection record");
+        }
+
+        ByteBuffer buffer = ByteBuffer.wrap(record).order(ByteOrder.LITTLE_ENDIAN);
+        int version = buffer.get(4) & 0xFF;
+        if (version != VERSION) {
+            throw new IOException("Unsupported binary detection record version: " + version);
+        }
+        boolean success = (buffer.get(5) & FLAG_SUCCESS) != 0;
+        int faceCount = buffer.getInt(8);
+        int metadataLength = buffer.getInt(20);
+        int metadataOffset = HEADER_SIZE + faceCount * BOX_SIZE;
+
+        JsonNode metadata = objectMapper.readTree(new ByteArrayInputStream(record, metadataOffset, metadataLength));
+        String message = metadata.path("message").asText();
+
+        if (!success) {
+            return FaceDetectionResponse.error(message);
+        }
+
+        List<FaceCoordinate> faces = new ArrayList<>(faceCount);
+        buffer.position(HEADER_SIZE);
+        for (int i = 0; i < faceCount; i++) {
+            faces.add(new FaceCoordinate(buffer.getInt(), buffer.getInt(), buffer.getInt(), buffer.getInt()));
+        }
+
+        return FaceDetectionResponse.success(message, new FaceDetectionData(faceCount, faces));
+    }
+}
@@ -14,12 +14,18 @@ public interface ImageProcessingService {
      * Detect faces in uploaded image
      * 
      * @param imageFile Uploaded image file
-     * @param minSize Minimum face size in pixels
-     * @param scaleFactor Scale factor for detection
-     * @param minNeighbors Minimum neighbors for detection
+     * @param minSize Minimum face size in pixels, or null
+     * @param scaleFactor Scale factor for detection, or null
+     * @param minNeighbors Minimum neighbors for detection, or null
+     * @param profile Detection profile (fast, balanced, thorough or a tuned profile), or null for the
+     *                configured default; parameters left null take the profile's values when a profile
+     *                is given, and the historical API defaults otherwise
+     * @param minFaceRatio Smallest face as a fraction of the shorter image side, or null
+     * @param maxFaceRatio Largest face as a fraction of the longer image side, or null
      * @return Face detection response
      */
-    FaceDetectionResponse detectFaces(MultipartFile imageFile, int minSize, double scaleFactor, int minNeighbors);
+    FaceDetectionResponse detectFaces(MultipartFile imageFile, Integer minSize, Double scaleFactor, Integer minNeighbors,
+                                      String profile, Double minFaceRatio, Double maxFaceRatio);
     
     /**
      * Validate if file is a valid image
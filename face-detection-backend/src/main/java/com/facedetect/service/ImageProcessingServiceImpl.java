@@ -4,13 +4,15 @@ import java.io.BufferedReader;
 import java.io.IOException;
 import java.io.InputStream;
 import java.io.InputStreamReader;
-import java.nio.file.Files;
-import java.nio.file.Path;
-import java.nio.file.Paths;
+import java.io.OutputStream;
+import java.nio.charset.StandardCharsets;
 import java.util.ArrayList;
 import java.util.Arrays;
+import java.util.Base64;
 import java.util.List;
-import java.util.UUID;
+import java.util.regex.Pattern;
+
+import javax.annotation.PostConstruct;
 
 import org.slf4j.Logger;
 import org.slf4j.LoggerFactory;
@@ -23,6 +25,7 @@ import com.facedetect.dto.FaceDetectionResponse;
 import com.facedetect.dto.FaceDetectionResponse.FaceDetectionData;
 import com.fasterxml.jackson.databind.JsonNode;
 import com.fasterxml.jackson.databind.ObjectMapper;
+import com.fasterxml.jackson.databind.node.ObjectNode;
 
 /**
  * Image processing service implementation
@@ -35,6 +38,8 @@ public class ImageProcessingServiceImpl implements ImageProcessingService {
     private static final Logger logger = LoggerFactory.getLogger(ImageProcessingServiceImpl.class);
     
     private final ObjectMapper objectMapper;
+    
+    private final PythonWorkerPool workerPool;
       // Configuration
     @Value("${app.python.script-path:../python-scripts/enhanced_face_detector.py}")
     private String pythonScriptPath;
@@ -42,38 +47,84 @@ public class ImageProcessingServiceImpl implements ImageProcessingService {
     @Value("${app.python.executable:python}")
     private String pythonExecutable;
     
-    @Value("${app.temp.directory:#{systemProperties['java.io.tmpdir']}}")
-    private String tempDirectory;
-    
     @Value("${app.max.file.size:10485760}") // 10MB default
     private long maxFileSize;
     
+    @Value("${app.python.workers.enabled:true}")
+    private boolean workersEnabled;
+    
+    // json or binary (see python-scripts/output_format.py); workers can only frame these
+    @Value("${app.python.output-format:json}")
+    private String outputFormat;
+    
+    private static final List<String> OUTPUT_FORMATS = Arrays.asList("json", "jsonl", "binary");
+    
+    // fast, balanced, thorough or a profile from the profiles file (see python-scripts/detection_engine.py)
+    @Value("${app.python.profile:thorough}")
+    private String defaultProfile;
+    
+    // Optional profile file, e.g. written by python-scripts/autotune.py
+    @Value("${app.python.profiles-file:}")
+    private String profilesFile;
+    
+    // Profile names are passed on the command line; the script rejects unknown ones
+    private static final Pattern PROFILE_NAME = Pattern.compile("[A-Za-z0-9_.-]{1,64}");
+    
+    // API defaults for requests that name neither parameters nor a profile
+    private static final int DEFAULT_MIN_SIZE = 10;
+    private static final double DEFAULT_SCALE_FACTOR = 1.1;
+    private static final int DEFAULT_MIN_NEIGHBORS = 1;
+    
     private static final List<String> ALLOWED_EXTENSIONS = Arrays.asList("jpg", "jpeg", "png", "bmp", "gif");
     private static final List<String> ALLOWED_MIME_TYPES = Arrays.asList(
         "image/jpeg", "image/jpg", "image/png", "image/bmp", "image/gif"
     );
     
-    public ImageProcessingServiceImpl() {
+    public ImageProcessingServiceImpl(PythonWorkerPool workerPool) {
         this.objectMapper = new ObjectMapper();
+        this.workerPool = workerPool;
+    }
+    
+    @PostConstruct
+    void validateConfiguration() {
+        // Any other encoding would desynchronize the worker pipe on the first response
+        if (!OUTPUT_FORMATS.contains(outputFormat)) {
+            throw new IllegalStateException("app.python.output-format must be one of " + OUTPUT_FORMATS
+                    + ", got: " + outputFormat);
+        }
     }
       @Override
-    public FaceDetectionResponse detectFaces(MultipartFile imageFile, int minSize, double scaleFactor, int minNeighbors) {
-        logger.info("Starting face detection for file: {} with params - minSize: {}, scaleFactor: {}, minNeighbors: {}", 
-                   imageFile.getOriginalFilename(), minSize, scaleFactor, minNeighbors);
+    public FaceDetectionResponse detectFaces(MultipartFile imageFile, Integer minSize, Double scaleFactor, Integer minNeighbors,
+                                             String profile, Double minFaceRatio, Double maxFaceRatio) {
+        if (profile == null || profile.isEmpty()) {
+            // Without a profile the request keeps the historical parameter defaults
+            profile = defaultProfile;
+            minSize = minSize != null ? minSize : DEFAULT_MIN_SIZE;
+            scaleFactor = scaleFactor != null ? scaleFactor : DEFAULT_SCALE_FACTOR;
+            minNeighbors = minNeighbors != null ? minNeighbors : DEFAULT_MIN_NEIGHBORS;
+        }
+        logger.info("Starting face detection for file: {} with params - minSize: {}, scaleFactor: {}, minNeighbors: {}, profile: {}, faceRatios: {}-{}", 
+                   imageFile.getOriginalFilename(), minSize, scaleFactor, minNeighbors, profile, minFaceRatio, maxFaceRatio);
         
         // Validate file
         if (!isValidImageFile(imageFile)) {
             return FaceDetectionResponse.error("Invalid image file");
         }
         
-        Path tempImagePath = null;
+        if (!PROFILE_NAME.matcher(profile).matches()) {
+            return FaceDetectionResponse.error("Unknown detection profile: " + profile);
+        }
+
         
         try {
-            // Save uploaded file to temporary location
-            tempImagePath = saveTemporaryFile(imageFile);
-            logger.debug("Temporary file saved: {}", tempImagePath);            // Execute Python script with parameters
-            String pythonOutput = executePythonScript(tempImagePath.toString(), minSize, scaleFactor, minNeighbors);
-            logger.debug("Python script output: {}", pythonOutput);
+            // Pass the upload to Python in memory; no temporary file is written
+            byte[] imageBytes = imageFile.getBytes();
+            
+            // Run detection on a persistent worker, or spawn the script per request
+            byte[] pythonOutput = workersEnabled
+                ? executeOnWorker(imageBytes, minSize, scaleFactor, minNeighbors, profile, minFaceRatio, maxFaceRatio)
+                : executePythonScript(imageBytes, minSize, scaleFactor, minNeighbors, profile, minFaceRatio, maxFaceRatio);
+            logger.debug("Python script output: {}", describeOutput(pythonOutput));
             
             // Parse Python output
             FaceDetectionResponse response = parsePythonOutput(pythonOutput);
@@ -85,12 +136,6 @@ public class ImageProcessingServiceImpl implements ImageProcessingService {
         } catch (Exception e) {
             logger.error("Error during face detection", e);
             return FaceDetectionResponse.error("Face detection failed: " + e.getMessage());
-            
-        } finally {
-            // Clean up temporary file
-            if (tempImagePath != null) {
-                cleanupTemporaryFile(tempImagePath);
-            }
         }
     }
     
@@ -129,65 +174,84 @@ public class ImageProcessingServiceImpl implements ImageProcessingService {
         
         return true;
     }
-      private Path saveTemporaryFile(MultipartFile file) throws IOException {
-        // Create temp directory if not exists
-        Path tempDir = Paths.get(tempDirectory);
-        if (!Files.exists(tempDir)) {
-            Files.createDirectories(tempDir);
-            logger.debug("Created temp directory: {}", tempDir.toAbsolutePath());
+    
+    private byte[] executeOnWorker(byte[] imageBytes, Integer minSize, Double scaleFactor, Integer minNeighbors,
+                                   String profile, Double minFaceRatio, Double maxFaceRatio) throws Exception {
+        ObjectNode request = objectMapper.createObjectNode();
+        request.put("command", "detect");
+        request.put("output_format", outputFormat);
+        request.put("image_base64", Base64.getEncoder().encodeToString(imageBytes));
+        request.put("profile", profile);
+        // Parameters left out take the profile's values
+        if (minSize != null) {
+            request.put("min_size", minSize);
         }
-        
-        // Generate unique filename with proper extension
-        String originalFilename = file.getOriginalFilename();
-        String extension = originalFilename != null && originalFilename.contains(".") 
-            ? originalFilename.substring(originalFilename.lastIndexOf(".")) 
-            : ".jpg";
-        
-        String uniqueFilename = "face_detection_" + UUID.randomUUID().toString() + extension;
-        Path tempPath = tempDir.resolve(uniqueFilename);
-        
-        // Save file
-        try (InputStream inputStream = file.getInputStream()) {
-            Files.copy(inputStream, tempPath);
+        if (scaleFactor != null) {
+            request.put("scale_factor", scaleFactor);
+        }
+        if (minNeighbors != null) {
+            request.put("min_neighbors", minNeighbors);
+        }
+        // Relative size bounds become minSize / maxSize per image (see python-scripts/detection_engine.py)
+        if (minFaceRatio != null) {
+            request.put("min_face_ratio", minFaceRatio);
+        }
+        if (maxFaceRatio != null) {
+            request.put("max_face_ratio", maxFaceRatio);
         }
         
-        logger.debug("Temporary file saved: {}", tempPath.toAbsolutePath());
-        
-        return tempPath;
-    }    private String executePythonScript(String imagePath, int minSize, double scaleFactor, int minNeighbors) throws IOException, InterruptedException {
-        // Convert to absolute path để đảm bảo Python script có thể tìm thấy file
-        Path imagePathObj = Paths.get(imagePath);
-        String absoluteImagePath = imagePathObj.toAbsolutePath().toString();
-        
-        // Build command with parameters using absolute path
-        ProcessBuilder processBuilder = new ProcessBuilder();
-        processBuilder.command(pythonExecutable, pythonScriptPath, absoluteImagePath, 
-                              "--min-size", String.valueOf(minSize),
-                              "--scale-factor", String.valueOf(scaleFactor), 
-                              "--min-neighbors", String.valueOf(minNeighbors));
+        logger.debug("Sending {} byte image to Python worker", imageBytes.length);
+        return workerPool.execute(request);
+    }
+    
+    private byte[] executePythonScript(byte[] imageBytes, Integer minSize, Double scaleFactor, Integer minNeighbors,
+                                       String profile, Double minFaceRatio, Double maxFaceRatio) throws IOException, InterruptedException {
+        // Build command with parameters; the image is piped through stdin
+        List<String> command = new ArrayList<>(Arrays.asList(pythonExecutable, pythonScriptPath, "--stdin",
+                              "--detection-profile", profile,
+                              "--output-format", outputFormat));
+        // Parameters left out take the profile's values
+        if (minSize != null) {
+            command.addAll(Arrays.asList("--min-size", String.valueOf(minSize)));
+        }
+        if (scaleFactor != null) {
+            command.addAll(Arrays.asList("--scale-factor", String.valueOf(scaleFactor)));
+        }
+        if (minNeighbors != null) {
+            command.addAll(Arrays.asList("--min-neighbors", String.valueOf(minNeighbors)));
+        }
+        if (minFaceRatio != null) {
+            command.addAll(Arrays.asList("--min-face-ratio", String.valueOf(minFaceRatio)));
+        }
+        if (maxFaceRatio != null) {
+            command.addAll(Arrays.asList("--max-face-ratio", String.valueOf(maxFaceRatio)));
+        }
+        ProcessBuilder processBuilder = new ProcessBuilder(command);
+        if (!profilesFile.isEmpty()) {
+            processBuilder.environment().put("FACE_DETECTION_PROFILES", profilesFile);
+        }
         
-        // Log paths for debugging
-        logger.info("Image path (relative): {}", imagePath);
-        logger.info("Image path (absolute): {}", absoluteImagePath);
         logger.info("Working directory: {}", System.getProperty("user.dir"));
-        logger.debug("Executing command: {} {} {} --min-size {} --scale-factor {} --min-neighbors {}", 
-                    pythonExecutable, pythonScriptPath, absoluteImagePath, minSize, scaleFactor, minNeighbors);
+        logger.debug("Executing command: {}", String.join(" ", command));
         
         // Start process
         Process process = processBuilder.start();
         
-        // Read output
-        StringBuilder output = new StringBuilder();
+        // Send image; the script reads all of stdin before writing any output
+        try (OutputStream stdin = process.getOutputStream()) {
+            stdin.write(imageBytes);
+        }
+        
+        // Read output; it may be a binary record, so it is kept as bytes
+        byte[] output;
         StringBuilder errorOutput = new StringBuilder();
         
-        try (BufferedReader reader = new BufferedReader(new InputStreamReader(process.getInputStream()));
+        try (InputStream stdout = process.getInputStream();
              BufferedReader errorReader = new BufferedReader(new InputStreamReader(process.getErrorStream()))) {
             
-            String line;
-            while ((line = reader.readLine()) != null) {
-                output.append(line).append("\n");
-            }
+            output = stdout.readAllBytes();
             
+            String line;
             while ((line = errorReader.readLine()) != null) {
                 errorOutput.append(line).append("\n");
             }
@@ -205,11 +269,15 @@ public class ImageProcessingServiceImpl implements ImageProcessingService {
             logger.warn("Python script stderr: {}", errorOutput.toString());
         }
         
-        return output.toString().trim();
+        return output;
     }
     
-    private FaceDetectionResponse parsePythonOutput(String pythonOutput) {
+    private FaceDetectionResponse parsePythonOutput(byte[] pythonOutput) {
         try {
+            if (BinaryDetectionRecord.isBinary(pythonOutput)) {
+                return BinaryDetectionRecord.toResponse(pythonOutput, objectMapper);
+            }
+            
             JsonNode rootNode = objectMapper.readTree(pythonOutput);
             
             boolean success = rootNode.get("success").asBoolean();
@@ -241,20 +309,16 @@ public class ImageProcessingServiceImpl implements ImageProcessingService {
             return FaceDetectionResponse.success(message, data);
             
         } catch (Exception e) {
-            logger.error("Error parsing Python output: {}", pythonOutput, e);
+            logger.error("Error parsing Python output: {}", describeOutput(pythonOutput), e);
             return FaceDetectionResponse.error("Failed to parse detection results");
         }
     }
     
-    private void cleanupTemporaryFile(Path tempPath) {
-        try {
-            if (Files.exists(tempPath)) {
-                Files.delete(tempPath);
-                logger.debug("Temporary file deleted: {}", tempPath);
-            }
-        } catch (IOException e) {
-            logger.warn("Failed to delete temporary file: {}", tempPath, e);
+    private String describeOutput(byte[] pythonOutput) {
+        if (BinaryDetectionRecord.isBinary(pythonOutput)) {
+            return "binary detection record, " + pythonOutput.length + " bytes";
         }
+        return new String(pythonOutput, StandardCharsets.UTF_8).trim();
     }
     
     private String getFileExtension(String filename) {
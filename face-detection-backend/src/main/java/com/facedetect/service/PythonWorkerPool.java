@@ -0,0 +1,354 @@
+package com.facedetect.service;
+
+import java.io.BufferedInputStream;
+import java.io.BufferedReader;
+import java.io.BufferedWriter;
+import java.io.ByteArrayOutputStream;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStreamWriter;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+import java.util.concurrent.BlockingQueue;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
+import java.util.concurrent.LinkedBlockingQueue;
+import java.util.concurrent.ScheduledExecutorService;
+import java.util.concurrent.TimeUnit;
+import java.util.concurrent.TimeoutException;
+
+import javax.annotation.PostConstruct;
+import javax.annotation.PreDestroy;
+
+import org.slf4j.Logger;
+import org.slf4j.LoggerFactory;
+import org.springframework.beans.factory.annotation.Value;
+import org.springframework.stereotype.Component;
+
+import com.fasterxml.jackson.databind.JsonNode;
+import com.fasterxml.jackson.databind.ObjectMapper;
+import com.fasterxml.jackson.databind.node.ObjectNode;
+
+/**
+ * Pool of long-lived Python detection workers
+ *
+ * Each worker runs the detection script in --serve mode, so the interpreter,
+ * OpenCV and the Haar Cascade are loaded once instead of once per request.
+ * Requests are sent as one JSON object per line. Responses are JSON lines,
+ * or self-delimiting binary records when the request asks for
+ * "output_format": "binary" (see BinaryDetectionRecord).
+ *
+ * @author Nguyen Tuan Khanh
+ */
+@Component
+public class PythonWorkerPool {
+
+    private static final Logger logger = LoggerFactory.getLogger(PythonWorkerPool.class);
+
+    private final ObjectMapper objectMapper = new ObjectMapper();
+
+    // Configuration
+    @Value("${app.python.script-path:../python-scripts/enhanced_face_detector.py}")
+    private String pythonScriptPath;
+
+    @Value("${app.python.executable:python}")
+    private String pythonExecutable;
+
+    @Value("${app.python.timeout:30000}")
+    private long requestTimeoutMs;
+
+    @Value("${app.python.profiles-file:}")
+    private String profilesFile;
+
+    @Value("${app.python.workers.enabled:true}")
+    private boolean enabled;
+
+    @Value("${app.python.workers.size:2}")
+    private int poolSize;
+
+    @Value("${app.python.workers.startup-timeout:30000}")
+    private long startupTimeoutMs;
+
+    @Value("${app.python.workers.health-check-interval:30000}")
+    private long healthCheckIntervalMs;
+
+    // Recent images per worker whose boxes are reused for near-duplicates; 0 disables (see python-scripts/perceptual_index.py)
+    @Value("${app.python.workers.near-duplicates.size:0}")
+    private int nearDuplicateSize;
+
+    @Value("${app.python.workers.near-duplicates.threshold:6}")
+    private int nearDuplicateThreshold;
+
+    @Value("${app.python.workers.near-duplicates.verify:false}")
+    private boolean nearDuplicateVerify;
+
+    private final BlockingQueue<PythonWorker> idleWorkers = new LinkedBlockingQueue<>();
+
+    private final ExecutorService ioExecutor = Executors.newCachedThreadPool(runnable -> {
+        Thread thread = new Thread(runnable, "python-worker-io");
+        thread.setDaemon(true);
+        return thread;
+    });
+
+    private ScheduledExecutorService healthChecker;
+
+    @PostConstruct
+    public void start() {
+        if (!enabled) {
+            logger.info("Python worker pool disabled; the script is started per request");
+            return;
+        }
+
+        logger.info("Starting {} Python detection workers: {} {} --serve", poolSize, pythonExecutable, pythonScriptPath);
+
+        for (int i = 0; i < poolSize; i++) {
+            PythonWorker worker = new PythonWorker(i);
+            try {
+                worker.ensureStarted();
+            } catch (Exception e) {
+                // The worker is started again lazily on first use
+                logger.warn("Python worker {} failed to start: {}", i, e.getMessage());
+            }
+            idleWorkers.offer(worker);
+        }
+
+        healthChecker = Executors.newSingleThreadScheduledExecutor(runnable -> {
+            Thread thread = new Thread(runnable, "python-worker-health");
+            thread.setDaemon(true);
+            return thread;
+        });
+        healthChecker.scheduleWithFixedDelay(this::checkIdleWorkers,
+                healthCheckIntervalMs, healthCheckIntervalMs, TimeUnit.MILLISECONDS);
+    }
+
+    @PreDestroy
+    public void shutdown() {
+        if (healthChecker != null) {
+            healthChecker.shutdownNow();
+        }
+
+        List<PythonWorker> workers = new ArrayList<>();
+        idleWorkers.drainTo(workers);
+        for (PythonWorker worker : workers) {
+            worker.stop();
+        }
+
+        ioExecutor.shutdownNow();
+        logger.info("Python detection workers stopped");
+    }
+
+    /**
+     * Send a request to an idle worker and wait for its response
+     *
+     * @param request Request object, serialized as a single JSON line
+     * @return Raw response: a JSON line or a binary detection record
+     */
+    public byte[] execute(ObjectNode request) throws IOException, InterruptedException, TimeoutException {
+        PythonWorker worker = idleWorkers.poll(requestTimeoutMs, TimeUnit.MILLISECONDS);
+        if (worker == null) {
+            throw new TimeoutException("No Python worker became available within " + requestTimeoutMs + " ms");
+        }
+
+        try {
+            return worker.call(objectMapper.writeValueAsString(request), requestTimeoutMs);
+        } catch (IOException | TimeoutException e) {
+            // Discard the process; it is restarted on next use
+            logger.warn("Python worker {} failed, restarting: {}", worker.id, e.getMessage());
+            worker.stop();
+            throw e;
+        } finally {
+            idleWorkers.offer(worker);
+        }
+    }
+
+    /**
+     * Ping every idle worker and restart the ones that do not answer
+     */
+    private void checkIdleWorkers() {
+        List<PythonWorker> workers = new ArrayList<>();
+        idleWorkers.drainTo(workers);
+
+        for (PythonWorker worker : workers) {
+            try {
+                if (!worker.isHealthy()) {
+                    logger.warn("Python worker {} is unhealthy, restarting", worker.id);
+                    worker.stop();
+                    worker.ensureStarted();
+                }
+            } catch (Exception e) {
+                logger.warn("Python worker {} could not be restarted: {}", worker.id, e.getMessage());
+                worker.stop();
+            } finally {
+                idleWorkers.offer(worker);
+            }
+        }
+    }
+
+    /**
+     * Command line of a worker process
+     */
+    private List<String> workerCommand() {
+        List<String> command = new ArrayList<>(List.of(pythonExecutable, pythonScriptPath, "--serve"));
+        if (nearDuplicateSize > 0) {
+            command.addAll(List.of("--near-dup-size", String.valueOf(nearDuplicateSize),
+                    "--near-dup-threshold", String.valueOf(nearDuplicateThreshold)));
+            if (nearDuplicateVerify) {
+                command.add("--near-dup-verify");
+            }
+        }
+        return command;
+    }
+
+    /**
+     * A single Python process speaking the worker protocol
+     */
+    private class PythonWorker {
+
+        private final int id;
+        private Process process;
+        private BufferedWriter writer;
+        private BufferedInputStream input;
+
+        PythonWorker(int id) {
+            this.id = id;
+        }
+
+        void ensureStarted() throws IOException, InterruptedException, TimeoutException {
+            if (process != null && process.isAlive()) {
+                return;
+            }
+
+            ProcessBuilder processBuilder = new ProcessBuilder(workerCommand());
+            if (!profilesFile.isEmpty()) {
+                // Loaded by detection_engine.py at start-up
+                processBuilder.environment().put("FACE_DETECTION_PROFILES", profilesFile);
+            }
+            process = processBuilder.start();
+            writer = new BufferedWriter(new OutputStreamWriter(process.getOutputStream(), StandardCharsets.UTF_8));
+            input = new BufferedInputStream(process.getInputStream());
+            drainErrorStream(process);
+
+            // The worker prints a "ready" line once the cascade is loaded
+            JsonNode ready;
+            try {
+                ready = objectMapper.readTree(readResponse(startupTimeoutMs));
+            } catch (IOException | TimeoutException e) {
+                stop();
+                throw e;
+            }
+            if (!ready.path("success").asBoolean(false)) {
+                stop();
+                throw new IOException("Python worker failed to start: " + ready.path("message").asText());
+            }
+
+            logger.info("Python worker {} ready (pid {})", id, process.pid());
+        }
+
+        byte[] call(String requestLine, long timeoutMs) throws IOException, InterruptedException, TimeoutException {
+            ensureStarted();
+            writer.write(requestLine);
+            writer.newLine();
+            writer.flush();
+            return readResponse(timeoutMs);
+        }
+
+        boolean isHealthy() throws InterruptedException {
+            if (process == null || !process.isAlive()) {
+                return false;
+            }
+
+            try {
+                JsonNode response = objectMapper.readTree(call("{\"command\":\"ping\"}", startupTimeoutMs));
+                return response.path("success").asBoolean(false);
+            } catch (IOException | TimeoutException e) {
+                return false;
+            }
+        }
+
+        void stop() {
+            if (process != null) {
+                process.destroyForcibly();
+                process = null;
+            }
+            writer = null;
+            input = null;
+        }
+
+        private byte[] readResponse(long timeoutMs) throws IOException, InterruptedException, TimeoutException {
+            final BufferedInputStream currentInput = input;
+            Future<byte[]> pending = ioExecutor.submit(() -> readRecord(currentInput));
+
+            byte[] response;
+            try {
+                response = pending.get(timeoutMs, TimeUnit.MILLISECONDS);
+            } catch (ExecutionException e) {
+                throw new IOException("Failed to read from Python worker", e.getCause());
+            } catch (TimeoutException e) {
+                pending.cancel(true);
+                throw new TimeoutException("Python worker did not respond within " + timeoutMs + " ms");
+            }
+
+            if (response == null) {
+                throw new IOException("Python worker exited unexpectedly");
+            }
+            return response;
+        }
+
+        /**
+         * Read one response: a binary detection record, or a JSON line without its newline
+         *
+         * @return Response bytes, or null at end of stream
+         */
+        private byte[] readRecord(BufferedInputStream stream) throws IOException {
+            stream.mark(BinaryDetectionRecord.MAGIC_SIZE);
+            byte[] magic = stream.readNBytes(BinaryDetectionRecord.MAGIC_SIZE);
+
+            if (BinaryDetectionRecord.isBinary(magic)) {
+                byte[] header = new byte[BinaryDetectionRecord.HEADER_SIZE];
+                System.arraycopy(magic, 0, header, 0, magic.length);
+                readFully(stream, header, magic.length, header.length - magic.length);
+
+                byte[] record = new byte[header.length + BinaryDetectionRecord.bodyLength(header)];
+                System.arraycopy(header, 0, record, 0, header.length);
+                readFully(stream, record, header.length, record.length - header.length);
+                return record;
+            }
+
+            // Not binary: rewind and read a JSON line
+            stream.reset();
+            ByteArrayOutputStream line = new ByteArrayOutputStream();
+            int next;
+            while ((next = stream.read()) != -1 && next != '\n') {
+                line.write(next);
+            }
+            if (next == -1 && line.size() == 0) {
+                return null;
+            }
+            return line.toByteArray();
+        }
+
+        private void readFully(BufferedInputStream stream, byte[] buffer, int offset, int length) throws IOException {
+            if (stream.readNBytes(buffer, offset, length) < length) {
+                throw new IOException("Python worker exited in the middle of a binary record");
+            }
+        }
+
+        private void drainErrorStream(Process workerProcess) {
+            ioExecutor.submit(() -> {
+                try (BufferedReader errorReader = new BufferedReader(
+                        new InputStreamReader(workerProcess.getErrorStream(), StandardCharsets.UTF_8))) {
+                    String line;
+                    while ((line = errorReader.readLine()) != null) {
+                        logger.debug("Python worker {} stderr: {}", id, line);
+                    }
+                } catch (IOException e) {
+                    // Stream closed when the process is stopped
+                }
+                return null;
+            });
+        }
+    }
+}
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Asyncio Face Detection
+Author: Nguyen Tuan Khanh
+Description: AsyncFaceDetector embeds the detector in asyncio services
+             (aiohttp and similar) without shelling out. Blocking OpenCV work
+             runs on the bounded thread pool of ThreadedFaceDetector; an
+             asyncio semaphore limits the detections queued or running, so
+             callers wait (backpressure) instead of piling work onto the pool.
+
+             Per-call timeouts and task cancellation free the caller
+             immediately and cancel detections that have not started. A
+             detectMultiScale call that is already running cannot be
+             interrupted; it finishes on its thread and the result is
+             discarded. Its semaphore slot is held until then, so the limit
+             always reflects the real load on the pool.
+Output: Same JSON schema as FaceDetector.detect_faces()
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from collections import deque
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Union
+
+from threaded_detector import ThreadedFaceDetector
+
+class AsyncFaceDetector:
+    """Awaitable face detection on a bounded thread pool"""
+
+    def __init__(self, cascade_path: str = None, workers: int = None, max_pending: int = None,
+                 timeout: float = None, opencv_threads: int = None, **detector_options):
+        """
+        Initialize detector
+
+        Args:
+            cascade_path: Path to Haar Cascade XML file
+            workers: Pool threads (default: CPU count)
+            max_pending: Detections queued or running at once; further calls
+                wait for a slot (default: 2 per worker)
+            timeout: Default seconds per detection, None for no limit
+            opencv_threads: cv2.setNumThreads value, see ThreadedFaceDetector
+            **detector_options: Passed to each thread's FaceDetector (e.g. timings, gate)
+        """
+        self._pool = ThreadedFaceDetector(cascade_path, workers, opencv_threads, **detector_options)
+        self.workers = self._pool.workers
+        self.max_pending = max_pending or self.workers * 2
+        self.timeout = timeout
+        # Created on first use so it binds to the loop that runs the detections
+        self._semaphore = None
+        self._in_flight = 0
+        self._counters = {"completed": 0, "timed_out": 0, "cancelled": 0}
+
+    def _slots(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+        return self._semaphore
+
+    async def detect(self, item: Any, timeout: float = None, **options) -> Dict[str, Any]:
+        """
+        Detect faces in one image array, file path or encoded bytes
+
+        Args:
+            item: Input accepted by FaceDetector.detect_batch()
+            timeout: Seconds to wait, overriding the default; the wait for a
+                free slot counts towards it
+            **options: Detection options, see FaceDetector.detect_faces_in_image()
+
+        Returns:
+            Detection result, or an error response if the timeout expired
+
+        Raises:
+            asyncio.CancelledError: If the calling task is cancelled
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(self._run(item, options), timeout)
+        except asyncio.TimeoutError:
+            self._counters["timed_out"] += 1
+            return {
+                "success": False,
+                "message": f"Face detection timed out after {timeout} seconds",
+                "data": {
+                    "face_count": 0,
+                    "faces": []
+                }
+            }
+        except asyncio.CancelledError:
+            self._counters["cancelled"] += 1
+            raise
+
+    async def _run(self, item: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Wait for a slot, then run the detection on the pool"""
+        semaphore = self._slots()
+        await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._pool.submit(item, **options)
+        except BaseException:
+            semaphore.release()
+            raise
+        self._in_flight += 1
+        # Release when the pool is really done with the task, not when the caller gives up
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        # Cancelling the wrapper cancels the pool future if it has not started
+        result = await asyncio.wrap_future(future)
+        self._counters["completed"] += 1
+        return result
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._semaphore.release()
+
+    async def iter_batch(self, images: Union[Iterable[Any], AsyncIterable[Any]], ordered: bool = True,
+                         timeout: float = None, **options) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Detect faces in many inputs with `async for`
+
+        At most max_pending inputs are taken from images ahead of the
+        consumer. Closing the generator (contextlib.aclosing, or when it is
+        garbage collected after leaving the loop early) cancels the
+        detections in flight.
+
+        Args:
+            images: Iterable or async iterable of image arrays, file paths or encoded bytes
+            ordered: Yield in input order; otherwise in completion order
+            timeout: Seconds per detection (default: the detector timeout)
+            **options: Detection options, see FaceDetector.detect_faces_in_image()
+
+        Yields:
+            Results with "index" (input position) added
+        """
+        if hasattr(images, "__aiter__"):
+            source = images.__aiter__()
+        else:
+            source = iter(images)
+        index = 0
+        exhausted = False
+        pending = deque()
+
+        async def start_next() -> bool:
+            nonlocal index, exhausted
+            if exhausted:
+                return False
+            try:
+                item = await source.__anext__() if hasattr(source, "__anext__") else next(source)
+            except (StopIteration, StopAsyncIteration):
+                exhausted = True
+                return False
+            task = asyncio.ensure_future(self.detect(item, timeout, **options))
+            task.index = index
+            index += 1
+            pending.append(task)
+            return True
+
+        try:
+            while len(pending) < self.max_pending and await start_next():
+                pass
+
+            while pending:
+                if ordered:
+                    task = pending[0]
+                    await asyncio.wait([task])
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    task = next(t for t in pending if t in done)
+                pending.remove(task)
+
+                result = task.result()
+                result["index"] = task.index
+                yield result
+                await start_next()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, slot usage and outcome counters"""
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            **self._counters
+        }
+
+    async def close(self) -> None:
+        """Wait for running detections and stop the pool without blocking the loop"""
+        await asyncio.get_running_loop().run_in_executor(None, self._pool.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+async def _run_cli(args) -> int:
+    """Detect faces in the given files and write one JSON result per line"""
+    failed = 0
+    async with AsyncFaceDetector(args.cascade, args.workers, args.max_pending, args.timeout) as detector:
+        async for result in detector.iter_batch(args.images, ordered=not args.unordered):
+            result["image_path"] = args.images[result["index"]]
+            failed += not result["success"]
+            sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+        print(f"✅ {len(args.images) - failed} processed, {failed} failed "
+              f"({detector.stats()['timed_out']} timed out)", file=sys.stderr)
+    return 1 if failed else 0
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Face detection through the asyncio API",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python async_detector.py photos/*.jpg --workers 4 > results.jsonl
+  python async_detector.py photos/*.jpg --max-pending 16 --timeout 2 --unordered
+        """
+    )
+
+    parser.add_argument('images', nargs='+', help='Image files to process')
+    parser.add_argument('--cascade', '-c', help='Path to Haar Cascade XML file (optional)')
+    parser.add_argument('--workers', '-w', type=int, help='Pool threads (default: CPU count)')
+    parser.add_argument('--max-pending', type=int, help='Detections queued or running at once (default: 2 per worker)')
+    parser.add_argument('--timeout', type=float, help='Seconds per detection (default: no limit)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Emit results as they finish instead of in input order')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        sys.exit(asyncio.run(_run_cli(args)))
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "message": str(e), "data": {"face_count": 0, "faces": []}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
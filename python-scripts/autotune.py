@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Detection Parameter Autotuner
+Author: Nguyen Tuan Khanh
+Description: Sweeps scale factor, min neighbors, min size and working
+             resolution for one or more base profiles (see
+             detection_engine.py) over a locally annotated image set. Points
+             outside the ranges accepted by
+             enhanced_face_detector.validate_params() are not tried. Each
+             point is scored against the ground-truth boxes (a detection
+             matches one unmatched annotation with IoU >= --iou) and timed
+             on pre-decoded grayscale images; the settings on the
+             latency/recall Pareto front are written as a profile file that
+             the detectors load with --profiles-file or the
+             FACE_DETECTION_PROFILES environment variable.
+
+             Annotation file (JSON; image paths relative to the file):
+               {"images": [{"path": "group.jpg", "faces": [[x, y, w, h], ...]}]}
+             Faces may also be {"x", "y", "width", "height"} objects, so a
+             reviewed detector result can serve as ground truth.
+
+             With --workers > 1 the points are evaluated in parallel, one
+             single-threaded process each; latencies are then only
+             comparable when the cores are not oversubscribed.
+Output: Profile file with the Pareto-optimal settings; JSON report of every point
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import cascade_registry
+import detection_engine
+import nms
+from enhanced_face_detector import validate_params
+
+DEFAULT_BASE_PROFILES = ["fast", "balanced", "thorough"]
+DEFAULT_SCALE_FACTORS = [1.05, 1.1, 1.2, 1.3]
+DEFAULT_MIN_NEIGHBORS = [3, 4, 5, 6]
+DEFAULT_MIN_SIZES = [20, 30, 40]
+
+# State of each evaluation process, set by _init_worker
+_worker_images = None
+_worker_cascade = None
+_worker_options = None
+
+# ---------------------------------------------------------------------------
+# Ground truth and scoring
+# ---------------------------------------------------------------------------
+
+def _parse_box(face: Any) -> List[int]:
+    if isinstance(face, dict):
+        return [int(face["x"]), int(face["y"]), int(face["width"]), int(face["height"])]
+    x, y, w, h = face
+    return [int(x), int(y), int(w), int(h)]
+
+def load_annotations(path: str) -> List[Dict[str, Any]]:
+    """
+    Read an annotation file
+
+    Returns:
+        [{"path": absolute image path, "boxes": (N, 4) int32 array}, ...]
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it is malformed or lists no images
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            document = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid annotation file {path}: {e}")
+
+    root = os.path.dirname(os.path.abspath(path))
+    entries = document.get("images") if isinstance(document, dict) else None
+    if not entries:
+        raise ValueError(f"Annotation file {path} lists no images")
+
+    annotations = []
+    for entry in entries:
+        try:
+            boxes = nms.as_box_array([_parse_box(face) for face in entry.get("faces", [])])
+            image_path = os.path.join(root, entry["path"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid annotation entry {entry!r}: {e}")
+        if not os.path.exists(image_path):
+            raise ValueError(f"Image not found: {image_path}")
+        annotations.append({"path": image_path, "boxes": boxes})
+    return annotations
+
+def match_boxes(detected: np.ndarray, truth: np.ndarray, iou_threshold: float = 0.5) -> Tuple[int, int, int]:
+    """
+    Greedily pair detections with ground-truth boxes by descending IoU
+
+    Returns:
+        (true positives, false positives, false negatives)
+    """
+    detected, truth = nms.as_box_array(detected), nms.as_box_array(truth)
+    if len(detected) == 0 or len(truth) == 0:
+        return 0, len(detected), len(truth)
+
+    count = len(detected)
+    iou = nms.overlap_matrix(np.concatenate([detected, truth]), nms.OVERLAP_IOU)[:count, count:]
+    matched = 0
+    used_detected, used_truth = set(), set()
+    for flat in np.argsort(-iou, axis=None, kind="stable"):
+        i, j = divmod(int(flat), iou.shape[1])
+        if iou[i, j] < iou_threshold:
+            break
+        if i in used_detected or j in used_truth:
+            continue
+        used_detected.add(i)
+        used_truth.add(j)
+        matched += 1
+    return matched, count - matched, len(truth) - matched
+
+# ---------------------------------------------------------------------------
+# Sweep
+# ---------------------------------------------------------------------------
+
+def build_grid(base_profiles: List[str], scale_factors: List[float], min_neighbors: List[int],
+               min_sizes: List[int], max_long_edges: List[int] = None) -> List[Dict[str, Any]]:
+    """
+    Every valid combination of the swept values
+
+    A max long edge of 0 scans the full image; None keeps the base
+    profile's setting.
+    """
+    points = []
+    for base, sf, mn, size, edge in itertools.product(
+            base_profiles, scale_factors, min_neighbors, min_sizes, max_long_edges or [None]):
+        profile = detection_engine.get_profile(base)
+        if validate_params(size, sf, mn):
+            continue
+        points.append({
+            "base": base,
+            "scale_factor": sf,
+            "min_neighbors": mn,
+            "min_size": size,
+            "max_long_edge": profile.max_long_edge if edge is None else (edge or None)
+        })
+    return points
+
+def point_profile(point: Dict[str, Any], name: str = None, description: str = None) -> detection_engine.Profile:
+    """The profile a sweep point stands for"""
+    base = detection_engine.get_profile(point["base"])
+    return base._replace(
+        name=name or f"{point['base']}-sf{point['scale_factor']}-mn{point['min_neighbors']}-ms{point['min_size']}",
+        description=description or base.description,
+        scale_factor=point["scale_factor"],
+        min_neighbors=point["min_neighbors"],
+        min_size=point["min_size"],
+        max_long_edge=point["max_long_edge"]
+    )
+
+def _init_worker(annotations: List[Dict[str, Any]], cascade_path: Optional[str], repeats: int,
+                 iou_threshold: float) -> None:
+    """Load the cascade and decode every image once per evaluation process"""
+    global _worker_images, _worker_cascade, _worker_options
+    cv2.setNumThreads(1)
+    _worker_cascade = cascade_registry.get_cascade(cascade_path or cascade_registry.DEFAULT_CASCADE)
+    _worker_images = []
+    for item in annotations:
+        # Same conversion as the detectors, so the scores carry over
+        image = cv2.imread(item["path"])
+        if image is None:
+            raise ValueError(f"Could not read image: {item['path']}")
+        _worker_images.append((cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), item["boxes"]))
+    _worker_options = {"repeats": max(1, repeats), "iou": iou_threshold}
+
+def evaluate_point(point: Dict[str, Any]) -> Dict[str, Any]:
+    """Score and time one sweep point on the images of this process"""
+    profile = point_profile(point)
+    true_positives = false_positives = false_negatives = 0
+    latencies = []
+    for gray, truth in _worker_images:
+        samples = []
+        for _ in range(_worker_options["repeats"]):
+            started = time.perf_counter()
+            faces, _ = detection_engine.detect(_worker_cascade, gray, profile)
+            samples.append(time.perf_counter() - started)
+        latencies.append(float(np.median(samples)) * 1000.0)
+        tp, fp, fn = match_boxes(faces, truth, _worker_options["iou"])
+        true_positives += tp
+        false_positives += fp
+        false_negatives += fn
+
+    detections = true_positives + false_positives
+    annotated = true_positives + false_negatives
+    return {
+        **point,
+        "recall": round(true_positives / annotated, 4) if annotated else 1.0,
+        "precision": round(true_positives / detections, 4) if detections else 1.0,
+        "true_positives": true_positives,
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+    }
+
+def sweep(annotations: List[Dict[str, Any]], points: List[Dict[str, Any]], workers: int = 1,
+          cascade_path: str = None, repeats: int = 3, iou_threshold: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    Evaluate every point, in parallel processes when workers > 1
+
+    Returns:
+        One result per point, in point order
+    """
+    init_args = (annotations, cascade_path, repeats, iou_threshold)
+    if workers <= 1:
+        _init_worker(*init_args)
+        results = []
+        for number, point in enumerate(points, 1):
+            results.append(evaluate_point(point))
+            print(f"  {number}/{len(points)} points", file=sys.stderr)
+        return results
+
+    results = [None] * len(points)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+        futures = {executor.submit(evaluate_point, point): index for index, point in enumerate(points)}
+        for number, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            print(f"  {number}/{len(points)} points", file=sys.stderr)
+    return results
+
+def pareto_front(results: List[Dict[str, Any]], min_precision: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Points not beaten on both latency and recall, fastest first
+
+    A point is kept when every faster point has a lower recall; among
+    equally fast and accurate points the more precise one is kept. Points
+    below min_precision are not considered.
+    """
+    candidates = [result for result in results if result["precision"] >= min_precision]
+    candidates.sort(key=lambda result: (result["mean_ms"], -result["recall"], -result["precision"]))
+    front = []
+    for result in candidates:
+        if not front or result["recall"] > front[-1]["recall"]:
+            front.append(result)
+    return front
+
+def write_profile_file(front: List[Dict[str, Any]], path: str, prefix: str, annotation_path: str) -> List[str]:
+    """
+    Save the front as a profile file, fastest profile first
+
+    Returns:
+        The profile names
+    """
+    profiles = []
+    extra = []
+    for number, result in enumerate(front, 1):
+        profiles.append(point_profile(
+            result,
+            name=f"{prefix}-{number}",
+            description=(f"Autotuned from {result['base']}: recall {result['recall']:.2f}, "
+                         f"precision {result['precision']:.2f}, {result['mean_ms']:.1f} ms per image")
+        ))
+        extra.append({
+            "base": result["base"],
+            "metrics": {key: result[key] for key in ("recall", "precision", "mean_ms", "p95_ms")}
+        })
+    detection_engine.save_profiles(
+        profiles, path, extra,
+        generated_by="autotune.py",
+        annotations=os.path.abspath(annotation_path)
+    )
+    return [profile.name for profile in profiles]
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Sweep detection parameters on annotated images and keep the latency/recall Pareto front",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python autotune.py annotations.json --output tuned_profiles.json
+  python autotune.py annotations.json --workers 4 --base-profiles balanced --min-sizes 24 30
+  python autotune.py annotations.json --max-long-edges 0 640 960 --report sweep.json
+  python face_detector.py photo.jpg --profiles-file tuned_profiles.json --detection-profile tuned-2
+        """
+    )
+
+    parser.add_argument('annotations', help='Annotation JSON file (see the module docstring)')
+    parser.add_argument('--output', '-o', default='tuned_profiles.json',
+                        help='Profile file to write (default: tuned_profiles.json)')
+    parser.add_argument('--report', help='Also write every evaluated point to this JSON file')
+    parser.add_argument('--prefix', default='tuned', help='Name prefix of the written profiles (default: tuned)')
+    parser.add_argument('--base-profiles', nargs='+', default=DEFAULT_BASE_PROFILES,
+                        help='Profiles whose preprocessing and passes are swept (default: all built-in)')
+    parser.add_argument('--scale-factors', nargs='+', type=float, default=DEFAULT_SCALE_FACTORS,
+                        help=f'Default: {" ".join(map(str, DEFAULT_SCALE_FACTORS))}')
+    parser.add_argument('--min-neighbors', nargs='+', type=int, default=DEFAULT_MIN_NEIGHBORS,
+                        help=f'Default: {" ".join(map(str, DEFAULT_MIN_NEIGHBORS))}')
+    parser.add_argument('--min-sizes', nargs='+', type=int, default=DEFAULT_MIN_SIZES,
+                        help=f'Default: {" ".join(map(str, DEFAULT_MIN_SIZES))}')
+    parser.add_argument('--max-long-edges', nargs='+', type=int,
+                        help="Working resolutions to sweep, 0 for full size (default: each base profile's)")
+    parser.add_argument('--iou', type=float, default=0.5,
+                        help='IoU at which a detection matches an annotation (default: 0.5)')
+    parser.add_argument('--min-precision', type=float, default=0.0,
+                        help='Leave less precise points off the front (default: 0)')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per image and point (default: 3)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Evaluation processes (default: 1, for undisturbed timings)')
+    parser.add_argument('--cascade', '-c', help='Path to Haar Cascade XML file (optional)')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        annotations = load_annotations(args.annotations)
+        points = build_grid(args.base_profiles, args.scale_factors, args.min_neighbors,
+                            args.min_sizes, args.max_long_edges)
+        if not points:
+            raise ValueError("No valid parameter combination to sweep")
+
+        print(f"⏱️  Sweeping {len(points)} points over {len(annotations)} images...", file=sys.stderr)
+        results = sweep(annotations, points, args.workers, args.cascade, args.repeats, args.iou)
+        front = pareto_front(results, args.min_precision)
+        names = write_profile_file(front, args.output, args.prefix, args.annotations)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "message": str(e)}))
+        sys.exit(1)
+
+    for name, result in zip(names, front):
+        print(f"  {name}: {result['base']} sf={result['scale_factor']} mn={result['min_neighbors']} "
+              f"ms={result['min_size']} edge={result['max_long_edge']} -> recall {result['recall']:.3f}, "
+              f"precision {result['precision']:.3f}, {result['mean_ms']:.1f} ms", file=sys.stderr)
+    print(f"✅ Wrote {len(names)} Pareto-optimal profiles to {args.output}", file=sys.stderr)
+
+    report = {
+        "annotations": os.path.abspath(args.annotations),
+        "iou": args.iou,
+        "repeats": args.repeats,
+        "points": results,
+        "pareto": names
+    }
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
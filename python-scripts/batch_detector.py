@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Batch Face Detection
+Author: Nguyen Tuan Khanh
+Description: Runs FaceDetector over a directory tree or a manifest file using
+             a process pool. Inputs are read lazily and only a bounded number
+             of chunks is in flight, so memory stays flat for any input size.
+             Results are streamed as JSON lines; a checkpoint file allows a
+             crashed run to resume.
+"""
+
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from output_format import encode
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tif', '.tiff', '.webp'}
+
+# Chunks in flight per worker; bounds memory and keeps every worker busy
+IN_FLIGHT_PER_WORKER = 4
+
+# Detector owned by each worker process, created by _init_worker
+_worker_detector = None
+# Archive mapped by each worker process when the source is an image archive
+_worker_archive = None
+
+def _init_worker(cascade_path: Optional[str], archive_path: Optional[str] = None,
+                 profile: Any = None) -> None:
+    """Load the detector (and map the archive, if any) once per worker process"""
+    global _worker_detector, _worker_archive
+    from face_detector import FaceDetector
+    _worker_detector = FaceDetector(cascade_path=cascade_path, profile=profile)
+    if archive_path:
+        from image_archive import open_archive
+        _worker_archive = open_archive(archive_path)
+
+def _detect_chunk(chunk: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """Run detection for one chunk of (index, path) inputs; with an archive,
+    the index selects the record and the path is its name"""
+    # detect_batch decodes the next images while the current one is detected
+    if _worker_archive is not None:
+        images = [_worker_archive.record(index) for index, _ in chunk]
+    else:
+        images = [image_path for _, image_path in chunk]
+    results = _worker_detector.detect_batch(images)
+    for (index, image_path), result in zip(chunk, results):
+        result["index"] = index
+        result["image_path"] = image_path
+    return results
+
+def _walk_directory(directory: str) -> Iterator[str]:
+    """Yield image files below a directory in a stable (sorted) order"""
+    with os.scandir(directory) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_directory(entry.path)
+        elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+            yield entry.path
+
+def _read_manifest(manifest_path: str) -> Iterator[str]:
+    """Yield image paths from a manifest file, one per line; relative paths
+    are resolved against the manifest's directory"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding='utf-8') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield os.path.join(base_dir, line)
+
+def _archive_names(archive_path: str) -> Iterator[str]:
+    from image_archive import open_archive
+    with open_archive(archive_path) as archive:
+        yield from archive.names
+
+def iter_inputs(source: str) -> Iterator[str]:
+    """Lazily enumerate image paths from a directory or a manifest file, or
+    the record names of an image archive (see image_archive.py)"""
+    from image_archive import is_archive
+    if os.path.isdir(source):
+        return _walk_directory(source)
+    if is_archive(source):
+        return _archive_names(source)
+    return _read_manifest(source)
+
+def _chunked(items: Iterable[Tuple[int, str]], chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+class Checkpoint:
+    """
+    Persists how many inputs have been fully written
+
+    Only the contiguous prefix of finished chunks is recorded, so results
+    written after that point may be emitted again on resume (at-least-once).
+    """
+
+    def __init__(self, path: Optional[str], source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.start = 0
+        self.next_index = 0
+
+    def load(self) -> int:
+        """Return the number of inputs to skip"""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("source") != self.source:
+            raise ValueError(f"Checkpoint {self.path} belongs to a different source: {state.get('source')}")
+        self.start = self.next_index = int(state.get("next_index", 0))
+        return self.start
+
+    def save(self, next_index: int) -> None:
+        self.next_index = next_index
+        if not self.path:
+            return
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"source": self.source, "next_index": next_index}, f)
+        os.replace(temp_path, self.path)
+
+def iter_batch_results(source: str, workers: int = None, chunk_size: int = 16,
+                       ordered: bool = True, cascade_path: str = None,
+                       checkpoint: Checkpoint = None, profile: Any = None) -> Iterator[Dict[str, Any]]:
+    """
+    Detect faces in every input and yield results as they finish
+
+    Args:
+        source: Directory to walk, manifest file with one path per line, or
+            image archive (workers map it and decode records in place)
+        workers: Worker processes (default: CPU count)
+        chunk_size: Inputs sent to a worker per task
+        ordered: Yield in input order; otherwise in completion order
+        cascade_path: Path to Haar Cascade XML file (optional)
+        checkpoint: Progress tracker; inputs it already covers are skipped
+        profile: Detection profile or profile name (default: balanced)
+
+    Yields:
+        detect_faces() results with "index" and "image_path" added
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint = checkpoint or Checkpoint(None, source)
+    start = checkpoint.load()
+    inputs = itertools.islice(enumerate(iter_inputs(source)), start, None)
+    chunks = enumerate(_chunked(inputs, chunk_size))
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+
+    # chunk number -> index after its last input, for chunks not yet checkpointed
+    chunk_end = {}
+    finished = set()
+    next_chunk = 0
+
+    from image_archive import is_archive
+    archive_path = os.path.abspath(source) if is_archive(source) else None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cascade_path, archive_path, profile)) as executor:
+        pending = deque()
+        chunk_of = {}
+
+        def submit_next():
+            for chunk_no, chunk in itertools.islice(chunks, 1):
+                chunk_end[chunk_no] = chunk[-1][0] + 1
+                future = executor.submit(_detect_chunk, chunk)
+                chunk_of[future] = chunk_no
+                pending.append(future)
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done_set, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [future for future in pending if future in done_set]
+                for future in done:
+                    pending.remove(future)
+
+            for future in done:
+                yield from future.result()
+
+                # Advance the checkpoint over the contiguous finished prefix
+                finished.add(chunk_of.pop(future))
+                while next_chunk in finished:
+                    finished.discard(next_chunk)
+                    checkpoint.save(chunk_end.pop(next_chunk))
+                    next_chunk += 1
+
+                submit_next()
+
+def run_batch(source: str, output: TextIO = None, workers: int = None, chunk_size: int = 16,
+              ordered: bool = True, cascade_path: str = None,
+              checkpoint_path: str = None, output_format: str = None,
+              profile: Any = None) -> Dict[str, int]:
+    """
+    Stream batch results as JSON lines, or in another encoding from
+    output_format.py (binary and msgpack records are self-delimiting)
+
+    Returns:
+        Summary counters: processed, succeeded, failed, skipped (via checkpoint)
+    """
+    output = output or sys.stdout
+    checkpoint = Checkpoint(checkpoint_path, source)
+    summary = {"processed": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+
+    for result in iter_batch_results(source, workers, chunk_size, ordered, cascade_path, checkpoint, profile):
+        if output_format:
+            output.flush()
+            binary_output = getattr(output, "buffer", output)
+            binary_output.write(encode(result, output_format))
+            binary_output.flush()
+        else:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+        summary["processed"] += 1
+        summary["succeeded" if result["success"] else "failed"] += 1
+
+    summary["skipped"] = checkpoint.start
+    return summary
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Face Detection Benchmark Suite
+Author: Nguyen Tuan Khanh
+Description: Generates deterministic synthetic inputs (face crops from the
+             sample images pasted on seeded noise backgrounds) and times the
+             three detectors over a sweep of resolutions, face counts and
+             parameter sets. Each entry point and parameter set runs in its
+             own single-threaded process so peak RSS is measured per entry
+             point and timings do not depend on the core count.
+             The drawn shapes of create_test_images.py and
+             face-detection-frontend/create_sample_images.py are not used:
+             the Haar cascades find no faces in them (0 detections on every
+             image), so they would only time the empty-pyramid case. Real
+             face crops keep the face-count axis meaningful.
+Output: JSON and/or CSV report; `compare` diffs two JSON reports
+"""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLES_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "face-detection-frontend", "samples")
+
+DEFAULT_RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+DEFAULT_FACE_COUNTS = [0, 1, 4, 16]
+
+# name -> (min_size, scale_factor, min_neighbors)
+PARAMETER_SETS = {
+    "default": (30, 1.1, 5),
+    "fast": (40, 1.3, 4),
+    "accurate": (24, 1.05, 6)
+}
+
+ENTRY_POINTS = ["simple", "face_detector", "enhanced"]
+
+# simple_face_detector.py has fixed parameters, so it only runs once
+FIXED_PARAMETER_ENTRY_POINTS = {"simple"}
+
+# Row fields identifying one measurement; used to match rows across runs
+KEY_FIELDS = ("entry_point", "parameter_set", "resolution", "faces")
+
+METRIC_FIELDS = ("p50_ms", "p95_ms", "p99_ms", "throughput_ips", "peak_rss_mb")
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+# ---------------------------------------------------------------------------
+
+def load_face_crops() -> List[np.ndarray]:
+    """
+    Face crops from the sample images, found with the default cascade
+
+    The samples ship with the repo and the cascade is deterministic, so the
+    crops are identical on every run.
+    """
+    import cascade_registry
+    cascade = cascade_registry.get_cascade(cascade_registry.DEFAULT_CASCADE)
+    crops = []
+    for name in sorted(os.listdir(SAMPLES_DIR)):
+        image = cv2.imread(os.path.join(SAMPLES_DIR, name))
+        if image is None:
+            continue
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        for x, y, w, h in sorted(map(tuple, cascade.detectMultiScale(gray, 1.1, 5, minSize=(30, 30)))):
+            # Keep some context around the face so the crop is still detected
+            pad = w // 4
+            x0, y0 = max(0, x - pad), max(0, y - pad)
+            crops.append(image[y0:y + h + pad, x0:x + w + pad].copy())
+    if not crops:
+        raise RuntimeError(f"No faces found in sample images under {SAMPLES_DIR}")
+    return crops
+
+def create_synthetic_image(width: int, height: int, face_count: int,
+                           crops: List[np.ndarray], seed: int = 0) -> np.ndarray:
+    """
+    Paste face crops onto a low-frequency noise background
+
+    Faces are placed in a grid (one per cell, jittered) and resized to fit
+    the cell, so face size shrinks as density grows.
+    """
+    rng = np.random.default_rng([seed, width, height, face_count])
+    background = rng.integers(60, 200, size=(max(1, height // 16), max(1, width // 16), 3), dtype=np.uint8)
+    image = cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    if face_count == 0:
+        return image
+
+    columns = int(np.ceil(np.sqrt(face_count * width / height)))
+    rows = int(np.ceil(face_count / columns))
+    cell_w, cell_h = width // columns, height // rows
+
+    for i in range(face_count):
+        crop = crops[i % len(crops)]
+        side = int(min(cell_w, cell_h) * rng.uniform(0.6, 0.9))
+        face = cv2.resize(crop, (side, side), interpolation=cv2.INTER_AREA)
+        cx, cy = (i % columns) * cell_w, (i // columns) * cell_h
+        x = cx + int(rng.integers(0, cell_w - side + 1))
+        y = cy + int(rng.integers(0, cell_h - side + 1))
+        image[y:y + side, x:x + side] = face
+
+    return image
+
+def parse_resolution(text: str) -> Tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+def generate_inputs(output_dir: str, resolutions: List[str], face_counts: List[int],
+                    seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Write the synthetic input set
+
+    Returns:
+        Input descriptors: path, resolution and face count
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    crops = load_face_crops()
+    inputs = []
+    for resolution in resolutions:
+        width, height = parse_resolution(resolution)
+        for face_count in face_counts:
+            path = os.path.join(output_dir, f"bench_{width}x{height}_{face_count}faces.jpg")
+            image = create_synthetic_image(width, height, face_count, crops, seed)
+            cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+            inputs.append({"path": path, "resolution": f"{width}x{height}", "faces": face_count})
+    return inputs
+
+# ---------------------------------------------------------------------------
+# Measurement (runs in a fresh child process per entry point)
+# ---------------------------------------------------------------------------
+
+def _make_runner(entry_point: str, params: Tuple[int, float, int]):
+    """Return a callable(image_path) -> result for one entry point"""
+    min_size, scale_factor, min_neighbors = params
+
+    if entry_point == "simple":
+        from simple_face_detector import detect_faces_simple
+        return detect_faces_simple
+
+    if entry_point == "face_detector":
+        from face_detector import FaceDetector
+        detector = FaceDetector()
+        detector.SCALE_FACTOR = scale_factor
+        detector.MIN_NEIGHBORS = min_neighbors
+        detector.MIN_SIZE = (min_size, min_size)
+        return detector.detect_faces
+
+    if entry_point == "enhanced":
+        import enhanced_face_detector
+        face_cascade, _ = enhanced_face_detector.load_face_cascade()
+        return lambda path: enhanced_face_detector.detect_faces_with_params(
+            path, min_size, scale_factor, min_neighbors, face_cascade=face_cascade
+        )
+
+    raise ValueError(f"Unknown entry point: {entry_point}")
+
+def _measure(entry_point: str, params: Tuple[int, float, int], inputs: List[Dict[str, Any]],
+             repeats: int, warmup: int) -> Dict[str, Any]:
+    """Time every input in this process and report its peak RSS"""
+    sys.path.insert(0, SCRIPT_DIR)
+    cv2.setNumThreads(1)
+    # The detectors print diagnostics to stderr; keep the progress output readable
+    sys.stderr = open(os.devnull, "w")
+    run = _make_runner(entry_point, params)
+
+    timings = []
+    for item in inputs:
+        for _ in range(warmup):
+            run(item["path"])
+        latencies = []
+        result = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = run(item["path"])
+            latencies.append(time.perf_counter() - started)
+        timings.append({
+            "latencies": latencies,
+            "faces_found": result["data"]["face_count"] if result and result.get("success") else None
+        })
+
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    return {"timings": timings, "peak_rss_mb": peak_rss_mb}
+
+def _summarize(latencies: List[float]) -> Dict[str, float]:
+    values = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "throughput_ips": round(1000.0 * len(values) / float(values.sum()), 3) if values.sum() > 0 else 0.0
+    }
+
+def run_benchmark(inputs: List[Dict[str, Any]], entry_points: List[str], parameter_sets: List[str],
+                  repeats: int = 20, warmup: int = 2) -> List[Dict[str, Any]]:
+    """
+    Benchmark every entry point and parameter set over the inputs
+
+    Returns:
+        One row per (entry point, parameter set, resolution, face count)
+    """
+    rows = []
+    context = get_context("spawn")
+    for entry_point in entry_points:
+        names = parameter_sets[:1] if entry_point in FIXED_PARAMETER_ENTRY_POINTS else parameter_sets
+        for name in names:
+            # A fresh process per case keeps the peak RSS attributable
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                measured = executor.submit(
+                    _measure, entry_point, PARAMETER_SETS[name], inputs, repeats, warmup
+                ).result()
+
+            label = "fixed" if entry_point in FIXED_PARAMETER_ENTRY_POINTS else name
+            for item, timing in zip(inputs, measured["timings"]):
+                rows.append({
+                    "entry_point": entry_point,
+                    "parameter_set": label,
+                    "resolution": item["resolution"],
+                    "faces": item["faces"],
+                    "faces_found": timing["faces_found"],
+                    "samples": len(timing["latencies"]),
+                    **_summarize(timing["latencies"]),
+                    "peak_rss_mb": round(measured["peak_rss_mb"], 1)
+                })
+            print(f"  {entry_point}/{label}: done", file=sys.stderr)
+    return rows
+
+# ---------------------------------------------------------------------------
+# Reports
+# ---------------------------------------------------------------------------
+
+def write_csv(rows: List[Dict[str, Any]], path: str) -> None:
+    if not rows:
+        return
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+def _row_key(row: Dict[str, Any]) -> Tuple:
+    return tuple(row[field] for field in KEY_FIELDS)
+
+def compare_reports(baseline: Dict[str, Any], candidate: Dict[str, Any],
+                    threshold: float = 0.10) -> Dict[str, Any]:
+    """
+    Diff two benchmark reports
+
+    A row regresses when its p50 or p95 latency grows, or its throughput
+    drops, by more than `threshold` (relative).
+
+    Returns:
+        {"rows": [...], "regressions": [...], "missing": [...]}
+    """
+    baseline_rows = {_row_key(row): row for row in baseline["results"]}
+    diffs, regressions, missing = [], [], []
+
+    for row in candidate["results"]:
+        key = _row_key(row)
+        base = baseline_rows.pop(key, None)
+        if base is None:
+            missing.append({"key": list(key), "in": "candidate only"})
+            continue
+
+        diff = dict(zip(KEY_FIELDS, key))
+        for field in METRIC_FIELDS:
+            before, after = base[field], row[field]
+            diff[field] = {
+                "baseline": before,
+                "candidate": after,
+                "change": round((after - before) / before, 4) if before else None
+            }
+        diffs.append(diff)
+
+        slower = any((diff[field]["change"] or 0) > threshold for field in ("p50_ms", "p95_ms"))
+        less_throughput = (diff["throughput_ips"]["change"] or 0) < -threshold
+        if slower or less_throughput:
+            regressions.append(diff)
+
+    missing.extend({"key": list(key), "in": "baseline only"} for key in baseline_rows)
+    return {"threshold": threshold, "rows": diffs, "regressions": regressions, "missing": missing}
+
+def _environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the face detectors on deterministic synthetic inputs",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmark.py run --json baseline.json --csv baseline.csv
+  python benchmark.py run --resolutions 640x480 --faces 0 4 --repeats 5 --json quick.json
+  python benchmark.py run --entry-points enhanced --parameter-sets default fast --json new.json
+  python benchmark.py compare baseline.json new.json --threshold 0.05
+  python benchmark.py generate bench_inputs
+        """
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_input_options(sub):
+        sub.add_argument('--resolutions', nargs='+', default=DEFAULT_RESOLUTIONS,
+                         help=f'WIDTHxHEIGHT list (default: {" ".join(DEFAULT_RESOLUTIONS)})')
+        sub.add_argument('--faces', nargs='+', type=int, default=DEFAULT_FACE_COUNTS,
+                         help=f'Face counts per image (default: {" ".join(map(str, DEFAULT_FACE_COUNTS))})')
+        sub.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+
+    run = subparsers.add_parser('run', help='Generate inputs and run the benchmark')
+    add_input_options(run)
+    run.add_argument('--input-dir', default=os.path.join(tempfile.gettempdir(), "face_bench_inputs"),
+                     help='Where synthetic inputs are written (default: <tmp>/face_bench_inputs)')
+    run.add_argument('--entry-points', nargs='+', choices=ENTRY_POINTS, default=ENTRY_POINTS,
+                     help='Detectors to benchmark (default: all)')
+    run.add_argument('--parameter-sets', nargs='+', choices=sorted(PARAMETER_SETS), default=["default"],
+                     help='Parameter sets to sweep (default: default)')
+    run.add_argument('--repeats', type=int, default=20, help='Timed runs per input (default: 20)')
+    run.add_argument('--warmup', type=int, default=2, help='Untimed runs per input (default: 2)')
+    run.add_argument('--json', dest='json_path', help='Write the JSON report here')
+    run.add_argument('--csv', dest='csv_path', help='Write the rows as CSV here')
+
+    generate = subparsers.add_parser('generate', help='Only write the synthetic inputs')
+    add_input_options(generate)
+    generate.add_argument('output_dir', help='Output directory')
+
+    compare = subparsers.add_parser('compare', help='Diff two JSON reports')
+    compare.add_argument('baseline', help='Baseline JSON report')
+    compare.add_argument('candidate', help='Candidate JSON report')
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help='Relative change that counts as a regression (default: 0.10)')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    if args.command == "generate":
+        inputs = generate_inputs(args.output_dir, args.resolutions, args.faces, args.seed)
+        print(f"✅ Wrote {len(inputs)} images to {args.output_dir}")
+        return
+
+    if args.command == "compare":
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.candidate, encoding="utf-8") as f:
+            candidate = json.load(f)
+        report = compare_reports(baseline, candidate, args.threshold)
+        print(json.dumps(report, indent=2))
+        for diff in report["regressions"]:
+            key = "/".join(str(diff[field]) for field in KEY_FIELDS)
+            print(f"❌ Regression: {key} p50 {diff['p50_ms']['change']:+.1%} "
+                  f"p95 {diff['p95_ms']['change']:+.1%}", file=sys.stderr)
+        sys.exit(1 if report["regressions"] else 0)
+
+    print("🎨 Generating inputs...", file=sys.stderr)
+    inputs = generate_inputs(args.input_dir, args.resolutions, args.faces, args.seed)
+    print(f"⏱️  Benchmarking {len(inputs)} inputs x {args.repeats} repeats...", file=sys.stderr)
+    rows = run_benchmark(inputs, args.entry_points, args.parameter_sets, args.repeats, args.warmup)
+
+    report = {
+        "environment": _environment(),
+        "config": {
+            "resolutions": args.resolutions,
+            "faces": args.faces,
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+            "parameter_sets": {name: PARAMETER_SETS[name] for name in args.parameter_sets}
+        },
+        "results": rows
+    }
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.csv_path:
+        write_csv(rows, args.csv_path)
+    if not args.json_path and not args.csv_path:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Process-wide Haar Cascade registry
+Author: Nguyen Tuan Khanh
+Description: Loads each cascade XML file at most once per process and shares
+             the classifier between all detector entry points. Entries are
+             keyed by absolute path and file modification time, so an updated
+             cascade file is picked up without restarting the process.
+"""
+
+import os
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_CASCADE = os.path.join(SCRIPT_DIR, 'haarcascade_frontalface_default.xml')
+
+# Search order used when no explicit cascade file is configured
+DEFAULT_CANDIDATES = [
+    DEFAULT_CASCADE,
+    os.path.join(SCRIPT_DIR, 'haarcascade_frontalface_alt.xml'),
+    'haarcascade_frontalface_default.xml',  # Fallback for current directory
+    os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'),
+    os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_alt.xml')
+]
+
+# Set to True to log cascade loading to stderr
+verbose = False
+
+_lock = threading.Lock()
+# (absolute path, mtime_ns) -> classifier, or None if the file failed to load
+_cascades: Dict[Tuple[str, int], Optional[cv2.CascadeClassifier]] = {}
+_thread_state = threading.local()
+
+def _debug(message: str) -> None:
+    if verbose:
+        print(f"DEBUG: {message}", file=sys.stderr)
+
+def _cache_key(cascade_path: str) -> Tuple[str, int]:
+    """Build the registry key; raises FileNotFoundError for missing files"""
+    abs_path = os.path.abspath(cascade_path)
+    return abs_path, os.stat(abs_path).st_mtime_ns
+
+def _load(key: Tuple[str, int]) -> Optional[cv2.CascadeClassifier]:
+    """Load and register a classifier, replacing entries for older versions"""
+    with _lock:
+        if key in _cascades:
+            return _cascades[key]
+
+        abs_path = key[0]
+        _debug(f"Loading cascade: {abs_path}")
+        try:
+            cascade = cv2.CascadeClassifier(abs_path)
+        except cv2.error as e:
+            _debug(f"Failed to load cascade {abs_path}: {e}")
+            cascade = None
+        if cascade is not None and cascade.empty():
+            _debug(f"Cascade file empty: {abs_path}")
+            cascade = None
+
+        # Drop entries for previous versions of the same file
+        for stale in [k for k in _cascades if k[0] == abs_path]:
+            del _cascades[stale]
+        _cascades[key] = cascade
+        return cascade
+
+def get_cascade(cascade_path: str) -> cv2.CascadeClassifier:
+    """
+    Return the shared classifier for a cascade file
+
+    Raises:
+        FileNotFoundError: If the file does not exist
+        ValueError: If the file is not a valid cascade
+    """
+    try:
+        key = _cache_key(cascade_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Haar Cascade file not found: {cascade_path}")
+
+    cascade = _cascades.get(key)
+    if cascade is None:
+        cascade = _load(key)
+    if cascade is None:
+        raise ValueError(f"Failed to load Haar Cascade from: {cascade_path}")
+    return cascade
+
+def get_thread_cascade(cascade_path: str) -> cv2.CascadeClassifier:
+    """
+    Return a classifier private to the calling thread
+
+    detectMultiScale keeps per-call scratch state inside the classifier, so
+    threads that detect concurrently each need their own instance. Each
+    thread loads a given file once.
+    """
+    key = _cache_key(cascade_path)
+    cascades = getattr(_thread_state, 'cascades', None)
+    if cascades is None:
+        cascades = _thread_state.cascades = {}
+
+    cascade = cascades.get(key)
+    if cascade is None:
+        # Validate through the shared registry first for consistent errors
+        get_cascade(cascade_path)
+        cascade = cv2.CascadeClassifier(key[0])
+        cascades[key] = cascade
+    return cascade
+
+def find_cascade(candidates: Iterable[str] = None) -> Tuple[Optional[cv2.CascadeClassifier], Optional[str]]:
+    """
+    Return the first candidate cascade that loads successfully
+
+    Args:
+        candidates: Cascade paths in order of preference (default: DEFAULT_CANDIDATES)
+
+    Returns:
+        Tuple of (classifier, path), or (None, None) if no candidate loads
+    """
+    for cascade_path in candidates or DEFAULT_CANDIDATES:
+        try:
+            return get_cascade(cascade_path), cascade_path
+        except (FileNotFoundError, ValueError):
+            continue
+    return None, None
+
+def prewarm(cascade_paths: Iterable[str] = None) -> List[str]:
+    """
+    Load cascades ahead of the first request
+
+    Args:
+        cascade_paths: Files to load (default: the first loadable default candidate)
+
+    Returns:
+        Paths that were loaded successfully
+    """
+    if cascade_paths is None:
+        _, cascade_path = find_cascade()
+        return [cascade_path] if cascade_path else []
+
+    loaded = []
+    for cascade_path in cascade_paths:
+        try:
+            get_cascade(cascade_path)
+            loaded.append(cascade_path)
+        except (FileNotFoundError, ValueError) as e:
+            _debug(f"Could not prewarm cascade: {e}")
+    return loaded
+
+def clear() -> None:
+    """Forget all loaded cascades"""
+    with _lock:
+        _cascades.clear()
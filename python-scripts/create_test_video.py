@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Create synthetic test videos for video face detection benchmarks
+"""
+import cv2
+import numpy as np
+import os
+import argparse
+
+def load_face_patch():
+    """Load the group sample photo used as the moving content"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_dir = os.path.dirname(script_dir)
+    sample_path = os.path.join(project_dir, "face-detection-frontend", "samples", "group.jpg")
+    patch = cv2.imread(sample_path)
+    if patch is None:
+        raise FileNotFoundError(f"Sample image not found: {sample_path}")
+    return patch
+
+def create_test_video(output_path, width=1280, height=720, fps=30, seconds=10, seed=0):
+    """
+    Write a video with the group sample photo drifting over a textured background
+
+    The motion path and background are derived from the seed, so the same
+    arguments always produce the same frames.
+    """
+    rng = np.random.default_rng(seed)
+    patch = load_face_patch()
+    patch_h, patch_w = patch.shape[:2]
+
+    # Low-frequency noise background
+    background = rng.integers(60, 200, size=(height // 16, width // 16, 3), dtype=np.uint8)
+    background = cv2.resize(background, (width, height), interpolation=cv2.INTER_CUBIC)
+
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Could not open video writer for: {output_path}")
+
+    frame_count = int(fps * seconds)
+    max_x, max_y = width - patch_w, height - patch_h
+    phase = rng.uniform(0, 2 * np.pi, size=2)
+
+    for frame_index in range(frame_count):
+        t = frame_index / frame_count
+        x = int(max_x * (0.5 + 0.5 * np.sin(2 * np.pi * t + phase[0])))
+        y = int(max_y * (0.5 + 0.5 * np.sin(4 * np.pi * t + phase[1])))
+
+        frame = background.copy()
+        frame[y:y + patch_h, x:x + patch_w] = patch
+        writer.write(frame)
+
+    writer.release()
+    return frame_count
+
+def main():
+    """Create a synthetic test video"""
+    parser = argparse.ArgumentParser(description='Create a synthetic face detection test video')
+    parser.add_argument('output', nargs='?', default='test_video_720p.mp4', help='Output video path')
+    parser.add_argument('--width', type=int, default=1280, help='Frame width (default: 1280)')
+    parser.add_argument('--height', type=int, default=720, help='Frame height (default: 720)')
+    parser.add_argument('--fps', type=int, default=30, help='Frames per second (default: 30)')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration in seconds (default: 10)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    print("🎬 Creating test video...")
+    frames = create_test_video(args.output, args.width, args.height, args.fps, args.seconds, args.seed)
+    print(f"✅ Created {args.output} ({frames} frames, {args.width}x{args.height} @ {args.fps} fps)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Face Detection Engine
+Author: Nguyen Tuan Khanh
+Description: The cascade pipeline shared by simple_face_detector.py,
+             face_detector.py and enhanced_face_detector.py. A named profile
+             fixes preprocessing, the detection passes, the scanned scale
+             range and duplicate suppression, so latency can be traded for
+             recall per call instead of per entry point.
+
+               fast      one coarse pass (scale factor 1.2) on an image
+                         shrunk to a 960 px long edge, no equalization
+               balanced  one pass at 1.1 / 5 neighbors on the full image
+                         (the face_detector.py behaviour)
+               thorough  histogram equalization, three passes around the
+                         requested parameters and overlap suppression
+                         (the enhanced_face_detector.py behaviour)
+               legacy    one pass at 1.1 / 4 neighbors on the full image
+                         with no extra minimum size
+                         (the simple_face_detector.py behaviour)
+
+             Explicit scale factor, neighbor and minimum size values
+             override the profile's defaults; the pass structure and
+             preprocessing always come from the profile.
+
+             Relative size bounds (min_face_ratio / max_face_ratio) turn
+             the expected face size range into minSize / maxSize for each
+             image, so the pyramid levels that could only hold smaller or
+             larger faces are never scanned; on large uploads these are the
+             most expensive levels. The minimum is a fraction of the shorter
+             image side and the maximum of the longer side, so neither
+             bound excludes a face in the range whatever the orientation.
+
+             More profiles (e.g. written by autotune.py) are loaded from a
+             JSON profile file with load_profiles(), the --profiles-file
+             option of the detectors, or the FACE_DETECTION_PROFILES
+             environment variable at import time:
+               {"version": 1, "profiles": [{"name": ..., "scale_factor": ...,
+                 "min_neighbors": ..., "min_size": ..., ...}]}
+             Omitted fields take the values of "base" (default: balanced).
+Output: (N, 4) int32 arrays of (x, y, w, h) boxes
+"""
+
+import json
+import math
+import os
+import sys
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+import nms
+from stage_timer import NULL_TIMER, pyramid_levels
+
+# Bounds applied to the derived passes, as enhanced_face_detector.py always did
+PASS_SCALE_RANGE = (1.05, 2.0)
+PASS_NEIGHBOR_RANGE = (3, 8)
+
+class Profile(NamedTuple):
+    """Detection settings selected by name"""
+    name: str
+    description: str
+    equalize: bool
+    scale_factor: float
+    min_neighbors: int
+    min_size: int
+    # (scale factor delta, neighbor delta) of each pass after the first; a
+    # lowered value is clamped to the range minimum, a raised one to its maximum
+    extra_passes: Tuple[Tuple[float, int], ...] = ()
+    # Overlap (share of the smaller box) above which a box is dropped; None keeps all boxes
+    nms_threshold: Optional[float] = None
+    # Detect on a copy shrunk to this long edge; None scans the full image
+    max_long_edge: Optional[int] = None
+    # Expected face size range as fractions of the image (see size_bounds); None leaves it open
+    min_face_ratio: Optional[float] = None
+    max_face_ratio: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "equalize": self.equalize,
+            "passes": 1 + len(self.extra_passes),
+            "nms_threshold": self.nms_threshold,
+            "max_long_edge": self.max_long_edge,
+            "min_face_ratio": self.min_face_ratio,
+            "max_face_ratio": self.max_face_ratio
+        }
+
+PROFILES = {
+    "fast": Profile(
+        "fast", "Single coarse pass on a downscaled image",
+        equalize=False, scale_factor=1.2, min_neighbors=4, min_size=30,
+        max_long_edge=960
+    ),
+    "balanced": Profile(
+        "balanced", "Single pass at full resolution",
+        equalize=False, scale_factor=1.1, min_neighbors=5, min_size=30
+    ),
+    "thorough": Profile(
+        "thorough", "Equalized image, three passes and overlap suppression",
+        equalize=True, scale_factor=1.1, min_neighbors=5, min_size=30,
+        extra_passes=((-0.05, -1), (0.1, 2)), nms_threshold=0.3
+    ),
+    # detectMultiScale(gray, 1.1, 4); 24 px is the default cascade's window,
+    # so the minimum size filters nothing
+    "legacy": Profile(
+        "legacy", "Single pass at 1.1 / 4 neighbors, no minimum size beyond the cascade window",
+        equalize=False, scale_factor=1.1, min_neighbors=4, min_size=24
+    ),
+}
+
+DEFAULT_PROFILE = "balanced"
+
+PROFILES_ENV = "FACE_DETECTION_PROFILES"
+PROFILE_FILE_VERSION = 1
+BUILTIN_PROFILES = frozenset(PROFILES)
+
+def get_profile(profile: Any = None) -> Profile:
+    """
+    Look up a profile by name; a Profile is returned unchanged
+
+    Raises:
+        ValueError: If no profile has that name
+    """
+    if isinstance(profile, Profile):
+        return profile
+    name = profile or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown detection profile: {name} (choose from {', '.join(PROFILES)})")
+    return PROFILES[name]
+
+def profile_from_dict(fields: Dict[str, Any]) -> Profile:
+    """
+    Build a profile from a profile file entry; unknown keys (such as the
+    autotuner's "metrics") are ignored
+
+    Raises:
+        ValueError: If the entry is incomplete or a value is out of range
+    """
+    if not isinstance(fields, dict) or not fields.get("name"):
+        raise ValueError("Profile entries must be objects with a name")
+    base = get_profile(fields.get("base"))
+    values = base._asdict()
+    values.update({key: fields[key] for key in Profile._fields if key in fields})
+    try:
+        profile = Profile(
+            name=str(values["name"]),
+            description=str(values["description"]),
+            equalize=bool(values["equalize"]),
+            scale_factor=float(values["scale_factor"]),
+            min_neighbors=int(values["min_neighbors"]),
+            min_size=int(values["min_size"]),
+            extra_passes=tuple((float(sf), int(mn)) for sf, mn in values["extra_passes"]),
+            nms_threshold=None if values["nms_threshold"] is None else float(values["nms_threshold"]),
+            max_long_edge=int(values["max_long_edge"]) if values["max_long_edge"] else None,
+            min_face_ratio=float(values["min_face_ratio"]) if values["min_face_ratio"] else None,
+            max_face_ratio=float(values["max_face_ratio"]) if values["max_face_ratio"] else None
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid profile {fields['name']!r}: {e}")
+    if profile.scale_factor <= 1.0 or profile.min_neighbors < 0 or profile.min_size < 1:
+        raise ValueError(f"Invalid profile {profile.name!r}: parameters out of range")
+    error = validate_face_ratios(profile.min_face_ratio, profile.max_face_ratio)
+    if error:
+        raise ValueError(f"Invalid profile {profile.name!r}: {error}")
+    return profile
+
+def profile_to_dict(profile: Profile) -> Dict[str, Any]:
+    """Profile file entry for a profile"""
+    values = profile._asdict()
+    values["extra_passes"] = [list(deltas) for deltas in profile.extra_passes]
+    return values
+
+def load_profiles(path: str) -> List[str]:
+    """
+    Register the profiles of a profile file
+
+    Built-in profiles cannot be replaced; a name loaded before is replaced.
+
+    Returns:
+        Names of the registered profiles
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it is not a valid profile file
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            document = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid profile file {path}: {e}")
+    if not isinstance(document, dict) or document.get("version") != PROFILE_FILE_VERSION:
+        raise ValueError(f"Invalid profile file {path}: expected version {PROFILE_FILE_VERSION}")
+
+    profiles = [profile_from_dict(entry) for entry in document.get("profiles", [])]
+    for profile in profiles:
+        if profile.name in BUILTIN_PROFILES:
+            raise ValueError(f"Profile file {path} redefines built-in profile {profile.name!r}")
+    for profile in profiles:
+        PROFILES[profile.name] = profile
+    return [profile.name for profile in profiles]
+
+def save_profiles(profiles: Sequence[Profile], path: str, extra: Sequence[Dict[str, Any]] = None,
+                  **header) -> None:
+    """
+    Write a profile file
+
+    Args:
+        profiles: Profiles to write
+        path: Output path
+        extra: Optional per-profile fields stored alongside (e.g. metrics)
+        **header: Additional top-level fields (e.g. how the file was made)
+    """
+    entries = []
+    for index, profile in enumerate(profiles):
+        entry = profile_to_dict(profile)
+        if extra:
+            entry.update(extra[index])
+        entries.append(entry)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"version": PROFILE_FILE_VERSION, **header, "profiles": entries}, f, indent=2)
+        f.write("\n")
+
+def _load_env_profiles() -> None:
+    path = os.environ.get(PROFILES_ENV)
+    if not path:
+        return
+    try:
+        load_profiles(path)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not load detection profiles from {path}: {e}", file=sys.stderr)
+
+def _clamp_delta(value, delta, bounds):
+    if delta < 0:
+        return max(bounds[0], value + delta)
+    return min(bounds[1], value + delta)
+
+def pass_params(profile: Profile, scale_factor: float = None,
+                min_neighbors: int = None) -> List[Tuple[float, int]]:
+    """(scale_factor, min_neighbors) of every pass, first pass first"""
+    sf = profile.scale_factor if scale_factor is None else scale_factor
+    mn = profile.min_neighbors if min_neighbors is None else min_neighbors
+    params = [(sf, mn)]
+    for sf_delta, mn_delta in profile.extra_passes:
+        params.append((
+            _clamp_delta(sf, sf_delta, PASS_SCALE_RANGE),
+            _clamp_delta(mn, mn_delta, PASS_NEIGHBOR_RANGE)
+        ))
+    return params
+
+def scan_factors(detection_params: Sequence[Tuple[float, int]], shared_scan: bool = False) -> Dict[float, float]:
+    """Map each pass's scale factor to the scale factor actually scanned"""
+    finest = min(sf for sf, _ in detection_params)
+    return {sf: (finest if shared_scan else sf) for sf, _ in detection_params}
+
+def preprocess(gray: np.ndarray, profile: Profile, timer=NULL_TIMER) -> np.ndarray:
+    """Apply the profile's preprocessing to a grayscale image"""
+    if profile.equalize:
+        with timer.stage("equalize_hist"):
+            gray = cv2.equalizeHist(gray)
+    return gray
+
+def validate_face_ratios(min_face_ratio: float = None, max_face_ratio: float = None) -> Optional[str]:
+    """Return an error message if a relative size bound is out of range, else None"""
+    for name, ratio in (("min_face_ratio", min_face_ratio), ("max_face_ratio", max_face_ratio)):
+        if ratio is not None and not 0.0 < ratio <= 1.0:
+            return f"{name} must be in (0, 1]"
+    if min_face_ratio and max_face_ratio and min_face_ratio > max_face_ratio:
+        return "min_face_ratio must not exceed max_face_ratio"
+    return None
+
+def size_bounds(shape: tuple, min_size: int, min_face_ratio: float = None,
+                max_face_ratio: float = None) -> Tuple[Tuple[int, int], Optional[Tuple[int, int]]]:
+    """
+    minSize / maxSize for one detection image
+
+    Args:
+        shape: Shape of the image that is scanned
+        min_size: Absolute minimum face size in pixels; a relative minimum
+            never goes below it
+        min_face_ratio: Smallest face as a fraction of the shorter image side
+        max_face_ratio: Largest face as a fraction of the longer image side
+
+    Returns:
+        ((min_w, min_h), (max_w, max_h) or None for no upper bound)
+    """
+    short_side, long_side = sorted(shape[:2])
+    low = min_size
+    if min_face_ratio:
+        low = max(low, int(min_face_ratio * short_side))
+    high = None
+    if max_face_ratio:
+        side = max(low, int(math.ceil(max_face_ratio * long_side)))
+        high = (side, side)
+    return (low, low), high
+
+def working_scale(shape: tuple, profile: Profile) -> float:
+    """Resize factor (<= 1) implied by the profile's max_long_edge"""
+    long_edge = max(shape[:2])
+    if profile.max_long_edge and long_edge > profile.max_long_edge:
+        return profile.max_long_edge / long_edge
+    return 1.0
+
+def detect_multi_pass(face_cascade, gray, detection_params, min_size, shared_scan=False, timer=NULL_TIMER,
+                      max_size=None):
+    """
+    Run several (scale_factor, min_neighbors) detection passes over one image
+
+    Each pass is its own detectMultiScale call, except where passes can
+    share work: when several passes use the same scale factor with
+    min_neighbors >= 2, that scale factor is scanned once without grouping
+    (minNeighbors=0) and the raw candidates are grouped with
+    cv2.groupRectangles for each pass. With shared_scan, every pass groups
+    the candidates of the finest scale factor instead, which is faster but
+    changes the boxes of the coarser passes. Each pass, including the scan
+    it triggers, is timed as stage "pass<N>".
+
+    Returns:
+        List with one (N, 4) box array per pass, in pass order
+    """
+    scan_factor = scan_factors(detection_params, shared_scan)
+    passes_per_factor = Counter(sf for sf, _ in detection_params)
+
+    candidates = {}
+    results = []
+    for number, (sf, mn) in enumerate(detection_params, 1):
+        with timer.stage(f"pass{number}"):
+            if not shared_scan and (passes_per_factor[sf] < 2 or mn < 2):
+                faces = face_cascade.detectMultiScale(
+                    gray,
+                    scaleFactor=sf,
+                    minNeighbors=mn,
+                    minSize=(min_size, min_size),
+                    maxSize=max_size or (0, 0),
+                    flags=cv2.CASCADE_SCALE_IMAGE
+                )
+                results.append(nms.as_box_array(faces))
+                continue
+            scanned = scan_factor[sf]
+            if scanned not in candidates:
+                raw = face_cascade.detectMultiScale(
+                    gray,
+                    scaleFactor=scanned,
+                    minNeighbors=0,
+                    minSize=(min_size, min_size),
+                    maxSize=max_size or (0, 0),
+                    flags=cv2.CASCADE_SCALE_IMAGE
+                )
+                candidates[scanned] = nms.as_box_array(raw).tolist()
+            grouped, _ = cv2.groupRectangles(candidates[scanned], mn, 0.2)
+            results.append(nms.as_box_array(grouped))
+    return results
+
+def detect_boxes(face_cascade, gray: np.ndarray, profile: Profile, scale_factor: float = None,
+                 min_neighbors: int = None, min_size: Tuple[int, int] = None, max_size: Tuple[int, int] = None,
+                 shared_scan: bool = False, timer=NULL_TIMER) -> np.ndarray:
+    """
+    Run the profile's passes on an already preprocessed grayscale image
+
+    A single-pass profile is one detectMultiScale call; otherwise the
+    passes' boxes are pooled and, if the profile says so, overlaps are
+    suppressed (stage "nms").
+
+    Returns:
+        (N, 4) int32 array of (x, y, w, h) boxes
+    """
+    params = pass_params(profile, scale_factor, min_neighbors)
+    min_size = min_size or (profile.min_size, profile.min_size)
+
+    if len(params) == 1:
+        faces = face_cascade.detectMultiScale(
+            gray,
+            scaleFactor=params[0][0],
+            minNeighbors=params[0][1],
+            minSize=tuple(min_size),
+            maxSize=max_size or (0, 0),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        return nms.as_box_array(faces)
+
+    found = detect_multi_pass(face_cascade, gray, params, min_size[0], shared_scan, timer, max_size)
+    return suppress(np.concatenate(found), profile, timer)
+
+def suppress(faces: np.ndarray, profile: Profile, timer=NULL_TIMER) -> np.ndarray:
+    """Drop overlapping boxes with the profile's threshold (no-op without one)"""
+    if profile.nms_threshold is None:
+        return nms.as_box_array(faces)
+    with timer.stage("nms"):
+        return nms.non_max_suppression(faces, profile.nms_threshold, criterion=nms.OVERLAP_MIN_AREA)
+
+def count_pyramid_levels(face_cascade, sizes: Sequence[Tuple[int, int]], profile: Profile,
+                         scale_factor: float = None, min_neighbors: int = None, min_size: int = None,
+                         shared_scan: bool = False, max_size: Tuple[int, int] = None) -> int:
+    """Pyramid levels scanned over regions of the given (width, height) sizes"""
+    min_size = min_size or profile.min_size
+    factors = set(scan_factors(pass_params(profile, scale_factor, min_neighbors), shared_scan).values())
+    window = face_cascade.getOriginalWindowSize()
+    return sum(
+        pyramid_levels(size, window, sf, (min_size, min_size), max_size or (0, 0))
+        for size in sizes
+        for sf in factors
+    )
+
+def detect(face_cascade, gray: np.ndarray, profile: Any = None, scale_factor: float = None,
+           min_neighbors: int = None, min_size: int = None, regions: Sequence[Tuple[int, int, int, int]] = None,
+           shared_scan: bool = False, timer=NULL_TIMER, min_face_ratio: float = None,
+           max_face_ratio: float = None) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Full profile pipeline on a grayscale image
+
+    Args:
+        face_cascade: Loaded CascadeClassifier
+        gray: Grayscale image (not yet preprocessed)
+        profile: Profile or profile name (default: balanced)
+        scale_factor, min_neighbors, min_size: Overrides of the profile values
+        regions: (x, y, w, h) areas to scan in image coordinates (default:
+            the whole image); an empty list scans nothing
+        shared_scan: See detect_multi_pass()
+        timer: StageTimer receiving the preprocessing, resize, pass and nms stages
+        min_face_ratio, max_face_ratio: Overrides of the profile's relative
+            size bounds, see size_bounds(); they refer to the whole image,
+            also when only regions are scanned
+
+    Returns:
+        (boxes in image coordinates, info) where info holds the profile,
+        the working resolution, the minSize / maxSize used and the number
+        of pyramid levels evaluated
+    """
+    profile = get_profile(profile)
+    gray = preprocess(gray, profile, timer)
+    height, width = gray.shape[:2]
+    if regions is None:
+        regions = [(0, 0, width, height)]
+
+    scale = working_scale(gray.shape, profile)
+    working = gray
+    if scale < 1.0:
+        with timer.stage("resize"):
+            working = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        regions = [
+            (int(x * scale), int(y * scale), max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            for x, y, w, h in regions
+        ]
+
+    low, high = size_bounds(
+        working.shape, min_size or profile.min_size,
+        profile.min_face_ratio if min_face_ratio is None else min_face_ratio,
+        profile.max_face_ratio if max_face_ratio is None else max_face_ratio
+    )
+    found = []
+    for x, y, w, h in regions:
+        boxes = detect_boxes(
+            face_cascade, working[y:y + h, x:x + w], profile._replace(nms_threshold=None),
+            scale_factor, min_neighbors, low, high, shared_scan=shared_scan, timer=timer
+        )
+        if len(boxes) > 0:
+            found.append(boxes + np.array([x, y, 0, 0], dtype=boxes.dtype))
+
+    faces = np.concatenate(found) if found else nms.as_box_array([])
+    faces = suppress(faces, profile, timer)
+    if scale < 1.0:
+        faces = np.rint(faces / scale).astype(np.int32)
+
+    info = {
+        "profile": profile.name,
+        "working_resolution": {
+            "width": working.shape[1],
+            "height": working.shape[0],
+            "scale": round(scale, 6)
+        },
+        "min_size": list(low),
+        "max_size": list(high) if high else None,
+        "pyramid_levels": count_pyramid_levels(
+            face_cascade, [(w, h) for _, _, w, h in regions], profile,
+            scale_factor, min_neighbors, low[0], shared_scan, high
+        )
+    }
+    return faces, info
+
+def faces_to_list(faces: np.ndarray) -> List[Dict[str, int]]:
+    """Convert (x, y, w, h) boxes to the response's face dictionaries"""
+    return [
+        {"x": int(x), "y": int(y), "width": int(w), "height": int(h)}
+        for (x, y, w, h) in faces
+    ]
+
+_load_env_profiles()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Local Face Detection Server
+Author: Nguyen Tuan Khanh
+Description: Serves FaceDetector over HTTP (TCP or Unix socket) using a
+             pre-forked pool of worker processes, one per CPU core by default.
+             Each worker loads its own FaceDetector once at start-up.
+Output: Same JSON schema as FaceDetector.detect_faces()
+"""
+
+import json
+import multiprocessing
+import os
+import socketserver
+import sys
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from face_detector import FaceDetector
+
+# Largest request body accepted; larger uploads get 413 before anything is read
+DEFAULT_MAX_BODY = 20 * 1024 * 1024
+
+# Detector owned by each worker process, created by _init_worker
+_worker_detector = None
+
+def _init_worker(cascade_path: Optional[str]) -> None:
+    """Load the detector once per worker process"""
+    global _worker_detector
+    _worker_detector = FaceDetector(cascade_path=cascade_path)
+
+def _worker_detect(image_path: str) -> Dict[str, Any]:
+    """Run detection inside a worker process"""
+    return _worker_detector.detect_faces(image_path)
+
+def _worker_detect_bytes(data: bytes) -> Dict[str, Any]:
+    """Run detection on an encoded image inside a worker process"""
+    return _worker_detector.detect_faces_from_bytes(data)
+
+def _error_response(message: str) -> Dict[str, Any]:
+    """Create an error response in the detect_faces() schema"""
+    return {
+        "success": False,
+        "message": message,
+        "data": {
+            "face_count": 0,
+            "faces": []
+        }
+    }
+
+class DetectionService:
+    """Process pool with a bounded number of queued and running requests"""
+
+    def __init__(self, workers: int = None, queue_depth: int = None,
+                 cascade_path: str = None, timeout: float = 30.0):
+        """
+        Initialize the worker pool
+
+        Args:
+            workers: Number of worker processes (default: CPU count)
+            queue_depth: Requests allowed to wait for a free worker
+                (default: 2 per worker)
+            cascade_path: Path to Haar Cascade XML file (optional)
+            timeout: Seconds to wait for a single detection. A task still
+                running after twice this long (e.g. its worker process died)
+                gives its queue slot back
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = self.workers * 2 if queue_depth is None else queue_depth
+        self.timeout = timeout
+
+        # Fail fast in the parent if the cascade cannot be loaded
+        FaceDetector(cascade_path=cascade_path)
+
+        self._pool = multiprocessing.Pool(
+            processes=self.workers,
+            initializer=_init_worker,
+            initargs=(cascade_path,)
+        )
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+
+    def detect(self, image_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Detect faces using a pool worker
+
+        Returns:
+            Detection result, or None if the server is saturated
+        """
+        return self._submit(_worker_detect, image_path)
+
+    def detect_bytes(self, data: bytes) -> Optional[Dict[str, Any]]:
+        """Detect faces in an encoded image; None if the server is saturated"""
+        return self._submit(_worker_detect_bytes, data)
+
+    def _submit(self, function, argument) -> Optional[Dict[str, Any]]:
+        """Run a task on the pool if a queue slot is free"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            return None
+
+        with self._lock:
+            self._in_flight += 1
+        released = threading.Lock()
+
+        def release(_result=None):
+            # Called by whichever comes first: the task finishing or the abandon timer
+            if released.acquire(blocking=False):
+                with self._lock:
+                    self._in_flight -= 1
+                self._slots.release()
+
+        try:
+            # The slot is held until the task finishes, also after a timeout,
+            # so slow tasks still count against the queue bound
+            pending = self._pool.apply_async(function, (argument,), callback=release, error_callback=release)
+        except Exception as e:
+            release()
+            return _error_response(f"Worker error: {str(e)}")
+
+        try:
+            return pending.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            # A task whose worker process died never calls back; do not leak its slot
+            abandon = threading.Timer(self.timeout, release)
+            abandon.daemon = True
+            abandon.start()
+            return _error_response(f"Face detection timed out after {self.timeout} seconds")
+        except Exception as e:
+            return _error_response(f"Worker error: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return current load counters"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "rejected": self._rejected
+            }
+
+    def close(self) -> None:
+        """Stop all worker processes"""
+        self._pool.terminate()
+        self._pool.join()
+
+class DetectionRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP endpoints:
+      POST /detect  body {"image_path": "..."}, or the encoded image itself
+                    with an image/* or application/octet-stream content type
+      GET  /health  pool load counters
+    """
+
+    server_version = "FaceDetectionServer/1.0"
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, _error_response(f"Unknown endpoint: {self.path}"))
+            return
+        self._send_json(200, {"status": "OK", **self.server.service.stats()})
+
+    def do_POST(self):
+        if self.path != "/detect":
+            self._send_json(404, _error_response(f"Unknown endpoint: {self.path}"))
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError(f"negative Content-Length {length}")
+        except ValueError:
+            self._send_json(400, _error_response("Invalid Content-Length header"))
+            return
+        if length > self.server.max_body:
+            self.close_connection = True
+            self._send_json(413, _error_response(f"Request body exceeds {self.server.max_body} bytes"))
+            return
+        body = self.rfile.read(length)
+        content_type = self.headers.get("Content-Type", "")
+
+        if content_type.startswith("image/") or content_type == "application/octet-stream":
+            result = self.server.service.detect_bytes(body)
+        else:
+            try:
+                image_path = json.loads(body or b"{}")["image_path"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, _error_response('Request body must be JSON with an "image_path" field'))
+                return
+            result = self.server.service.detect(image_path)
+
+        if result is None:
+            self._send_json(503, _error_response("Server busy: detection queue is full, retry later"),
+                            headers={"Retry-After": "1"})
+            return
+
+        self._send_json(200, result)
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket peers have no host/port
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded HTTP server bound to a Unix domain socket"""
+
+    daemon_threads = True
+
+def create_server(service: DetectionService, host: str = "127.0.0.1", port: int = 8765,
+                  unix_socket: str = None, quiet: bool = False, max_body: int = DEFAULT_MAX_BODY):
+    """Create an HTTP server bound to a TCP port or a Unix socket"""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        server = UnixHTTPServer(unix_socket, DetectionRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), DetectionRequestHandler)
+
+    server.service = service
+    server.quiet = quiet
+    server.max_body = max_body
+    return server
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Local multi-process face detection server",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python detection_server.py --port 8765
+  python detection_server.py --workers 4 --queue-depth 16
+  python detection_server.py --unix-socket /tmp/face-detection.sock
+
+  curl -X POST localhost:8765/detect -d '{"image_path": "/abs/path/image.jpg"}'
+  curl -X POST localhost:8765/detect -H 'Content-Type: image/jpeg' --data-binary @image.jpg
+        """
+    )
+
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Bind port (default: 8765)')
+    parser.add_argument('--unix-socket', help='Listen on a Unix socket instead of TCP')
+    parser.add_argument('--workers', '-w', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--queue-depth', type=int,
+                        help='Requests allowed to wait for a worker before "busy" (default: 2 per worker)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                        help='Per-request detection timeout in seconds (default: 30)')
+    parser.add_argument('--max-body-mb', type=float, default=DEFAULT_MAX_BODY / (1024 * 1024),
+                        help='Largest request body in MB; larger requests get 413 (default: 20)')
+    parser.add_argument('--cascade', '-c', help='Path to Haar Cascade XML file (optional)')
+    parser.add_argument('--quiet', '-q', action='store_true', help='Suppress request logging')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    service = DetectionService(
+        workers=args.workers,
+        queue_depth=args.queue_depth,
+        cascade_path=args.cascade,
+        timeout=args.timeout
+    )
+    server = create_server(service, args.host, args.port, args.unix_socket, args.quiet,
+                           int(args.max_body_mb * 1024 * 1024))
+
+    address = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"🚀 Face detection server on {address} "
+          f"({service.workers} workers, queue depth {service.queue_depth})", file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+
+if __name__ == "__main__":
+    main()
@@ -7,42 +7,55 @@ import json
 import sys
 import os
 import argparse
+import base64
+
+import cascade_registry
+import detection_engine
+import nms
+import output_format
+from face_detector import decode_image, decode_base64_image
+from result_cache import ResultCache, cascade_identity, make_key
+from ensemble_detector import EnsembleDetector
+from perceptual_index import PerceptualIndex, verification_regions
+from prefilter import DECISION_ROI, DECISION_SKIP, FaceGate
+from stage_timer import NULL_TIMER, attach_timings, make_timer, profile_to
 
 def remove_overlapping_faces(faces, overlap_threshold=0.3):
-    """Remove overlapping face detections"""
-    if len(faces) == 0:
-        return faces
-    
-    # Convert to list for easier processing
-    faces_list = [(x, y, w, h) for (x, y, w, h) in faces]
-    keep = []
-    
-    for i, face1 in enumerate(faces_list):
-        x1, y1, w1, h1 = face1
-        overlap_found = False
-        
-        for j, face2 in enumerate(keep):
-            x2, y2, w2, h2 = face2
-            
-            # Calculate overlap
-            overlap_x = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
-            overlap_y = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
-            overlap_area = overlap_x * overlap_y
-            
-            area1 = w1 * h1
-            area2 = w2 * h2
-            
-            # Check if overlap ratio is too high
-            if overlap_area / min(area1, area2) > overlap_threshold:
-                overlap_found = True
-                break
-        
-        if not overlap_found:
-            keep.append(face1)
-    
-    return keep
+    """
+    Remove overlapping face detections
+
+    A face is dropped when its intersection with an already kept face
+    exceeds overlap_threshold times the smaller of the two areas.
+
+    Returns:
+        (N, 4) int32 array of kept (x, y, w, h) boxes
+    """
+    return nms.non_max_suppression(faces, overlap_threshold, criterion=nms.OVERLAP_MIN_AREA)
+
+def load_face_cascade():
+    """
+    Return the first usable Haar Cascade classifier from the process-wide registry
+
+    Returns:
+        Tuple of (CascadeClassifier, cascade path), or (None, None) if no
+        candidate file could be loaded
+    """
+    return cascade_registry.find_cascade()
+
+def validate_params(min_size, scale_factor, min_neighbors):
+    """Return an error message if a detection parameter is out of range, else None"""
+    if min_size < 5 or min_size > 300:
+        return "min_size must be between 10 and 300"
+    if scale_factor < 1.05 or scale_factor > 2.0:
+        return "scale_factor must be between 1.05 and 2.0"
+    if min_neighbors < 1 or min_neighbors > 20:
+        return "min_neighbors must be between 1 and 20"
+    return None
 
-def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neighbors=5):
+def detect_faces_with_params(image_path, min_size=None, scale_factor=None, min_neighbors=None,
+                             face_cascade=None, image=None, shared_scan=False, timer=None,
+                             ensemble=None, gate=None, profile="thorough", min_face_ratio=None,
+                             max_face_ratio=None, near_duplicates=None):
     """
     Face detection function with customizable parameters
     
@@ -51,41 +64,43 @@ def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neig
         min_size: Minimum possible object size, smaller objects are ignored
         scale_factor: How much the image size is reduced at each scale
         min_neighbors: How many neighbors each candidate rectangle should retain
+            (these three default to the profile's values)
+        face_cascade: Already loaded classifier to reuse (loaded on demand if None)
+        image: Already decoded BGR image; when given, image_path is only used in messages
+        shared_scan: Scan the image pyramid once at the finest scale factor and
+            apply every pass's neighbor threshold to that candidate set
+            (faster, box coordinates may differ slightly)
+        timer: StageTimer for per-stage durations under processing_info.timings
+            (see stage_timer.make_timer); disabled when None
+        ensemble: EnsembleDetector to run instead of the three passes; faces
+            are then tagged with the cascade that found them
+        gate: FaceGate run first; images without candidates are not scanned
+            and the passes only scan candidate regions (the ensemble honours
+            skips but always scans the whole image)
+        profile: Detection profile name, see detection_engine.PROFILES
+        min_face_ratio: Smallest face as a fraction of the shorter image side
+        max_face_ratio: Largest face as a fraction of the longer image side
+            (both turn into minSize / maxSize per image and default to the
+            profile's; see detection_engine.size_bounds)
+        near_duplicates: PerceptualIndex of recently processed images; a
+            near-duplicate reuses their rescaled boxes, or only scans around
+            them when the index verifies (not used with the ensemble)
     """
+    timer = timer or NULL_TIMER
+    try:
+        profile = detection_engine.get_profile(profile)
+    except ValueError as e:
+        return _error_result(str(e))
+    if min_face_ratio is not None:
+        profile = profile._replace(min_face_ratio=min_face_ratio)
+    if max_face_ratio is not None:
+        profile = profile._replace(max_face_ratio=max_face_ratio)
+    min_size = profile.min_size if min_size is None else min_size
+    scale_factor = profile.scale_factor if scale_factor is None else scale_factor
+    min_neighbors = profile.min_neighbors if min_neighbors is None else min_neighbors
     
-    # Get absolute path to script directory
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Debug current working directory
-    print(f"DEBUG: Current working directory: {os.getcwd()}", file=sys.stderr)
-    print(f"DEBUG: Script directory: {script_dir}", file=sys.stderr)
-    
-    # Try to find cascade file với absolute paths
-    cascade_files = [
-        os.path.join(script_dir, 'haarcascade_frontalface_default.xml'),
-        os.path.join(script_dir, 'haarcascade_frontalface_alt.xml'),
-        'haarcascade_frontalface_default.xml',  # Fallback for current directory
-        os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'),
-        os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_alt.xml')
-    ]
-    face_cascade = None
-    cascade_used = None
-    for cascade_file in cascade_files:
-        print(f"DEBUG: Trying cascade file: {cascade_file}", file=sys.stderr)
-        if os.path.exists(cascade_file):
-            try:
-                face_cascade = cv2.CascadeClassifier(cascade_file)
-                if not face_cascade.empty():
-                    cascade_used = cascade_file
-                    print(f"DEBUG: Successfully loaded cascade: {cascade_file}", file=sys.stderr)
-                    break
-                else:
-                    print(f"DEBUG: Cascade file empty: {cascade_file}", file=sys.stderr)
-            except Exception as e:
-                print(f"DEBUG: Failed to load cascade {cascade_file}: {e}", file=sys.stderr)
-                continue
-        else:
-            print(f"DEBUG: Cascade file not found: {cascade_file}", file=sys.stderr)
+    if face_cascade is None:
+        face_cascade, _ = load_face_cascade()
     
     if face_cascade is None or face_cascade.empty():
         return {
@@ -97,6 +112,10 @@ def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neig
             }
         }
     
+    if image is not None:
+        return _detect_in_image(face_cascade, image, min_size, scale_factor, min_neighbors, shared_scan, timer,
+                                ensemble, gate, profile, near_duplicates)
+    
     # Check if image exists
     if not os.path.exists(image_path):
         return {
@@ -110,7 +129,8 @@ def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neig
     
     try:
         # Load image
-        image = cv2.imread(image_path)
+        with timer.stage("decode"):
+            image = cv2.imread(image_path)
         if image is None:
             return {
                 "success": False,
@@ -120,53 +140,106 @@ def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neig
                     "faces": []
                 }
             }
-          # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Error during face detection: {str(e)}",
+            "data": {
+                "face_count": 0,
+                "faces": []
+            }
+        }
+    
+    return _detect_in_image(face_cascade, image, min_size, scale_factor, min_neighbors, shared_scan, timer,
+                            ensemble, gate, profile, near_duplicates)
+
+def _detect_in_image(face_cascade, image, min_size, scale_factor, min_neighbors, shared_scan=False,
+                     timer=NULL_TIMER, ensemble=None, gate=None, profile="thorough", near_duplicates=None):
+    """Run the profile's passes (or the ensemble) on a decoded BGR image"""
+    try:
+        profile = detection_engine.get_profile(profile)
         
-        # Apply histogram equalization for better contrast
-        gray = cv2.equalizeHist(gray)
+        # Convert to grayscale
+        with timer.stage("grayscale"):
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
-        # Detect faces with multiple scale factors for better coverage
-        all_faces = []
+        height, width = gray.shape[:2]
+        regions = None
+        decision = None
+        near = None
+        if near_duplicates is not None and ensemble is None:
+            with timer.stage("near_duplicate"):
+                image_hash = near_duplicates.hash(gray)
+                near_params = {
+                    "detector": "enhanced",
+                    "profile": detection_engine.profile_to_dict(profile),
+                    "min_size": min_size,
+                    "scale_factor": scale_factor,
+                    "min_neighbors": min_neighbors,
+                    "shared_scan": shared_scan,
+                    "prefilter": gate.recall_margin if gate is not None else None
+                }
+                near = near_duplicates.lookup(image_hash, (width, height), near_params)
+            if near is not None and near_duplicates.verify:
+                regions = verification_regions(near.faces, (width, height))
         
-        # Use multiple detection strategies
-        detection_params = [
-            (scale_factor, min_neighbors),
-            (max(1.05, scale_factor - 0.05), max(3, min_neighbors - 1)),
-            (min(2.0, scale_factor + 0.1), min(8, min_neighbors + 2))
-        ]
+        if gate is not None and near is None:
+            with timer.stage("prefilter"):
+                decision = gate.evaluate(image)
+            if decision.decision == DECISION_SKIP:
+                regions = []
+            elif decision.decision == DECISION_ROI:
+                regions = decision.rois
         
-        for sf, mn in detection_params:
-            faces = face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=sf,
-                minNeighbors=mn,
-                minSize=(min_size, min_size),
-                flags=cv2.CASCADE_SCALE_IMAGE
+        if ensemble is not None:
+            gray = detection_engine.preprocess(gray, profile, timer)
+            (ensemble_min_size, _), _ = detection_engine.size_bounds(
+                gray.shape, min_size, profile.min_face_ratio, profile.max_face_ratio
             )
-            
-            if len(faces) > 0:
-                all_faces.extend(faces)
+            with timer.stage("ensemble"):
+                if regions != []:
+                    faces_list, report = ensemble.detect(gray, scale_factor, min_neighbors, ensemble_min_size)
+                else:
+                    faces_list, report = [], {"members": [], "early_exit": "prefilter", "elapsed_ms": 0.0}
+            result = {
+                "success": True,
+                "message": "Face detection completed",
+                "data": {
+                    "face_count": len(faces_list),
+                    "faces": faces_list,
+                    "parameters": {
+                        "min_size": min_size,
+                        "scale_factor": scale_factor,
+                        "min_neighbors": min_neighbors,
+                        "profile": profile.name,
+                        "ensemble": [member["name"] for member in report["members"]]
+                    },
+                    "ensemble": report
+                }
+            }
+            if decision is not None:
+                result["data"]["prefilter"] = decision.to_dict()
+            return attach_timings(result, timer, image_pixels=int(gray.shape[0] * gray.shape[1]))
         
-        # Remove duplicate/overlapping faces
-        if len(all_faces) > 0:
-            unique_faces = remove_overlapping_faces(all_faces)
+        if near is not None and not near_duplicates.verify:
+            # Boxes of the stored near-duplicate, rescaled; nothing is scanned
+            unique_faces = near.faces
+            low, high = detection_engine.size_bounds(
+                gray.shape, min_size, profile.min_face_ratio, profile.max_face_ratio
+            )
+            info = {"min_size": list(low), "max_size": list(high) if high else None, "pyramid_levels": 0}
         else:
-            unique_faces = []
+            # Preprocess, run every pass of the profile and remove duplicate/overlapping faces
+            unique_faces, info = detection_engine.detect(
+                face_cascade, gray, profile, scale_factor, min_neighbors, min_size,
+                regions=regions, shared_scan=shared_scan, timer=timer
+            )
+        if near_duplicates is not None and ensemble is None and near is None:
+            near_duplicates.add(image_hash, (width, height), unique_faces, near_params)
         
-        print(f"DEBUG: Total detections before filtering: {len(all_faces)}", file=sys.stderr)
-        print(f"DEBUG: Unique faces after filtering: {len(unique_faces)}", file=sys.stderr)
-          # Convert faces to list format
-        faces_list = []
-        for (x, y, w, h) in unique_faces:
-            faces_list.append({
-                "x": int(x),
-                "y": int(y),
-                "width": int(w),
-                "height": int(h)
-            })
+        faces_list = detection_engine.faces_to_list(unique_faces)
         
-        return {
+        result = {
             "success": True,
             "message": "Face detection completed",
             "data": {
@@ -175,10 +248,32 @@ def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neig
                 "parameters": {
                     "min_size": min_size,
                     "scale_factor": scale_factor,
-                    "min_neighbors": min_neighbors
+                    "min_neighbors": min_neighbors,
+                    "shared_scan": shared_scan,
+                    "profile": profile.name,
+                    "min_face_ratio": profile.min_face_ratio,
+                    "max_face_ratio": profile.max_face_ratio,
+                    "size_bounds": {"min_size": info["min_size"], "max_size": info["max_size"]},
+                    "pyramid_levels": info["pyramid_levels"]
                 }
             }
         }
+        if decision is not None:
+            result["data"]["prefilter"] = decision.to_dict()
+        if near is not None:
+            result["processing_info"] = {
+                "near_duplicate": dict(near.to_dict(), verified=near_duplicates.verify)
+            }
+        elif near_duplicates is not None and ensemble is None:
+            result["processing_info"] = {"near_duplicate": {"status": "miss"}}
+        
+        if timer.enabled:
+            attach_timings(
+                result, timer,
+                image_pixels=int(width * height),
+                pyramid_levels=info["pyramid_levels"]
+            )
+        return result
         
     except Exception as e:
         return {
@@ -190,56 +285,386 @@ def detect_faces_with_params(image_path, min_size=30, scale_factor=1.1, min_neig
             }
         }
 
+def _error_result(message):
+    """Build an error response in the standard schema"""
+    return {
+        "success": False,
+        "message": message,
+        "data": {"face_count": 0, "faces": []}
+    }
+
+# Ensemble shared by all worker requests, created on first use
+_ensemble = None
+
+def get_ensemble():
+    """Return the shared EnsembleDetector, loading its cascades on first use"""
+    global _ensemble
+    if _ensemble is None:
+        _ensemble = EnsembleDetector()
+    return _ensemble
+
+# Pre-filter gates shared by all worker requests, one per (minimum face size, recall margin step)
+_gates = {}
+
+# Client margins are rounded to this many decimals, which bounds _gates to
+# 100 entries per validated min_size
+RECALL_MARGIN_DECIMALS = 2
+
+def get_gate(recall_margin=0.25, min_face=30):
+    """
+    Return the shared FaceGate for a recall margin and minimum face size,
+    creating it on first use
+
+    Raises:
+        ValueError: If the margin is outside [0, 1) after rounding
+    """
+    recall_margin = round(recall_margin, RECALL_MARGIN_DECIMALS)
+    key = (min_face, recall_margin)
+    if key not in _gates:
+        _gates[key] = FaceGate(min_face=min_face, recall_margin=recall_margin)
+    return _gates[key]
+
+def _read_request_image(request):
+    """
+    Return the encoded image bytes of a worker request
+
+    Raises:
+        ValueError: If the request has no readable image
+    """
+    if request.get("image_base64"):
+        try:
+            return base64.b64decode(request["image_base64"])
+        except ValueError:
+            raise ValueError("Could not decode image payload")
+    
+    image_path = request.get("image_path")
+    if not image_path:
+        raise ValueError("Request must contain image_path or image_base64")
+    try:
+        with open(image_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        raise ValueError(f"Image not found: {image_path}")
+
+def _handle_detect(request, face_cascade, cache=None, cascade_id=None, near_duplicates=None):
+    """Run detection for a single worker request, consulting the cache and near-duplicate index if given"""
+    try:
+        profile = detection_engine.get_profile(request.get("profile", "thorough"))
+        min_size = int(request.get("min_size", profile.min_size))
+        scale_factor = float(request.get("scale_factor", profile.scale_factor))
+        min_neighbors = int(request.get("min_neighbors", profile.min_neighbors))
+        shared_scan = bool(request.get("shared_scan", False))
+        timings = bool(request.get("timings", False))
+        use_ensemble = bool(request.get("ensemble", False))
+        use_prefilter = bool(request.get("prefilter", False))
+        recall_margin = round(float(request.get("recall_margin", 0.25)), RECALL_MARGIN_DECIMALS)
+        min_face_ratio = request.get("min_face_ratio")
+        min_face_ratio = None if min_face_ratio is None else float(min_face_ratio)
+        max_face_ratio = request.get("max_face_ratio")
+        max_face_ratio = None if max_face_ratio is None else float(max_face_ratio)
+    except (TypeError, ValueError) as e:
+        return _error_result(f"Invalid detection parameters: {e}")
+    
+    error = (validate_params(min_size, scale_factor, min_neighbors)
+             or detection_engine.validate_face_ratios(min_face_ratio, max_face_ratio))
+    if error:
+        return _error_result(error)
+    
+    try:
+        # The gate must not skip faces the request's min_size still allows
+        gate = get_gate(recall_margin, min_size) if use_prefilter else None
+    except ValueError as e:
+        return _error_result(f"Invalid detection parameters: {e}")
+    
+    timer = make_timer(timings)
+    ensemble = get_ensemble() if use_ensemble else None
+    
+    if cache is None and request.get("image_path") and not request.get("image_base64"):
+        # Without a cache the bytes are not needed; let OpenCV read the file
+        return detect_faces_with_params(
+            request["image_path"], min_size, scale_factor, min_neighbors,
+            face_cascade=face_cascade, shared_scan=shared_scan, timer=timer, ensemble=ensemble, gate=gate,
+            profile=profile, min_face_ratio=min_face_ratio, max_face_ratio=max_face_ratio,
+            near_duplicates=near_duplicates
+        )
+    
+    try:
+        data = _read_request_image(request)
+    except ValueError as e:
+        return _error_result(str(e))
+    
+    def detect():
+        with timer.stage("decode"):
+            image = decode_image(data)
+        if image is None:
+            return _error_result("Could not decode image payload")
+        return detect_faces_with_params(
+            request.get("image_path") or "<payload>", min_size, scale_factor, min_neighbors,
+            face_cascade=face_cascade, image=image, shared_scan=shared_scan, timer=timer,
+            ensemble=ensemble, gate=gate, profile=profile,
+            min_face_ratio=min_face_ratio, max_face_ratio=max_face_ratio, near_duplicates=near_duplicates
+        )
+    
+    if cache is None:
+        return detect()
+    
+    params = {
+        "detector": "enhanced",
+        "profile": detection_engine.profile_to_dict(profile),
+        "min_size": min_size,
+        "scale_factor": scale_factor,
+        "min_neighbors": min_neighbors,
+        "shared_scan": shared_scan,
+        "timings": timings,
+        "ensemble": use_ensemble,
+        "prefilter": recall_margin if use_prefilter else None,
+        "face_ratios": [min_face_ratio, max_face_ratio]
+    }
+    return cache.get_or_compute(make_key(data, cascade_id, params), detect)
+
+def handle_request(request, face_cascade, cache=None, cascade_id=None, near_duplicates=None):
+    """
+    Handle a single worker request
+
+    Args:
+        request: Decoded request object. Either {"command": "ping"},
+            {"command": "stats"} or a detection request with "image_path"
+            or "image_base64" plus the optional min_size / scale_factor /
+            min_neighbors / profile / min_face_ratio / max_face_ratio /
+            shared_scan / timings / ensemble / prefilter / recall_margin
+            parameters (output_format is handled by serve())
+        face_cascade: Classifier loaded once at worker start-up
+        cache: Optional ResultCache shared by all requests of this worker
+        cascade_id: Cascade identity used in cache keys
+        near_duplicates: Optional PerceptualIndex shared by all requests of this worker
+
+    Returns:
+        Response dictionary; the request "id" is echoed back when present
+    """
+    command = request.get("command", "detect")
+    
+    if command == "ping":
+        result = {"success": True, "message": "pong"}
+    elif command == "stats":
+        result = {
+            "success": True,
+            "message": "stats",
+            "cache": cache.stats() if cache else None,
+            "near_duplicates": near_duplicates.stats() if near_duplicates else None,
+            "prefilter": [gate.stats() for gate in _gates.values()]
+        }
+    elif command == "detect":
+        result = _handle_detect(request, face_cascade, cache, cascade_id, near_duplicates)
+    else:
+        result = _error_result(f"Unknown command: {command}")
+    
+    if "id" in request:
+        result["id"] = request["id"]
+    return result
+
+def serve(input_stream=None, output_stream=None, cache=None, default_format="json", near_duplicates=None):
+    """
+    Persistent worker mode: load the cascade once, then answer one JSON
+    request per input line with one response per request. Responses use
+    the request's "output_format", else default_format; only the framed
+    output_format.STREAM_FORMATS are accepted. Binary responses are
+    self-delimiting and not newline terminated. The ready line is always
+    JSON.
+    The loop ends when the input stream is closed.
+
+    Args:
+        output_stream: Binary stream for responses (default: stdout)
+        cache: Optional ResultCache for images that are sent repeatedly
+        default_format: Encoding for requests that do not choose one
+        near_duplicates: Optional PerceptualIndex for re-encoded, resized or
+            lightly cropped copies of recently processed images
+    """
+    input_stream = input_stream or sys.stdin
+    output_stream = output_stream or sys.stdout.buffer
+    
+    face_cascade, cascade_used = load_face_cascade()
+    if face_cascade is None:
+        output_stream.write(output_format.encode(_error_result("Could not load Haar Cascade classifier")))
+        output_stream.flush()
+        return 1
+    
+    cascade_id = cascade_identity(cascade_used)
+    
+    # Announce readiness so the parent process knows start-up has finished
+    output_stream.write(output_format.encode({
+        "success": True,
+        "message": "ready",
+        "cascade_file": os.path.basename(cascade_used)
+    }))
+    output_stream.flush()
+    
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        response_format = default_format
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            response_format = request.get("output_format", default_format)
+            if response_format not in output_format.STREAM_FORMATS:
+                response_format = default_format
+                raise ValueError(f"output_format {request['output_format']!r} cannot be used by a worker "
+                                 f"(choose from {', '.join(output_format.STREAM_FORMATS)})")
+        except ValueError as e:
+            result = _error_result(f"Invalid request: {e}")
+        else:
+            result = handle_request(request, face_cascade, cache, cascade_id, near_duplicates)
+        
+        try:
+            output_stream.write(output_format.encode(result, response_format))
+        except ValueError as e:
+            output_stream.write(output_format.encode(_error_result(str(e)), default_format))
+        output_stream.flush()
+    
+    return 0
+
+def _write_result(result, result_format=None):
+    """Write one result to stdout in the chosen encoding (default: indented JSON)"""
+    try:
+        data = output_format.encode(result, result_format or "pretty")
+    except ValueError as e:
+        data = output_format.encode(_error_result(str(e)), "pretty")
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Face Detection with OpenCV')
-    parser.add_argument('image_path', help='Path to the image file')
-    parser.add_argument('--min-size', type=int, default=30, 
-                        help='Minimum face size in pixels (default: 30)')
-    parser.add_argument('--scale-factor', type=float, default=1.1,
-                        help='Scale factor for detection (default: 1.1)')
-    parser.add_argument('--min-neighbors', type=int, default=5,
-                        help='Minimum neighbors for detection (default: 5)')
+    parser.add_argument('image_path', nargs='?', help='Path to the image file')
+    parser.add_argument('--detection-profile', default='thorough',
+                        help='Preprocessing, passes and overlap filtering preset: fast, balanced, thorough '
+                             'or one from --profiles-file (default: thorough)')
+    parser.add_argument('--profiles-file',
+                        help='Load more detection profiles from this file (e.g. written by autotune.py)')
+    parser.add_argument('--min-size', type=int,
+                        help='Minimum face size in pixels (default: from the profile, 30)')
+    parser.add_argument('--scale-factor', type=float,
+                        help='Scale factor for detection (default: from the profile, 1.1)')
+    parser.add_argument('--min-neighbors', type=int,
+                        help='Minimum neighbors for detection (default: from the profile, 5)')
+    parser.add_argument('--min-face-ratio', type=float,
+                        help='Smallest face as a fraction of the shorter image side (raises minSize per image)')
+    parser.add_argument('--max-face-ratio', type=float,
+                        help='Largest face as a fraction of the longer image side (sets maxSize per image)')
+    parser.add_argument('--shared-scan', action='store_true',
+                        help='Scan the image pyramid once for all passes (faster, approximate)')
+    parser.add_argument('--ensemble', action='store_true',
+                        help='Run the frontal, alt and profile cascade ensemble instead of the three passes')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Skip images without skin/texture candidates and scan only candidate regions')
+    parser.add_argument('--recall-margin', type=float, default=0.25,
+                        help='Pre-filter safety margin in [0, 1); higher skips less often (default: 0.25)')
+    parser.add_argument('--timings', action='store_true',
+                        help='Add per-stage durations under processing_info.timings')
+    parser.add_argument('--profile', metavar='OUTPUT',
+                        help='Run detection under cProfile and write the stats to this file')
+    parser.add_argument('--stdin', action='store_true',
+                        help='Read the encoded image from stdin instead of image_path')
+    parser.add_argument('--base64', action='store_true',
+                        help='With --stdin, the input is base64 text rather than raw bytes')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run as a persistent worker reading JSON requests from stdin, one per line')
+    parser.add_argument('--output-format', choices=output_format.FORMATS,
+                        help='Result encoding (default: pretty, or json with --serve, which only accepts '
+                             'json, jsonl and binary); see output_format.py')
+    parser.add_argument('--cache-size', type=int, default=0,
+                        help='With --serve, cache results for this many images (default: 0, disabled)')
+    parser.add_argument('--cache-bytes', type=int,
+                        help='With --serve, also bound the in-memory cache by serialized size')
+    parser.add_argument('--cache-db',
+                        help='With --serve, persist cached results in this SQLite file')
+    parser.add_argument('--near-dup-size', type=int, default=0,
+                        help='With --serve, reuse boxes for near-duplicates of this many recent images '
+                             '(default: 0, disabled)')
+    parser.add_argument('--near-dup-threshold', type=int, default=6,
+                        help='Largest Hamming distance of the 64-bit hashes counted as a near-duplicate (default: 6)')
+    parser.add_argument('--near-dup-hash', choices=('dhash', 'phash'), default='dhash',
+                        help='Perceptual hash for --near-dup-size (default: dhash)')
+    parser.add_argument('--near-dup-verify', action='store_true',
+                        help='Re-detect inside the transferred regions instead of returning them as they are')
     
     args = parser.parse_args()
     
-    # Validate parameters
-    if args.min_size < 5 or args.min_size > 300:
-        result = {
-            "success": False,
-            "message": "min_size must be between 10 and 300",
-            "data": {"face_count": 0, "faces": []}
-        }
-        print(json.dumps(result, indent=2))
-        return
+    if args.profiles_file:
+        try:
+            detection_engine.load_profiles(args.profiles_file)
+        except (OSError, ValueError) as e:
+            _write_result(_error_result(str(e)), args.output_format)
+            sys.exit(1)
     
-    if args.scale_factor < 1.05 or args.scale_factor > 2.0:
-        result = {
-            "success": False,
-            "message": "scale_factor must be between 1.05 and 2.0",
-            "data": {"face_count": 0, "faces": []}
-        }
-        print(json.dumps(result, indent=2))
+    if args.serve:
+        if args.output_format and args.output_format not in output_format.STREAM_FORMATS:
+            parser.error(f"--serve needs an output format from {', '.join(output_format.STREAM_FORMATS)}")
+        cache = None
+        if args.cache_size > 0 or args.cache_db:
+            cache = ResultCache(args.cache_size or None, args.cache_bytes, args.cache_db)
+        near_duplicates = None
+        if args.near_dup_size > 0:
+            try:
+                near_duplicates = PerceptualIndex(args.near_dup_size, args.near_dup_threshold,
+                                                  args.near_dup_hash, args.near_dup_verify)
+            except ValueError as e:
+                parser.error(str(e))
+        sys.exit(serve(cache=cache, default_format=args.output_format or "json",
+                       near_duplicates=near_duplicates))
+    
+    if not args.image_path and not args.stdin:
+        parser.error("image_path is required unless --stdin or --serve is given")
+    
+    # Fill in the profile's defaults, then validate parameters
+    try:
+        profile = detection_engine.get_profile(args.detection_profile)
+    except ValueError as e:
+        _write_result(_error_result(str(e)), args.output_format)
         return
-    if args.min_neighbors < 1 or args.min_neighbors > 20:
-        result = {
-            "success": False,
-            "message": "min_neighbors must be between 1 and 20",
-            "data": {"face_count": 0, "faces": []}
-        }
-        print(json.dumps(result, indent=2))
+    if args.min_size is None:
+        args.min_size = profile.min_size
+    if args.scale_factor is None:
+        args.scale_factor = profile.scale_factor
+    if args.min_neighbors is None:
+        args.min_neighbors = profile.min_neighbors
+    error = (validate_params(args.min_size, args.scale_factor, args.min_neighbors)
+             or detection_engine.validate_face_ratios(args.min_face_ratio, args.max_face_ratio))
+    if error:
+        _write_result(_error_result(error), args.output_format)
         return
     
-    # Perform face detection
-    result = detect_faces_with_params(
-        args.image_path, 
-        args.min_size, 
-        args.scale_factor, 
-        args.min_neighbors
-    )
+    timer = make_timer(args.timings)
+    with profile_to(args.profile):
+        image = None
+        if args.stdin:
+            data = sys.stdin.buffer.read()
+            with timer.stage("decode"):
+                image = decode_base64_image(data) if args.base64 else decode_image(data)
+            if image is None:
+                _write_result(_error_result("Could not decode image from stdin"), args.output_format)
+                return
+        
+        # Perform face detection
+        result = detect_faces_with_params(
+            args.image_path or "<stdin>", 
+            args.min_size, 
+            args.scale_factor, 
+            args.min_neighbors,
+            image=image,
+            shared_scan=args.shared_scan,
+            timer=timer,
+            ensemble=EnsembleDetector() if args.ensemble else None,
+            gate=FaceGate(min_face=args.min_size, recall_margin=args.recall_margin) if args.prefilter else None,
+            profile=profile,
+            min_face_ratio=args.min_face_ratio,
+            max_face_ratio=args.max_face_ratio
+        )
     
-    # Output JSON result
-    print(json.dumps(result, indent=2))
+    # Output result
+    _write_result(result, args.output_format)
 
 if __name__ == "__main__":
     main()
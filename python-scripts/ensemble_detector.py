@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Multi-cascade Ensemble Face Detection
+Author: Nguyen Tuan Khanh
+Description: Runs several Haar cascades (frontal default, frontal alt,
+             profile and profile on the mirrored image) concurrently over
+             one decoded grayscale buffer, merges their boxes with NMS and
+             tags every face with the cascade that found it. Cascades are
+             started in priority order, in waves of `workers` at a time;
+             once a confidence target or a time budget is met, the waves
+             that have not started are skipped. A running cascade cannot be
+             interrupted, so with an early-exit policy the default is one
+             cascade per wave.
+Output: Same JSON schema as FaceDetector.detect_faces(), with "cascade",
+        "confidence" and "found_by" on every face and an "ensemble" report
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import cascade_registry
+import nms
+
+class EnsembleMember(NamedTuple):
+    """One cascade of the ensemble"""
+    name: str
+    cascade_file: str
+    # Run on the horizontally mirrored image (profile cascades only see one side)
+    flip: bool = False
+
+# Priority order: cheaper and more reliable cascades first
+DEFAULT_MEMBERS = [
+    EnsembleMember("frontal_default", "haarcascade_frontalface_default.xml"),
+    EnsembleMember("frontal_alt", "haarcascade_frontalface_alt.xml"),
+    EnsembleMember("profile", "haarcascade_profileface.xml"),
+    EnsembleMember("profile_flipped", "haarcascade_profileface.xml", flip=True),
+]
+
+def resolve_cascade(cascade_file: str) -> str:
+    """Find a cascade file next to the scripts, else in OpenCV's data directory"""
+    if os.path.isabs(cascade_file):
+        return cascade_file
+    for directory in (cascade_registry.SCRIPT_DIR, cv2.data.haarcascades):
+        path = os.path.join(directory, cascade_file)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Cascade file not found: {cascade_file}")
+
+class EnsembleDetector:
+    """Concurrent multi-cascade detection with an early-exit policy"""
+
+    def __init__(self, members: List[EnsembleMember] = None, workers: int = None,
+                 scale_factor: float = 1.1, min_neighbors: int = 5, min_size: int = 30,
+                 nms_threshold: float = 0.3, time_budget: float = None,
+                 confidence_target: int = None, min_confident_faces: int = 1):
+        """
+        Initialize ensemble
+
+        Args:
+            members: Cascades in priority order (default: DEFAULT_MEMBERS)
+            workers: Cascades run at the same time, i.e. the wave size
+                (default: 1 when time_budget or confidence_target is set,
+                else min(members, CPU count))
+            scale_factor, min_neighbors, min_size: detectMultiScale parameters
+            nms_threshold: Min-area overlap above which boxes are merged
+            time_budget: Seconds after which no further wave is started
+            confidence_target: Neighbor count that makes a face confident
+            min_confident_faces: Confident faces needed to skip the remaining waves
+        """
+        self.members = list(members or DEFAULT_MEMBERS)
+        if workers is None and (time_budget is not None or confidence_target is not None):
+            workers = 1
+        self.workers = workers or min(len(self.members), os.cpu_count() or 1)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self.nms_threshold = nms_threshold
+        self.time_budget = time_budget
+        self.confidence_target = confidence_target
+        self.min_confident_faces = min_confident_faces
+
+        self._paths = {member.name: resolve_cascade(member.cascade_file) for member in self.members}
+        # Load every file once up front so a bad path fails here, not in a worker
+        for path in set(self._paths.values()):
+            cascade_registry.get_cascade(path)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="face-ensemble")
+
+    def _run_member(self, member: EnsembleMember, gray: np.ndarray, flipped: Optional[np.ndarray],
+                    state: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Run one cascade and update the early-exit state
+
+        Returns:
+            (boxes in original image coordinates, neighbor counts, seconds)
+        """
+        # Each pool thread owns its classifiers; the images are only read
+        cascade = cascade_registry.get_thread_cascade(self._paths[member.name])
+        member_started = time.perf_counter()
+        scale_factor, min_neighbors, min_size = state["params"]
+        boxes, neighbors = cascade.detectMultiScale2(
+            flipped if member.flip else gray,
+            scaleFactor=scale_factor,
+            minNeighbors=min_neighbors,
+            minSize=(min_size, min_size),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        boxes = nms.as_box_array(boxes)
+        if member.flip and len(boxes):
+            boxes[:, 0] = gray.shape[1] - boxes[:, 0] - boxes[:, 2]
+        neighbors = np.asarray(neighbors, dtype=np.int32).reshape(-1)
+        elapsed = time.perf_counter() - member_started
+
+        with state["lock"]:
+            if self.confidence_target is not None:
+                state["confident"] += int((neighbors >= self.confidence_target).sum())
+                if state["confident"] >= self.min_confident_faces and not state["early_exit"]:
+                    state["early_exit"] = "confidence"
+            if self._over_budget(state) and not state["early_exit"]:
+                state["early_exit"] = "time_budget"
+        return boxes, neighbors, elapsed
+
+    def _over_budget(self, state: Dict[str, Any]) -> bool:
+        return self.time_budget is not None and time.perf_counter() - state["started"] >= self.time_budget
+
+    def detect(self, gray: np.ndarray, scale_factor: float = None, min_neighbors: int = None,
+               min_size: int = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run the ensemble on a grayscale image
+
+        The detectMultiScale parameters default to the ones given at
+        construction and can be overridden per call.
+
+        Returns:
+            (faces as response dictionaries, ensemble report)
+        """
+        started = time.perf_counter()
+        state = {
+            "lock": threading.Lock(),
+            "started": started,
+            "confident": 0,
+            "early_exit": None,
+            "params": (
+                self.scale_factor if scale_factor is None else scale_factor,
+                self.min_neighbors if min_neighbors is None else min_neighbors,
+                self.min_size if min_size is None else min_size
+            )
+        }
+        flipped = cv2.flip(gray, 1) if any(member.flip for member in self.members) else None
+
+        # Waves in priority order; the policy is checked before each one starts
+        outputs = {}
+        for start in range(0, len(self.members), self.workers):
+            wave = self.members[start:start + self.workers]
+            if self._over_budget(state) and not state["early_exit"]:
+                state["early_exit"] = "time_budget"
+            if state["early_exit"]:
+                outputs.update((member.name, None) for member in wave)
+                continue
+            futures = {
+                self._executor.submit(self._run_member, member, gray, flipped, state): member
+                for member in wave
+            }
+            outputs.update((futures[future].name, future.result()) for future in as_completed(futures))
+        early_exit = state["early_exit"] if any(output is None for output in outputs.values()) else None
+
+        faces = self._merge(outputs)
+        report = {
+            "members": [
+                {
+                    "name": member.name,
+                    "status": "skipped" if outputs.get(member.name) is None else "done",
+                    "faces": int(len(outputs[member.name][0])) if outputs.get(member.name) else 0,
+                    "elapsed_ms": round(outputs[member.name][2] * 1000.0, 3) if outputs.get(member.name) else 0.0
+                }
+                for member in self.members
+            ],
+            "early_exit": early_exit,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 3)
+        }
+        return faces, report
+
+    def _merge(self, outputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Merge member boxes with NMS, keeping the most confident box of each group"""
+        names, boxes, scores = [], [], []
+        for member in self.members:
+            output = outputs.get(member.name)
+            if output is None:
+                continue
+            names.extend([member.name] * len(output[0]))
+            boxes.append(output[0])
+            scores.append(output[1])
+        if not names:
+            return []
+
+        boxes = np.concatenate(boxes)
+        scores = np.concatenate(scores)
+        kept, indices = nms.non_max_suppression(
+            boxes, threshold=self.nms_threshold, criterion=nms.OVERLAP_MIN_AREA,
+            scores=scores, return_indices=True
+        )
+
+        overlaps = nms.overlap_matrix(np.concatenate([kept, boxes]), nms.OVERLAP_MIN_AREA)[:len(kept), len(kept):]
+        faces = []
+        for k, (index, (x, y, w, h)) in enumerate(zip(indices, kept)):
+            found_by = sorted({names[j] for j in np.flatnonzero(overlaps[k] > self.nms_threshold)} | {names[index]})
+            faces.append({
+                "x": int(x),
+                "y": int(y),
+                "width": int(w),
+                "height": int(h),
+                "cascade": names[index],
+                "confidence": int(scores[index]),
+                "found_by": found_by
+            })
+        return faces
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def detect_faces_ensemble(ensemble: EnsembleDetector, image: np.ndarray) -> Dict[str, Any]:
+    """Run the ensemble on a decoded image and build the standard response"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces, report = ensemble.detect(gray)
+    return {
+        "success": True,
+        "message": "Face detection completed successfully",
+        "data": {
+            "face_count": len(faces),
+            "faces": faces,
+            "image_info": {
+                "width": image.shape[1],
+                "height": image.shape[0],
+                "channels": image.shape[2] if image.ndim > 2 else 1
+            }
+        },
+        "processing_info": {
+            "detection_params": {
+                "scaleFactor": ensemble.scale_factor,
+                "minNeighbors": ensemble.min_neighbors,
+                "minSize": [ensemble.min_size, ensemble.min_size]
+            },
+            "ensemble": report
+        }
+    }
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Face detection with an ensemble of frontal and profile cascades",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python ensemble_detector.py image.jpg
+  python ensemble_detector.py image.jpg --members frontal_default profile profile_flipped
+  python ensemble_detector.py image.jpg --confidence-target 20 --time-budget-ms 500
+        """
+    )
+
+    parser.add_argument('image_path', help='Path to input image')
+    parser.add_argument('--members', nargs='+', choices=[member.name for member in DEFAULT_MEMBERS],
+                        help='Cascades to run, in priority order (default: all)')
+    parser.add_argument('--workers', type=int,
+                        help='Cascades run at the same time (default: 1 with an early-exit option, '
+                             'else min(members, CPUs))')
+    parser.add_argument('--scale-factor', type=float, default=1.1, help='Scale factor (default: 1.1)')
+    parser.add_argument('--min-neighbors', type=int, default=5, help='Minimum neighbors (default: 5)')
+    parser.add_argument('--min-size', type=int, default=30, help='Minimum face size (default: 30)')
+    parser.add_argument('--confidence-target', type=int,
+                        help='Skip remaining cascades once a face has at least this many neighbors')
+    parser.add_argument('--min-confident-faces', type=int, default=1,
+                        help='Confident faces needed for the early exit (default: 1)')
+    parser.add_argument('--time-budget-ms', type=float, help='Start no further cascades after this many ms')
+    parser.add_argument('--pretty', '-p', action='store_true', help='Pretty print JSON output')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        members = DEFAULT_MEMBERS
+        if args.members:
+            by_name = {member.name: member for member in DEFAULT_MEMBERS}
+            members = [by_name[name] for name in args.members]
+
+        image = cv2.imread(args.image_path)
+        if image is None:
+            raise ValueError(f"Failed to read image: {args.image_path}")
+
+        with EnsembleDetector(
+            members, args.workers, args.scale_factor, args.min_neighbors, args.min_size,
+            time_budget=args.time_budget_ms / 1000.0 if args.time_budget_ms is not None else None,
+            confidence_target=args.confidence_target,
+            min_confident_faces=args.min_confident_faces
+        ) as ensemble:
+            result = detect_faces_ensemble(ensemble, image)
+
+    except (OSError, ValueError) as e:
+        result = {"success": False, "message": str(e), "data": {"face_count": 0, "faces": []}}
+
+    print(json.dumps(result, indent=2 if args.pretty else None, ensure_ascii=False))
+    if not result["success"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
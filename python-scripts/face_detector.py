@@ -12,43 +12,78 @@ import json
 import sys
 import os
 import argparse
-from typing import List, Dict, Any
+import base64
+import queue
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
+
+import cascade_registry
+import detection_engine
+import nms
+import output_format
+from perceptual_index import PerceptualIndex, verification_regions
+from prefilter import DECISION_ROI, DECISION_SKIP, FaceGate, detect_in_rois
+from result_cache import ResultCache, cascade_identity, make_key
+from stage_timer import NULL_TIMER, attach_timings, dumps_timed, make_timer, profile_to
 
 class FaceDetector:
     """Face detection class using OpenCV Haar Cascades"""
     
-    def __init__(self, cascade_path: str = None):
+    # detectMultiScale parameters (the balanced profile); each instance takes its profile's values
+    SCALE_FACTOR = 1.1
+    MIN_NEIGHBORS = 5
+    MIN_SIZE = (30, 30)
+    
+    def __init__(self, cascade_path: str = None, cache: ResultCache = None, timings: bool = False,
+                 gate: FaceGate = None, profile: str = "balanced", near_duplicates: PerceptualIndex = None):
         """
         Initialize face detector
         
         Args:
             cascade_path: Path to Haar Cascade XML file
+            cache: Result cache consulted by detect_faces() and
+                detect_faces_from_bytes() before decoding (optional)
+            timings: Report per-stage durations, the image size and the
+                pyramid level count under processing_info.timings
+            gate: Pre-filter that skips images without face candidates or
+                restricts detection to candidate regions (optional)
+            profile: Detection profile name, see detection_engine.PROFILES;
+                it sets SCALE_FACTOR, MIN_NEIGHBORS and MIN_SIZE, the
+                preprocessing, the pass count and the default max_long_edge
+            near_duplicates: Index of recently processed images; a
+                re-encoded, resized or lightly cropped copy of one of them
+                reuses its boxes instead of a full detection (optional)
+        
+        Raises:
+            ValueError: If the profile is unknown
         """
         if cascade_path is None:
             # Default path in same directory as script
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            cascade_path = os.path.join(script_dir, 'haarcascade_frontalface_default.xml')
+            cascade_path = cascade_registry.DEFAULT_CASCADE
         
         self.cascade_path = cascade_path
         self.face_cascade = self._load_cascade()
+        self.cache = cache
+        self.timings = timings
+        self.gate = gate
+        self.near_duplicates = near_duplicates
+        self.profile = detection_engine.get_profile(profile)
+        self.SCALE_FACTOR = self.profile.scale_factor
+        self.MIN_NEIGHBORS = self.profile.min_neighbors
+        self.MIN_SIZE = (self.profile.min_size, self.profile.min_size)
+        self._cascade_id = cascade_identity(cascade_path) if cache is not None else None
     
     def _load_cascade(self) -> cv2.CascadeClassifier:
-        """Load Haar Cascade classifier"""
-        if not os.path.exists(self.cascade_path):
-            raise FileNotFoundError(f"Haar Cascade file not found: {self.cascade_path}")
-        
-        cascade = cv2.CascadeClassifier(self.cascade_path)
-        if cascade.empty():
-            raise ValueError(f"Failed to load Haar Cascade from: {self.cascade_path}")
-        
-        return cascade
+        """Load Haar Cascade classifier (shared with other detectors in this process)"""
+        return cascade_registry.get_cascade(self.cascade_path)
     
-    def detect_faces(self, image_path: str) -> Dict[str, Any]:
+    def detect_faces(self, image_path: str, **options) -> Dict[str, Any]:
         """
         Detect faces in an image
         
         Args:
             image_path: Path to input image
+            **options: Detection options, see detect_faces_in_image()
             
         Returns:
             Dictionary with detection results in JSON format
@@ -58,62 +93,454 @@ class FaceDetector:
             if not os.path.exists(image_path):
                 return self._create_error_response(f"Image file not found: {image_path}")
             
+            if self.cache is not None:
+                # Hash the encoded bytes; a cache hit skips decoding entirely
+                with open(image_path, 'rb') as f:
+                    return self.detect_faces_from_bytes(f.read(), **options)
+            
             # Read image
-            image = cv2.imread(image_path)
+            timer = make_timer(self.timings)
+            with timer.stage("decode"):
+                image = cv2.imread(image_path)
             if image is None:
                 return self._create_error_response(f"Failed to read image: {image_path}")
             
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            return self.detect_faces_in_image(image, timer=timer, **options)
             
-            # Detect faces
-            faces = self.face_cascade.detectMultiScale(
-                gray,
-                scaleFactor=1.1,
-                minNeighbors=5,
-                minSize=(30, 30),
-                flags=cv2.CASCADE_SCALE_IMAGE
-            )
+        except Exception as e:
+            return self._create_error_response(f"Error during face detection: {str(e)}")
+    
+    def detect_faces_from_bytes(self, data, **options) -> Dict[str, Any]:
+        """
+        Detect faces in an encoded image held in memory
+        
+        Args:
+            data: Encoded image (JPEG, PNG, ...) as bytes, bytearray,
+                memoryview or any other buffer; it is not copied
+            **options: Detection options, see detect_faces_in_image()
             
-            # Process results
-            face_list = []
-            for (x, y, w, h) in faces:
-                face_data = {
-                    "x": int(x),
-                    "y": int(y),
-                    "width": int(w),
-                    "height": int(h)
-                }
-                face_list.append(face_data)
-            
-            # Create response
-            response = {
-                "success": True,
-                "message": "Face detection completed successfully",
-                "data": {
-                    "face_count": len(face_list),
-                    "faces": face_list,
-                    "image_info": {
-                        "width": image.shape[1],
-                        "height": image.shape[0],
-                        "channels": image.shape[2] if len(image.shape) > 2 else 1
-                    }
-                },
-                "processing_info": {
-                    "cascade_file": os.path.basename(self.cascade_path),
-                    "detection_params": {
-                        "scaleFactor": 1.1,
-                        "minNeighbors": 5,
-                        "minSize": [30, 30]
+        Returns:
+            Dictionary with detection results in JSON format
+        """
+        try:
+            timer = make_timer(self.timings)
+            if self.cache is not None:
+                with timer.stage("hash"):
+                    key = make_key(data, self._cascade_id, self._cache_params(options))
+                result = self.cache.get_or_compute(key, lambda: self._decode_and_detect(data, options, timer))
+                if result["processing_info"]["cache"] == "hit":
+                    # Stored timings describe the original miss; report this lookup instead
+                    attach_timings(result, timer)
+                return result
+            
+            return self._decode_and_detect(data, options, timer)
+            
+        except Exception as e:
+            return self._create_error_response(f"Error during face detection: {str(e)}")
+    
+    def _decode_and_detect(self, data, options: Dict[str, Any], timer=NULL_TIMER) -> Dict[str, Any]:
+        with timer.stage("decode"):
+            image = decode_image(data)
+        if image is None:
+            return self._create_error_response("Failed to decode image data")
+        return self.detect_faces_in_image(image, timer=timer, **options)
+    
+    def _cache_params(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Every input that affects the result, for the cache key"""
+        return {
+            "scaleFactor": self.SCALE_FACTOR,
+            "minNeighbors": self.MIN_NEIGHBORS,
+            "minSize": list(self.MIN_SIZE),
+            "profile": detection_engine.profile_to_dict(self.profile),
+            "prefilter": self.gate.recall_margin if self.gate is not None else None,
+            **options
+        }
+    
+    def detect_batch(self, images: Iterable[Any], prefetch: int = 8, **options) -> List[Dict[str, Any]]:
+        """
+        Detect faces in many images
+        
+        Args:
+            images: List or iterator of image arrays, file paths or encoded bytes
+            prefetch: Images decoded ahead of detection, see iter_batch()
+            **options: Detection options, see detect_faces_in_image()
+            
+        Returns:
+            One result per input, in input order
+        """
+        results = dict(self.iter_batch(images, prefetch, **options))
+        return [results[index] for index in range(len(results))]
+    
+    def iter_batch(self, images: Iterable[Any], prefetch: int = 8,
+                   **options) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Detect faces in many images, yielding results as they complete
+        
+        A reader thread decodes the next `prefetch` inputs while the current
+        ones are being detected (imread/imdecode and detectMultiScale release
+        the GIL). Each group of `prefetch` images is detected in order of
+        image size, so consecutive detections reuse OpenCV's buffers; at most
+        about three groups of decoded images are held in memory.
+        
+        Args:
+            images: List or iterator of image arrays, file paths or encoded bytes
+            prefetch: Images decoded and reordered together
+            **options: Detection options, see detect_faces_in_image()
+            
+        Yields:
+            (input index, result) tuples in completion order
+        """
+        prefetch = max(1, prefetch)
+        groups = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        
+        def put(item):
+            # Give up when the consumer has gone away
+            while not stop.is_set():
+                try:
+                    groups.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+        
+        def read():
+            group = []
+            try:
+                for index, item in enumerate(images):
+                    if stop.is_set():
+                        return
+                    group.append(self._prepare_batch_item(index, item))
+                    if len(group) >= prefetch:
+                        put(sorted(group, key=lambda prepared: prepared[-1]))
+                        group = []
+                if group:
+                    put(sorted(group, key=lambda prepared: prepared[-1]))
+            except Exception as e:
+                put(e)
+            finally:
+                put(None)
+        
+        reader = threading.Thread(target=read, name="face-batch-reader", daemon=True)
+        reader.start()
+        try:
+            while True:
+                group = groups.get()
+                if group is None:
+                    return
+                if isinstance(group, Exception):
+                    raise group
+                for index, kind, payload, timer, _ in group:
+                    yield index, self._detect_prepared(kind, payload, timer, options)
+        finally:
+            stop.set()
+            reader.join()
+    
+    def _prepare_batch_item(self, index: int, item: Any) -> tuple:
+        """
+        Load one batch input on the reader thread
+        
+        Returns:
+            (index, kind, payload, timer, sort key); kind is "image", "bytes"
+            (left encoded for the result cache) or "error"
+        """
+        timer = make_timer(self.timings)
+        try:
+            if isinstance(item, np.ndarray):
+                return index, "image", item, timer, (1,) + item.shape
+            
+            if isinstance(item, (bytes, bytearray, memoryview)):
+                data = item
+            else:
+                image_path = os.fspath(item)
+                if not os.path.exists(image_path):
+                    return index, "error", f"Image file not found: {image_path}", timer, (0,)
+                if self.cache is None:
+                    with timer.stage("decode"):
+                        image = cv2.imread(image_path)
+                    if image is None:
+                        return index, "error", f"Failed to read image: {image_path}", timer, (0,)
+                    return index, "image", image, timer, (1,) + image.shape
+                with open(image_path, 'rb') as f:
+                    data = f.read()
+            
+            if self.cache is not None:
+                return index, "bytes", data, timer, (0,)
+            with timer.stage("decode"):
+                image = decode_image(data)
+            if image is None:
+                return index, "error", "Failed to decode image data", timer, (0,)
+            return index, "image", image, timer, (1,) + image.shape
+            
+        except Exception as e:
+            return index, "error", f"Error reading image: {str(e)}", timer, (0,)
+    
+    def _detect_prepared(self, kind: str, payload: Any, timer, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Run detection for an input prepared by _prepare_batch_item()"""
+        if kind == "image":
+            return self.detect_faces_in_image(payload, timer=timer, **options)
+        if kind == "bytes":
+            return self.detect_faces_from_bytes(payload, **options)
+        return self._create_error_response(payload)
+    
+    def detect_faces_in_image(self, image: np.ndarray, max_long_edge: int = None,
+                              expected_min_face: int = None, refine: bool = False,
+                              min_face_ratio: float = None, max_face_ratio: float = None,
+                              timer=None) -> Dict[str, Any]:
+        """
+        Detect faces in an already decoded image
+        
+        Args:
+            image: BGR or grayscale image array
+            max_long_edge: Detect on a copy resized so its long edge is at most
+                this many pixels, then map boxes back to original coordinates
+                (default: the profile's setting)
+            expected_min_face: Smallest face size (in original pixels) that must
+                be found; the image is shrunk as far as this still allows.
+                If both options are given, the less aggressive scale is used
+            refine: Re-run detection at full resolution inside padded regions
+                around each face found on the downscaled image
+            min_face_ratio: Smallest face as a fraction of the shorter image
+                side; raises minSize for this image (default: the profile's)
+            max_face_ratio: Largest face as a fraction of the longer image
+                side; sets maxSize for this image (default: the profile's)
+            timer: StageTimer that already holds earlier stages such as
+                decode (default: a new one if timings are enabled)
+            
+        Returns:
+            Dictionary with detection results in JSON format
+        """
+        try:
+            if timer is None:
+                timer = make_timer(self.timings)
+            if max_long_edge is None:
+                max_long_edge = self.profile.max_long_edge
+            
+            with timer.stage("grayscale"):
+                gray = self._to_gray(image)
+            gray = detection_engine.preprocess(gray, self.profile, timer)
+            scale = self._working_scale(gray.shape, max_long_edge, expected_min_face)
+            
+            near = None
+            if self.near_duplicates is not None:
+                with timer.stage("near_duplicate"):
+                    image_size = (gray.shape[1], gray.shape[0])
+                    image_hash = self.near_duplicates.hash(gray)
+                    near_params = {
+                        "scaleFactor": self.SCALE_FACTOR,
+                        "minNeighbors": self.MIN_NEIGHBORS,
+                        "minSize": list(self.MIN_SIZE),
+                        "profile": detection_engine.profile_to_dict(self.profile),
+                        "prefilter": self.gate.recall_margin if self.gate is not None else None,
+                        "max_long_edge": max_long_edge,
+                        "expected_min_face": expected_min_face,
+                        "refine": refine,
+                        "face_ratios": [min_face_ratio, max_face_ratio]
                     }
+                    near = self.near_duplicates.lookup(image_hash, image_size, near_params)
+            
+            # Without verification a near-duplicate needs no scan at all
+            transferred = near is not None and not self.near_duplicates.verify
+            rois = None
+            if near is not None and self.near_duplicates.verify:
+                rois = verification_regions(near.faces, image_size)
+            
+            gate = None
+            if self.gate is not None and near is None:
+                with timer.stage("prefilter"):
+                    gate = self.gate.evaluate(image)
+                if gate.decision == DECISION_ROI:
+                    rois = gate.rois
+            
+            skipped = gate is not None and gate.decision == DECISION_SKIP
+            working = gray
+            if scale < 1.0 and not skipped and not transferred:
+                with timer.stage("resize"):
+                    working = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            
+            # Scale bounds for this image; relative bounds refer to the whole image, also for ROIs
+            min_size, max_size = detection_engine.size_bounds(
+                working.shape, max(self.MIN_SIZE),
+                self.profile.min_face_ratio if min_face_ratio is None else min_face_ratio,
+                self.profile.max_face_ratio if max_face_ratio is None else max_face_ratio
+            )
+            scanned = [(working.shape[1], working.shape[0])]
+            
+            def detect(crop):
+                return self.detect_boxes(crop, min_size, max_size)
+            
+            if skipped:
+                faces = np.empty((0, 4), dtype=np.int32)
+                scanned = []
+            elif transferred:
+                faces = near.faces
+                scanned = []
+            elif rois is not None:
+                with timer.stage("detect"):
+                    faces = detect_in_rois(working, rois, detect, scale)
+                    faces = nms.non_max_suppression(np.rint(faces / scale).astype(np.int32), criterion=nms.OVERLAP_IOU)
+                scanned = [
+                    (int(np.ceil((x + w) * scale)) - int(x * scale), int(np.ceil((y + h) * scale)) - int(y * scale))
+                    for x, y, w, h in rois
+                ]
+                if refine and scale < 1.0:
+                    with timer.stage("refine"):
+                        faces = self._refine_boxes(gray, faces)
+            elif scale < 1.0:
+                with timer.stage("detect"):
+                    faces = np.rint(detect(working) / scale).astype(np.int32)
+                if refine:
+                    with timer.stage("refine"):
+                        faces = self._refine_boxes(gray, faces)
+            else:
+                with timer.stage("detect"):
+                    faces = detect(gray)
+            
+            if self.near_duplicates is not None and near is None:
+                self.near_duplicates.add(image_hash, image_size, faces, near_params)
+            
+            levels = detection_engine.count_pyramid_levels(
+                self.face_cascade, scanned, self.profile, self.SCALE_FACTOR, self.MIN_NEIGHBORS,
+                min_size[0], max_size=max_size
+            )
+            
+            with timer.stage("format"):
+                response = self._create_response(faces, image.shape)
+                response["data"]["image_info"]["working_resolution"] = {
+                    "width": working.shape[1],
+                    "height": working.shape[0],
+                    "scale": round(scale, 6)
                 }
-            }
+                params = response["processing_info"]["detection_params"]
+                params["minSize"] = list(min_size)
+                params["maxSize"] = list(max_size) if max_size else None
+                response["processing_info"]["pyramid_levels"] = levels
+                response["processing_info"]["refined"] = bool(refine and scale < 1.0)
+                if gate is not None:
+                    response["processing_info"]["prefilter"] = gate.to_dict()
+                if near is not None:
+                    response["processing_info"]["near_duplicate"] = dict(near.to_dict(), verified=not transferred)
+                elif self.near_duplicates is not None:
+                    response["processing_info"]["near_duplicate"] = {"status": "miss"}
             
+            if timer.enabled:
+                attach_timings(
+                    response, timer,
+                    image_pixels=int(gray.shape[0] * gray.shape[1]),
+                    pyramid_levels=levels
+                )
             return response
             
         except Exception as e:
             return self._create_error_response(f"Error during face detection: {str(e)}")
     
+    def detect_boxes(self, gray: np.ndarray, min_size: tuple = None, max_size: tuple = None,
+                     cascade: cv2.CascadeClassifier = None) -> np.ndarray:
+        """
+        Run the profile's detection passes on a grayscale image
+        
+        Args:
+            gray: Grayscale image
+            min_size: Override for the minimum face size (default: MIN_SIZE)
+            max_size: Optional maximum face size
+            cascade: Classifier to use instead of the shared one (e.g. a
+                per-thread copy for concurrent detection)
+        
+        Returns:
+            (N, 4) int32 array of (x, y, w, h) boxes
+        """
+        return detection_engine.detect_boxes(
+            cascade or self.face_cascade,
+            gray,
+            self.profile,
+            self.SCALE_FACTOR,
+            self.MIN_NEIGHBORS,
+            min_size or self.MIN_SIZE,
+            max_size
+        )
+    
+    def _working_scale(self, shape: tuple, max_long_edge: int = None, expected_min_face: int = None) -> float:
+        """Resize factor (<= 1) for the detection image"""
+        scales = []
+        long_edge = max(shape[:2])
+        if max_long_edge and long_edge > max_long_edge:
+            scales.append(max_long_edge / long_edge)
+        if expected_min_face and expected_min_face > self.MIN_SIZE[0]:
+            scales.append(self.MIN_SIZE[0] / expected_min_face)
+        return min(1.0, max(scales)) if scales else 1.0
+    
+    def _refine_boxes(self, gray: np.ndarray, faces: np.ndarray, padding: float = 0.25) -> np.ndarray:
+        """
+        Re-detect each coarse box at full resolution inside a padded ROI
+        
+        The best overlapping full-resolution box replaces the coarse one;
+        coarse boxes that are not confirmed are kept unchanged.
+        """
+        height, width = gray.shape[:2]
+        refined = []
+        for (x, y, w, h) in faces:
+            pad_x, pad_y = int(w * padding), int(h * padding)
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+            
+            candidates = self.detect_boxes(
+                gray[y0:y1, x0:x1],
+                min_size=(max(self.MIN_SIZE[0], int(w * 0.7)), max(self.MIN_SIZE[1], int(h * 0.7))),
+                max_size=(int(w * 1.4) + 1, int(h * 1.4) + 1)
+            )
+            if len(candidates) == 0:
+                refined.append((x, y, w, h))
+                continue
+            
+            candidates[:, 0] += x0
+            candidates[:, 1] += y0
+            coarse = np.array([[x, y, w, h]], dtype=np.int32)
+            overlaps = nms.overlap_matrix(np.concatenate([coarse, candidates]), nms.OVERLAP_IOU)[0, 1:]
+            refined.append(tuple(candidates[int(np.argmax(overlaps))]))
+        
+        return nms.non_max_suppression(refined, criterion=nms.OVERLAP_IOU)
+    
+    @staticmethod
+    def _to_gray(image: np.ndarray) -> np.ndarray:
+        """Convert a BGR image to grayscale; grayscale input is returned as is"""
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    
+    def _create_response(self, faces: np.ndarray, image_shape: tuple) -> Dict[str, Any]:
+        """Create the success response for detected (x, y, w, h) boxes"""
+        face_list = []
+        for (x, y, w, h) in faces:
+            face_data = {
+                "x": int(x),
+                "y": int(y),
+                "width": int(w),
+                "height": int(h)
+            }
+            face_list.append(face_data)
+        
+        return {
+            "success": True,
+            "message": "Face detection completed successfully",
+            "data": {
+                "face_count": len(face_list),
+                "faces": face_list,
+                "image_info": {
+                    "width": image_shape[1],
+                    "height": image_shape[0],
+                    "channels": image_shape[2] if len(image_shape) > 2 else 1
+                }
+            },
+            "processing_info": {
+                "cascade_file": os.path.basename(self.cascade_path),
+                "detection_params": {
+                    "scaleFactor": self.SCALE_FACTOR,
+                    "minNeighbors": self.MIN_NEIGHBORS,
+                    "minSize": list(self.MIN_SIZE),
+                    "profile": self.profile.name
+                }
+            }
+        }
+    
     def _create_error_response(self, error_message: str) -> Dict[str, Any]:
         """Create standardized error response"""
         return {
@@ -125,6 +552,25 @@ class FaceDetector:
             }
         }
 
+def decode_image(data, flags: int = cv2.IMREAD_COLOR):
+    """
+    Decode an encoded image from a buffer without copying it
+    
+    Returns:
+        Decoded image, or None if the data is empty or not a valid image
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, flags)
+
+def decode_base64_image(text, flags: int = cv2.IMREAD_COLOR):
+    """Decode a base64 encoded image; returns None for invalid input"""
+    try:
+        return decode_image(base64.b64decode(text, validate=False), flags)
+    except (ValueError, cv2.error):
+        return None
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(
@@ -135,6 +581,18 @@ Examples:
   python face_detector.py path/to/image.jpg
   python face_detector.py --image path/to/image.jpg --cascade custom_cascade.xml
   python face_detector.py --image image.jpg --pretty
+  python face_detector.py large_photo.jpg --max-long-edge 1280 --refine
+  python face_detector.py large_photo.jpg --min-face-ratio 0.05 --max-face-ratio 0.4
+  python face_detector.py image.jpg --timings --profile detect.prof
+  python face_detector.py image.jpg --prefilter --recall-margin 0.4
+  python face_detector.py image.jpg --detection-profile thorough
+  python face_detector.py image.jpg --profiles-file tuned_profiles.json --detection-profile tuned-2
+  cat image.jpg | python face_detector.py --stdin
+  base64 image.jpg | python face_detector.py --stdin --base64
+  python face_detector.py panorama.jpg --tiled --memory-budget-mb 128 --tile-workers 4
+  python face_detector.py --batch photos/ --workers 8 --checkpoint run.ckpt > results.jsonl
+  python face_detector.py --batch manifest.txt --unordered --chunk-size 64
+  python face_detector.py --batch photos.fpak --workers 4
         """
     )
     
@@ -149,6 +607,18 @@ Examples:
         help='Path to input image file (alternative to positional argument)'
     )
     
+    parser.add_argument(
+        '--stdin',
+        action='store_true',
+        help='Read the encoded image from standard input instead of a file'
+    )
+    
+    parser.add_argument(
+        '--base64',
+        action='store_true',
+        help='With --stdin, the input is base64 text rather than raw bytes'
+    )
+    
     parser.add_argument(
         '--cascade', '-c',
         help='Path to Haar Cascade XML file (optional)'
@@ -166,36 +636,264 @@ Examples:
         help='Suppress non-JSON output'
     )
     
-    return parser.parse_args()
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help='Add per-stage durations under processing_info.timings'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        metavar='OUTPUT',
+        help='Run detection under cProfile and write the stats to this file'
+    )
+    
+    parser.add_argument(
+        '--detection-profile',
+        default='balanced',
+        help='Speed/recall preset: fast, balanced, thorough or one from --profiles-file (default: balanced)'
+    )
+    
+    parser.add_argument(
+        '--profiles-file',
+        help='Load more detection profiles from this file (e.g. written by autotune.py)'
+    )
+    
+    parser.add_argument(
+        '--max-long-edge',
+        type=int,
+        help='Detect on a copy resized to this long edge and map boxes back'
+    )
+    
+    parser.add_argument(
+        '--expected-min-face',
+        type=int,
+        help='Smallest face size in pixels to find; lets large images be shrunk accordingly'
+    )
+    
+    parser.add_argument(
+        '--min-face-ratio',
+        type=float,
+        help='Smallest face as a fraction of the shorter image side; skips finer pyramid levels'
+    )
+    
+    parser.add_argument(
+        '--max-face-ratio',
+        type=float,
+        help='Largest face as a fraction of the longer image side; skips coarser pyramid levels'
+    )
+    
+    parser.add_argument(
+        '--refine',
+        action='store_true',
+        help='Re-detect at full resolution inside regions found on the downscaled image'
+    )
+    
+    parser.add_argument(
+        '--tiled',
+        action='store_true',
+        help='Detect on overlapping full-resolution tiles to bound memory on very large images '
+             '(a file path only; faces above --max-face-size come from one downscaled pass)'
+    )
+    
+    parser.add_argument(
+        '--output-format',
+        choices=output_format.FORMATS,
+        help='Result encoding: pretty, json (one line; JSON lines with --batch), binary or msgpack '
+             '(default: json, or pretty with --pretty)'
+    )
+    
+    parser.add_argument(
+        '--prefilter',
+        action='store_true',
+        help='Skip images without skin/texture candidates and detect only inside candidate regions'
+    )
+    
+    parser.add_argument(
+        '--recall-margin',
+        type=float,
+        default=0.25,
+        help='Pre-filter safety margin in [0, 1); higher skips less often (default: 0.25)'
+    )
+    
+    parser.add_argument(
+        '--tile-size',
+        type=int,
+        help='Tile side in pixels for --tiled (default: derived from --memory-budget-mb)'
+    )
+    
+    parser.add_argument(
+        '--max-face-size',
+        type=int,
+        default=400,
+        help='Largest face the --tiled tiles are scanned for; also the tile overlap (default: 400)'
+    )
+    
+    parser.add_argument(
+        '--memory-budget-mb',
+        type=int,
+        default=256,
+        help='Peak memory target for --tiled in MB (default: 256)'
+    )
+    
+    parser.add_argument(
+        '--tile-workers',
+        type=int,
+        default=1,
+        help='Tiles processed concurrently with --tiled (default: 1)'
+    )
+    
+    parser.add_argument(
+        '--batch', '-b',
+        metavar='SOURCE',
+        help='Process every image in a directory tree, manifest file or image archive '
+             '(see image_archive.py), one JSON result per line'
+    )
+    
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        help='Worker processes for --batch (default: CPU count)'
+    )
+    
+    parser.add_argument(
+        '--chunk-size',
+        type=int,
+        default=16,
+        help='Images per worker task for --batch (default: 16)'
+    )
+    
+    parser.add_argument(
+        '--unordered',
+        action='store_true',
+        help='Emit --batch results as they finish instead of in input order'
+    )
+    
+    parser.add_argument(
+        '--checkpoint',
+        help='Progress file for --batch; an interrupted run resumes from it'
+    )
+    
+    args = parser.parse_args()
+    if args.tiled:
+        # The tiled path scans the file at full resolution with the profile's passes only
+        unsupported = [
+            flag for flag, value in (
+                ('--stdin', args.stdin), ('--max-long-edge', args.max_long_edge),
+                ('--expected-min-face', args.expected_min_face), ('--refine', args.refine),
+                ('--prefilter', args.prefilter), ('--min-face-ratio', args.min_face_ratio),
+                ('--max-face-ratio', args.max_face_ratio)
+            ) if value
+        ]
+        if unsupported:
+            parser.error(f"--tiled cannot be combined with {', '.join(unsupported)}")
+    return args
+
+def run_batch_mode(args) -> int:
+    """Run --batch and return the process exit code"""
+    from batch_detector import run_batch
+    
+    try:
+        # Workers get the profile itself; they may not see --profiles-file
+        profile = detection_engine.get_profile(args.detection_profile)
+        summary = run_batch(
+            args.batch,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            ordered=not args.unordered,
+            cascade_path=args.cascade,
+            checkpoint_path=args.checkpoint,
+            output_format=args.output_format,
+            profile=profile
+        )
+    except (OSError, ValueError) as e:
+        if not args.quiet:
+            print(f"❌ Error: {e}", file=sys.stderr)
+        return 1
+    
+    if not args.quiet:
+        print(f"✅ Batch finished: {summary['processed']} processed, {summary['failed']} failed, "
+              f"{summary['skipped']} skipped from checkpoint", file=sys.stderr)
+    return 0
 
 def main():
     """Main function"""
     args = parse_arguments()
     
+    if args.profiles_file:
+        try:
+            detection_engine.load_profiles(args.profiles_file)
+        except (OSError, ValueError) as e:
+            print(json.dumps({"success": False, "message": str(e), "data": {"face_count": 0, "faces": []}}))
+            sys.exit(1)
+    
+    if args.batch:
+        sys.exit(run_batch_mode(args))
+    
     # Determine image path
     image_path = args.image_path or args.image
     
-    if not image_path:
+    if not image_path and not args.stdin:
         if not args.quiet:
             print("❌ Error: No image path provided", file=sys.stderr)
             print("Usage: python face_detector.py <image_path>", file=sys.stderr)
         sys.exit(1)
     
+    error = detection_engine.validate_face_ratios(args.min_face_ratio, args.max_face_ratio)
+    if error:
+        print(json.dumps({"success": False, "message": error, "data": {"face_count": 0, "faces": []}}))
+        sys.exit(1)
+    
     try:
         # Initialize face detector
-        detector = FaceDetector(cascade_path=args.cascade)
+        gate = None
+        if args.prefilter:
+            min_face = detection_engine.get_profile(args.detection_profile).min_size
+            gate = FaceGate(min_face=min_face, recall_margin=args.recall_margin)
+        detector = FaceDetector(cascade_path=args.cascade, timings=args.timings, gate=gate,
+                                profile=args.detection_profile)
         
         if not args.quiet:
-            print(f"🔍 Processing image: {image_path}", file=sys.stderr)
+            print(f"🔍 Processing image: {image_path or '<stdin>'}", file=sys.stderr)
         
         # Detect faces
-        result = detector.detect_faces(image_path)
+        detect_options = {
+            "max_long_edge": args.max_long_edge,
+            "expected_min_face": args.expected_min_face,
+            "refine": args.refine,
+            "min_face_ratio": args.min_face_ratio,
+            "max_face_ratio": args.max_face_ratio
+        }
+        with profile_to(args.profile):
+            if args.stdin:
+                data = sys.stdin.buffer.read()
+                if args.base64:
+                    image = decode_base64_image(data)
+                    result = (detector.detect_faces_in_image(image, **detect_options) if image is not None
+                              else detector._create_error_response("Failed to decode base64 image data"))
+                else:
+                    result = detector.detect_faces_from_bytes(data, **detect_options)
+            elif args.tiled:
+                from tiled_detector import detect_faces_tiled
+                result = detect_faces_tiled(
+                    detector,
+                    image_path,
+                    max_face_size=args.max_face_size,
+                    tile_size=args.tile_size,
+                    memory_budget=args.memory_budget_mb * 1024 * 1024,
+                    workers=args.tile_workers
+                )
+            else:
+                result = detector.detect_faces(image_path, **detect_options)
         
-        # Output JSON
-        if args.pretty:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+        # Output JSON, or the requested encoding
+        if args.output_format:
+            sys.stdout.buffer.write(output_format.encode(result, args.output_format))
+            sys.stdout.buffer.flush()
+        elif args.pretty:
+            print(dumps_timed(result, indent=2, ensure_ascii=False))
         else:
-            print(json.dumps(result, ensure_ascii=False))
+            print(dumps_timed(result, ensure_ascii=False))
         
         # Exit with appropriate code
         sys.exit(0 if result["success"] else 1)
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Compiled Haar Cascade and vectorized NumPy evaluator
+Author: Nguyen Tuan Khanh
+Description: Compiles an OpenCV Haar cascade XML file (stump-based BOOST/HAAR,
+             e.g. haarcascade_frontalface_default.xml) into a compact binary
+             file of fixed-layout arrays that is loaded with np.memmap, and
+             evaluates it with NumPy: every window of a pyramid level is
+             scored at once from the level's integral image, and windows are
+             dropped stage by stage through boolean masks. The evaluation
+             follows cv::CascadeClassifier (CASCADE_SCALE_IMAGE path), so
+             detections match detectMultiScale up to float rounding.
+Output: JSON with faces, per-stage rejection counts and, with --compare, the
+        agreement with cv2.CascadeClassifier.detectMultiScale
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Tuple
+
+import cv2
+import numpy as np
+
+import nms
+from stage_timer import pyramid_levels
+
+MAGIC = b"HAARCMP1"
+VERSION = 1
+
+# magic, version, window width, window height, stages, weak classifiers, features
+HEADER = struct.Struct("<8sIIIIII")
+ALIGNMENT = 16
+
+# Window variance is normalized over the training window shrunk by this border
+# (22x22 for a 24x24 cascade); OpenCV lowers stage thresholds by THRESHOLD_EPS
+# when it reads them
+NORM_BORDER = 1
+THRESHOLD_EPS = 1e-5
+
+# Upper bound on gathered integral values per evaluation chunk (memory guard)
+MAX_GATHER_ELEMENTS = 1 << 22
+
+# (name, dtype, shape as a function of (stages, weak classifiers, features))
+_LAYOUT = [
+    ("stage_thresholds", np.float32, lambda s, t, f: (s,)),
+    ("stage_sizes", np.int32, lambda s, t, f: (s,)),
+    ("weak_features", np.int32, lambda s, t, f: (t,)),
+    ("weak_thresholds", np.float32, lambda s, t, f: (t,)),
+    ("weak_left", np.float32, lambda s, t, f: (t,)),
+    ("weak_right", np.float32, lambda s, t, f: (t,)),
+    ("feature_rects", np.int32, lambda s, t, f: (f, 3, 4)),
+    ("feature_weights", np.float32, lambda s, t, f: (f, 3)),
+]
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class CompiledCascade:
+    """Array form of a stump-based Haar cascade"""
+
+    def __init__(self, window_size: Tuple[int, int], arrays: Dict[str, np.ndarray]):
+        """
+        Args:
+            window_size: (width, height) of the training window
+            arrays: Arrays named as in the file layout (see _LAYOUT)
+        """
+        self.window_size = window_size
+        for name, _, _ in _LAYOUT:
+            setattr(self, name, arrays[name])
+        self.stage_starts = np.concatenate([[0], np.cumsum(self.stage_sizes)]).astype(np.int64)
+
+    @property
+    def stage_count(self) -> int:
+        return len(self.stage_thresholds)
+
+    @classmethod
+    def from_xml(cls, xml_path: str) -> "CompiledCascade":
+        """
+        Parse an OpenCV (new format) Haar cascade XML file
+
+        Raises:
+            ValueError: For LBP/HOG cascades, tilted features or trees deeper than a stump
+        """
+        root = ET.parse(xml_path).getroot()
+        cascade = root.find("cascade") if root.find("cascade") is not None else root[0]
+
+        if (cascade.findtext("stageType") or "").strip() != "BOOST" or \
+                (cascade.findtext("featureType") or "").strip() != "HAAR":
+            raise ValueError(f"Only BOOST/HAAR cascades are supported: {xml_path}")
+
+        window_size = (int(cascade.findtext("width")), int(cascade.findtext("height")))
+
+        stage_thresholds, stage_sizes = [], []
+        weak_features, weak_thresholds, weak_left, weak_right = [], [], [], []
+        for stage in cascade.find("stages"):
+            weak_classifiers = stage.find("weakClassifiers")
+            stage_thresholds.append(float(stage.findtext("stageThreshold")) - THRESHOLD_EPS)
+            stage_sizes.append(len(weak_classifiers))
+            for weak in weak_classifiers:
+                nodes = weak.findtext("internalNodes").split()
+                leaves = weak.findtext("leafValues").split()
+                if len(nodes) != 4 or len(leaves) != 2:
+                    raise ValueError(f"Only stump weak classifiers are supported: {xml_path}")
+                weak_features.append(int(nodes[2]))
+                weak_thresholds.append(float(nodes[3]))
+                weak_left.append(float(leaves[0]))
+                weak_right.append(float(leaves[1]))
+
+        features = cascade.find("features")
+        feature_rects = np.zeros((len(features), 3, 4), dtype=np.int32)
+        feature_weights = np.zeros((len(features), 3), dtype=np.float32)
+        for i, feature in enumerate(features):
+            if (feature.findtext("tilted") or "0").strip() not in ("0", ""):
+                raise ValueError(f"Tilted Haar features are not supported: {xml_path}")
+            for j, rect in enumerate(feature.find("rects")):
+                values = rect.text.split()
+                feature_rects[i, j] = [int(v) for v in values[:4]]
+                feature_weights[i, j] = float(values[4])
+
+        arrays = {
+            # OpenCV keeps these as float; rounding here matches its comparisons
+            "stage_thresholds": np.asarray(stage_thresholds, dtype=np.float32),
+            "stage_sizes": np.asarray(stage_sizes, dtype=np.int32),
+            "weak_features": np.asarray(weak_features, dtype=np.int32),
+            "weak_thresholds": np.asarray(weak_thresholds, dtype=np.float32),
+            "weak_left": np.asarray(weak_left, dtype=np.float32),
+            "weak_right": np.asarray(weak_right, dtype=np.float32),
+            "feature_rects": feature_rects,
+            "feature_weights": feature_weights
+        }
+        return cls(window_size, arrays)
+
+    def save(self, path: str) -> int:
+        """
+        Write the binary format: header, then each array at a 16-byte
+        aligned offset in _LAYOUT order
+
+        Returns:
+            File size in bytes
+        """
+        counts = (self.stage_count, len(self.weak_features), len(self.feature_rects))
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.window_size[0], self.window_size[1], *counts))
+            for name, dtype, _ in _LAYOUT:
+                f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+                f.write(np.ascontiguousarray(getattr(self, name), dtype=dtype).tobytes())
+            return f.tell()
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledCascade":
+        """
+        Memory-map a compiled cascade file
+
+        Raises:
+            ValueError: If the file is not a compiled cascade of this version
+        """
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Not a compiled cascade: {path}")
+        magic, version, width, height, *counts = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a compiled cascade (version {VERSION}): {path}")
+
+        arrays = {}
+        offset = HEADER.size
+        for name, dtype, shape in _LAYOUT:
+            offset = _aligned(offset)
+            shape = shape(*counts)
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        return cls((width, height), arrays)
+
+class HaarEvaluator:
+    """Vectorized cascade evaluation over all windows of a pyramid level"""
+
+    def __init__(self, cascade: CompiledCascade):
+        self.cascade = cascade
+        win_w, win_h = cascade.window_size
+        self._norm_rect = (NORM_BORDER, NORM_BORDER, win_w - 2 * NORM_BORDER, win_h - 2 * NORM_BORDER)
+        # Per-stage views, built once: feature rects/weights of each weak classifier
+        self._stages = []
+        for s in range(cascade.stage_count):
+            start, end = cascade.stage_starts[s], cascade.stage_starts[s + 1]
+            features = np.asarray(cascade.weak_features[start:end])
+            self._stages.append((
+                np.asarray(cascade.feature_rects)[features],
+                np.asarray(cascade.feature_weights)[features],
+                np.asarray(cascade.weak_thresholds[start:end]),
+                np.asarray(cascade.weak_left[start:end], dtype=np.float64),
+                np.asarray(cascade.weak_right[start:end], dtype=np.float64),
+                float(cascade.stage_thresholds[s])
+            ))
+
+    @staticmethod
+    def _corner_offsets(rects: np.ndarray, stride: int) -> np.ndarray:
+        """Flat integral-image offsets (top-left, top-right, bottom-left, bottom-right) of rects"""
+        x, y, w, h = rects[..., 0], rects[..., 1], rects[..., 2], rects[..., 3]
+        return np.stack([
+            y * stride + x,
+            y * stride + x + w,
+            (y + h) * stride + x,
+            (y + h) * stride + x + w
+        ], axis=-1).astype(np.int64)
+
+    @staticmethod
+    def _rect_sums(flat: np.ndarray, base: np.ndarray, corners: np.ndarray) -> np.ndarray:
+        """Sum of every rect for every window; corners has shape (..., 4)"""
+        gathered = flat[base.reshape((-1,) + (1,) * corners.ndim) + corners]
+        return gathered[..., 0] - gathered[..., 1] - gathered[..., 2] + gathered[..., 3]
+
+    def _variance_factors(self, integral: np.ndarray, squared: np.ndarray, base: np.ndarray):
+        """
+        Inverse standard deviation per window, as HaarEvaluator::setWindow
+
+        Returns:
+            (factors as float32, mask of windows OpenCV evaluates)
+        """
+        stride = integral.shape[1]
+        corners = self._corner_offsets(np.asarray(self._norm_rect), stride)
+        area = float(self._norm_rect[2] * self._norm_rect[3])
+        total = self._rect_sums(integral.ravel(), base, corners).astype(np.float64)
+        total_sq = self._rect_sums(squared.ravel(), base, corners).astype(np.float64)
+        nf = area * total_sq - total * total
+        valid = nf > 0
+        factors = np.ones(len(base), dtype=np.float32)
+        factors[valid] = (1.0 / np.sqrt(nf[valid])).astype(np.float32)
+        # OpenCV skips windows whose contrast is too low to be a face
+        valid &= area * factors.astype(np.float64) < 1e-1
+        return factors, valid
+
+    def evaluate_windows(self, integral: np.ndarray, squared: np.ndarray,
+                         base: np.ndarray) -> np.ndarray:
+        """
+        Run the cascade on windows given by their flat top-left offsets
+
+        Args:
+            integral: Integral image, shape (H + 1, W + 1), int64
+            squared: Integral of squares, same shape
+            base: Flat offsets (y * (W + 1) + x) of the window origins
+
+        Returns:
+            Number of stages passed per window (stage_count means accepted,
+            -1 means skipped by the variance check)
+        """
+        depth = np.full(len(base), -1, dtype=np.int32)
+        factors, valid = self._variance_factors(integral, squared, base)
+        alive = np.flatnonzero(valid)
+        depth[alive] = 0
+
+        flat = integral.ravel()
+        stride = integral.shape[1]
+        for stage_index, (rects, weights, thresholds, left, right, stage_threshold) in enumerate(self._stages):
+            if len(alive) == 0:
+                break
+            corners = self._corner_offsets(rects, stride)
+            chunk = max(1, MAX_GATHER_ELEMENTS // corners.size)
+            passed = []
+            for start in range(0, len(alive), chunk):
+                windows = alive[start:start + chunk]
+                sums = self._rect_sums(flat, base[windows], corners).astype(np.float32)
+                values = (sums * weights).sum(axis=-1, dtype=np.float32) * factors[windows, None]
+                stage_sum = np.where(values < thresholds, left, right).sum(axis=1)
+                passed.append(windows[stage_sum >= stage_threshold])
+            alive = np.concatenate(passed)
+            depth[alive] = stage_index + 1
+        return depth
+
+    def evaluate_patches(self, patches: np.ndarray) -> np.ndarray:
+        """
+        Batch evaluation of window-sized grayscale patches
+
+        Args:
+            patches: (N, window_height, window_width) uint8 array
+
+        Returns:
+            Number of stages passed per patch (see evaluate_windows)
+        """
+        patches = np.asarray(patches, dtype=np.uint8)
+        count, height, width = patches.shape
+        # Stack the patches vertically so one integral image serves them all
+        stacked = patches.reshape(count * height, width)
+        integral, squared = cv2.integral2(stacked, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        integral, squared = integral.astype(np.int64), squared.astype(np.int64)
+        base = np.arange(count, dtype=np.int64) * height * (width + 1)
+        # Rows of one patch also include the rows above it in the integral;
+        # the rect-sum differences cancel them out
+        return self.evaluate_windows(integral, squared, base)
+
+    def detect_multi_scale(self, gray: np.ndarray, scale_factor: float = 1.1, min_neighbors: int = 3,
+                           min_size: Tuple[int, int] = (0, 0), max_size: Tuple[int, int] = (0, 0),
+                           collect_stats: bool = False):
+        """
+        Equivalent of cv2.CascadeClassifier.detectMultiScale with CASCADE_SCALE_IMAGE
+
+        Returns:
+            (N, 4) int32 boxes, or (boxes, stats) when collect_stats is set;
+            stats holds per-level window counts and per-stage rejections
+        """
+        height, width = gray.shape[:2]
+        win_w, win_h = self.cascade.window_size
+        max_w, max_h = max_size if max_size and max_size[0] > 0 else (width, height)
+
+        candidates = []
+        rejected = np.zeros(self.cascade.stage_count + 1, dtype=np.int64)
+        levels = []
+        factor = 1.0
+        while True:
+            window = (int(round(win_w * factor)), int(round(win_h * factor)))
+            scaled = (int(round(width / factor)), int(round(height / factor)))
+            work_w, work_h = scaled[0] - win_w, scaled[1] - win_h
+            if work_w <= 0 or work_h <= 0 or window[0] > max_w or window[1] > max_h:
+                break
+            if window[0] >= min_size[0] and window[1] >= min_size[1]:
+                level = cv2.resize(gray, scaled, interpolation=cv2.INTER_LINEAR_EXACT)
+                integral, squared = cv2.integral2(level, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+                integral, squared = integral.astype(np.int64), squared.astype(np.int64)
+
+                step = 1 if factor > 2.0 else 2
+                ys, xs = np.mgrid[0:work_h:step, 0:work_w:step]
+                ys, xs = ys.ravel(), xs.ravel()
+                depth = self.evaluate_windows(integral, squared, ys * integral.shape[1] + xs)
+
+                accepted = depth == self.cascade.stage_count
+                for x, y in zip(xs[accepted], ys[accepted]):
+                    candidates.append([int(round(x * factor)), int(round(y * factor)), window[0], window[1]])
+                if collect_stats:
+                    rejected += np.bincount(depth[depth >= 0], minlength=len(rejected))
+                    levels.append({"factor": round(factor, 6), "windows": int(len(depth)),
+                                   "low_variance": int((depth < 0).sum()), "accepted": int(accepted.sum())})
+            factor *= scale_factor
+
+        if min_neighbors > 0:
+            grouped, _ = cv2.groupRectangles(candidates, min_neighbors, 0.2)
+        else:
+            grouped = candidates
+        boxes = nms.as_box_array(grouped)
+
+        if not collect_stats:
+            return boxes
+        stats = {
+            "levels": levels,
+            "raw_candidates": len(candidates),
+            # rejected_at_stage[i]: windows that passed i stages and failed stage i
+            "rejected_at_stage": rejected[:-1].tolist(),
+            "accepted": int(rejected[-1])
+        }
+        return boxes, stats
+
+def compare_with_opencv(boxes: np.ndarray, reference: np.ndarray, iou_threshold: float = 0.9) -> Dict[str, Any]:
+    """Match boxes to detectMultiScale output by IoU"""
+    matched = 0
+    if len(boxes) and len(reference):
+        overlaps = nms.overlap_matrix(np.concatenate([boxes, reference]), nms.OVERLAP_IOU)
+        overlaps = overlaps[:len(boxes), len(boxes):]
+        matched = int((overlaps.max(axis=1) >= iou_threshold).sum())
+    return {
+        "numpy_boxes": int(len(boxes)),
+        "opencv_boxes": int(len(reference)),
+        "matched": matched,
+        "iou_threshold": iou_threshold,
+        "identical": bool(len(boxes) == len(reference) and
+                          np.array_equal(np.sort(boxes, axis=0), np.sort(reference, axis=0)))
+    }
+
+def compile_cascade(xml_path: str, output_path: str) -> Dict[str, Any]:
+    """Compile an XML cascade and report sizes"""
+    started = time.perf_counter()
+    cascade = CompiledCascade.from_xml(xml_path)
+    parse_seconds = time.perf_counter() - started
+    size = cascade.save(output_path)
+    return {
+        "input": xml_path,
+        "output": output_path,
+        "stages": cascade.stage_count,
+        "weak_classifiers": int(len(cascade.weak_features)),
+        "features": int(len(cascade.feature_rects)),
+        "xml_bytes": os.path.getsize(xml_path),
+        "compiled_bytes": size,
+        "xml_parse_ms": round(parse_seconds * 1000.0, 3)
+    }
+
+def load_cascade(path: str) -> CompiledCascade:
+    """Load a compiled cascade, or parse an XML file"""
+    if path.lower().endswith(".xml"):
+        return CompiledCascade.from_xml(path)
+    return CompiledCascade.load(path)
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Compile Haar cascades and detect faces with the NumPy evaluator",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python haar_cascade.py compile haarcascade_frontalface_default.xml frontalface.haarc
+  python haar_cascade.py detect image.jpg --cascade frontalface.haarc --stats
+  python haar_cascade.py detect image.jpg --cascade frontalface.haarc --compare
+        """
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = subparsers.add_parser('compile', help='Compile an XML cascade to the binary format')
+    compile_parser.add_argument('xml_path', help='OpenCV Haar cascade XML file')
+    compile_parser.add_argument('output', help='Compiled cascade file to write')
+
+    detect = subparsers.add_parser('detect', help='Detect faces with the NumPy evaluator')
+    detect.add_argument('image_path', help='Path to input image')
+    detect.add_argument('--cascade', '-c', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               'haarcascade_frontalface_default.xml'),
+                        help='Compiled cascade or XML file (default: bundled frontal face XML)')
+    detect.add_argument('--scale-factor', type=float, default=1.1, help='Scale factor (default: 1.1)')
+    detect.add_argument('--min-neighbors', type=int, default=5, help='Minimum neighbors (default: 5)')
+    detect.add_argument('--min-size', type=int, default=30, help='Minimum face size (default: 30)')
+    detect.add_argument('--stats', action='store_true', help='Include per-level and per-stage statistics')
+    detect.add_argument('--compare', action='store_true',
+                        help='Also run cv2 detectMultiScale with the XML cascade and report agreement')
+    detect.add_argument('--xml', help='XML cascade for --compare (default: --cascade if it is XML, '
+                                      'else the bundled frontal face XML)')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        if args.command == "compile":
+            print(json.dumps(compile_cascade(args.xml_path, args.output), indent=2))
+            return
+
+        image = cv2.imread(args.image_path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError(f"Failed to read image: {args.image_path}")
+
+        started = time.perf_counter()
+        evaluator = HaarEvaluator(load_cascade(args.cascade))
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        boxes, stats = evaluator.detect_multi_scale(
+            image, args.scale_factor, args.min_neighbors,
+            (args.min_size, args.min_size), collect_stats=True
+        )
+        detect_seconds = time.perf_counter() - started
+
+        result = {
+            "success": True,
+            "message": "Face detection completed",
+            "data": {
+                "face_count": int(len(boxes)),
+                "faces": [{"x": int(x), "y": int(y), "width": int(w), "height": int(h)} for x, y, w, h in boxes]
+            },
+            "processing_info": {
+                "evaluator": "numpy",
+                "cascade_load_ms": round(load_seconds * 1000.0, 3),
+                "detect_ms": round(detect_seconds * 1000.0, 3),
+                "pyramid_levels": pyramid_levels(
+                    (image.shape[1], image.shape[0]), evaluator.cascade.window_size,
+                    args.scale_factor, (args.min_size, args.min_size)
+                )
+            }
+        }
+        if args.stats:
+            result["processing_info"]["stats"] = stats
+
+        if args.compare:
+            xml_path = args.xml or (args.cascade if args.cascade.lower().endswith(".xml") else
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 'haarcascade_frontalface_default.xml'))
+            reference_cascade = cv2.CascadeClassifier(xml_path)
+            started = time.perf_counter()
+            reference = nms.as_box_array(reference_cascade.detectMultiScale(
+                image, scaleFactor=args.scale_factor, minNeighbors=args.min_neighbors,
+                minSize=(args.min_size, args.min_size), flags=cv2.CASCADE_SCALE_IMAGE
+            ))
+            comparison = compare_with_opencv(boxes, reference)
+            comparison["opencv_detect_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+            result["processing_info"]["comparison"] = comparison
+
+        print(json.dumps(result, indent=2))
+
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "message": str(e), "data": {"face_count": 0, "faces": []}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
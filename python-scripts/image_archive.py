@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Packed Image Archive
+Author: Nguyen Tuan Khanh
+Description: Packs an image set into one file so bulk runs avoid an open()
+             and stat() per image. The archive holds the encoded images back
+             to back followed by an offset index; detection memory-maps it
+             and decodes every record straight from a memoryview slice of
+             the mapping, without copying. The index can be split into
+             contiguous shards, one per worker process or machine.
+
+             For repeated benchmark runs the images can also be stored
+             pre-decoded as grayscale: one flat uint8 .npy file loaded with
+             np.load(mmap_mode="r"), plus a .index.npy file with the offset,
+             size and name of every frame. Frames are zero-copy views.
+
+             Archive layout (little endian):
+               header  magic "FACEPAK1", version, flags, record count,
+                       index offset, names offset
+               records encoded image bytes
+               index   (count, 2) uint64 array of (offset, length), 16-byte aligned
+               names   JSON list of record names (UTF-8)
+Output: JSON summary for pack / pack-gray / info, one JSON result per line for detect
+"""
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Union
+
+import cv2
+import numpy as np
+
+MAGIC = b"FACEPAK1"
+VERSION = 1
+
+# magic, version, flags (reserved), record count, index offset, names offset
+HEADER = struct.Struct("<8sIIQQQ")
+ALIGNMENT = 16
+
+# Bytes copied per step when assembling the grayscale .npy file
+COPY_CHUNK = 16 * 1024 * 1024
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def index_path(npy_path: str) -> str:
+    """Index file belonging to a grayscale frame file"""
+    return os.path.splitext(npy_path)[0] + ".index.npy"
+
+class _RecordSet(ABC):
+    """Sharding and iteration shared by both storage formats"""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of records"""
+
+    @abstractmethod
+    def record(self, index: int):
+        """Record at an index, without copying"""
+
+    @abstractmethod
+    def name(self, index: int) -> str:
+        """Name the record was packed under"""
+
+    def shard(self, shard: int, shards: int) -> range:
+        """
+        Contiguous index range of one shard
+
+        Shards differ in size by at most one record; contiguous ranges keep
+        each worker's reads sequential within the file.
+        """
+        if shards < 1 or not 0 <= shard < shards:
+            raise ValueError(f"Invalid shard {shard} of {shards}")
+        count = len(self)
+        return range(count * shard // shards, count * (shard + 1) // shards)
+
+    def iter_records(self, indices: Iterable[int] = None) -> Iterator[Any]:
+        """Yield records for the given indices (default: all)"""
+        for index in range(len(self)) if indices is None else indices:
+            yield self.record(index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+class ImageArchive(_RecordSet):
+    """Memory-mapped archive of encoded images"""
+
+    def __init__(self, path: str):
+        """
+        Map an archive file
+
+        Raises:
+            ValueError: If the file is not an archive of this version
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Not an image archive: {path}")
+
+        if len(self._mmap) < HEADER.size:
+            self.close()
+            raise ValueError(f"Not an image archive: {path}")
+        magic, version, _, count, index_offset, names_offset = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not an image archive (version {VERSION}): {path}")
+
+        self._count = count
+        self._names_offset = names_offset
+        self._names = None
+        self._index = np.frombuffer(self._mmap, dtype="<u8", count=count * 2, offset=index_offset).reshape(count, 2)
+        self._view = memoryview(self._mmap)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, index: int) -> memoryview:
+        """Encoded bytes of one image as a zero-copy slice of the mapping"""
+        offset, length = self._index[index]
+        return self._view[int(offset):int(offset + length)]
+
+    @property
+    def names(self) -> List[str]:
+        """Record names (relative paths at pack time), loaded on first use"""
+        if self._names is None:
+            self._names = json.loads(bytes(self._view[self._names_offset:]).decode("utf-8"))
+        return self._names
+
+    def name(self, index: int) -> str:
+        return self.names[index]
+
+    def close(self) -> None:
+        """
+        Unmap the archive
+
+        Records still referenced elsewhere keep the mapping alive; it is
+        then released once they are garbage collected.
+        """
+        self._index = None
+        view = getattr(self, "_view", None)
+        if view is not None:
+            view.release()
+            self._view = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+class GrayFrames(_RecordSet):
+    """Pre-decoded grayscale frames stored as a memory-mapped .npy file"""
+
+    def __init__(self, npy_path: str):
+        self.path = npy_path
+        self.pixels = np.load(npy_path, mmap_mode="r")
+        self._index = np.load(index_path(npy_path), mmap_mode="r")
+        if self.pixels.dtype != np.uint8 or self.pixels.ndim != 1:
+            raise ValueError(f"Not a grayscale frame file: {npy_path}")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record(self, index: int) -> np.ndarray:
+        """One frame as a read-only (height, width) view of the mapping"""
+        offset, height, width = (int(self._index[field][index]) for field in ("offset", "height", "width"))
+        return self.pixels[offset:offset + height * width].reshape(height, width)
+
+    @property
+    def names(self) -> List[str]:
+        return [str(name) for name in self._index["name"]]
+
+    def name(self, index: int) -> str:
+        return str(self._index["name"][index])
+
+def is_archive(path: str) -> bool:
+    """True if path is an image archive or a grayscale frame file"""
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    return magic == MAGIC or (magic.startswith(b"\x93NUMPY") and os.path.exists(index_path(path)))
+
+def open_archive(path: str) -> Union[ImageArchive, GrayFrames]:
+    """Open an image archive or a grayscale frame file, by content"""
+    with open(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+    if magic.startswith(b"\x93NUMPY"):
+        return GrayFrames(path)
+    return ImageArchive(path)
+
+def pack_archive(paths: Iterable[str], archive_path: str, root: str = None) -> Dict[str, Any]:
+    """
+    Write an archive of the given image files
+
+    The archive is written to a temporary file and renamed when complete.
+    Files that cannot be read are skipped and counted.
+
+    Args:
+        paths: Image files in the order they should be stored
+        archive_path: Archive file to create
+        root: Record names are paths relative to this directory (default: paths as given)
+
+    Returns:
+        Summary with record count, skipped files and archive size
+    """
+    offsets, lengths, names = [], [], []
+    skipped = 0
+    temp_path = archive_path + ".tmp"
+    with open(temp_path, "wb") as out:
+        out.write(b"\0" * HEADER.size)
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                skipped += 1
+                continue
+            offsets.append(out.tell())
+            lengths.append(len(data))
+            names.append(os.path.relpath(path, root) if root else path)
+            out.write(data)
+
+        out.write(b"\0" * (_aligned(out.tell()) - out.tell()))
+        index_offset = out.tell()
+        out.write(np.array([offsets, lengths], dtype="<u8").T.tobytes())
+        names_offset = out.tell()
+        out.write(json.dumps(names, ensure_ascii=False).encode("utf-8"))
+        size = out.tell()
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets), index_offset, names_offset))
+    os.replace(temp_path, archive_path)
+
+    return {"archive": archive_path, "records": len(offsets), "skipped": skipped, "bytes": size}
+
+def pack_grayscale(source: str, npy_path: str) -> Dict[str, Any]:
+    """
+    Decode every record of an archive once and store it as grayscale frames
+
+    Pixels are streamed to a temporary file while decoding (the total size
+    is only known at the end), then copied behind the .npy header.
+    Records that fail to decode are skipped and counted.
+
+    Returns:
+        Summary with frame count, skipped records and file sizes
+    """
+    rows = []
+    skipped = 0
+    offset = 0
+    directory = os.path.dirname(os.path.abspath(npy_path))
+    with ImageArchive(source) as archive, tempfile.TemporaryFile(dir=directory) as raw:
+        for index in range(len(archive)):
+            frame = cv2.imdecode(np.frombuffer(archive.record(index), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+            if frame is None:
+                skipped += 1
+                continue
+            raw.write(frame.tobytes())
+            rows.append((offset, frame.shape[0], frame.shape[1], archive.name(index)))
+            offset += frame.size
+
+        raw.seek(0)
+        with open(npy_path, "wb") as out:
+            np.lib.format.write_array_header_1_0(out, {"descr": "|u1", "fortran_order": False, "shape": (offset,)})
+            shutil.copyfileobj(raw, out, COPY_CHUNK)
+
+    name_length = max((len(row[3]) for row in rows), default=1)
+    index = np.array(rows, dtype=[("offset", "<i8"), ("height", "<i4"), ("width", "<i4"),
+                                  ("name", f"<U{name_length}")])
+    np.save(index_path(npy_path), index)
+
+    return {
+        "frames": len(rows),
+        "skipped": skipped,
+        "pixels_file": npy_path,
+        "index_file": index_path(npy_path),
+        "bytes": os.path.getsize(npy_path)
+    }
+
+def detect_archive(path: str, detector=None, shard: int = 0, shards: int = 1, ordered: bool = True,
+                   prefetch: int = 8, **options) -> Iterator[Dict[str, Any]]:
+    """
+    Detect faces in one shard of an archive or grayscale frame file
+
+    Records are handed to FaceDetector.iter_batch, which decodes the next
+    ones while the current one is detected.
+
+    Args:
+        path: Image archive or grayscale .npy frame file
+        detector: FaceDetector to use (default: a new one with the default cascade)
+        shard, shards: Process only shard number `shard` of `shards`
+        ordered: Yield in index order; otherwise as results complete
+        prefetch: Records decoded ahead of detection
+        **options: Detection options, see FaceDetector.detect_faces_in_image()
+
+    Yields:
+        Detection results with "index" and "name" added
+    """
+    if detector is None:
+        from face_detector import FaceDetector
+        detector = FaceDetector()
+
+    with open_archive(path) as archive:
+        indices = archive.shard(shard, shards)
+        waiting = {}
+        next_position = 0
+        for position, result in detector.iter_batch(archive.iter_records(indices), prefetch, **options):
+            result["index"] = indices[position]
+            result["name"] = archive.name(indices[position])
+            if not ordered:
+                yield result
+                continue
+            # iter_batch groups inputs by shape; restore index order within its small window
+            waiting[position] = result
+            while next_position in waiting:
+                yield waiting.pop(next_position)
+                next_position += 1
+
+def archive_info(path: str) -> Dict[str, Any]:
+    """Record count, size and storage format of an archive"""
+    with open_archive(path) as archive:
+        info = {
+            "path": path,
+            "format": "grayscale" if isinstance(archive, GrayFrames) else "encoded",
+            "records": len(archive),
+            "bytes": os.path.getsize(path)
+        }
+        if len(archive):
+            info["first"] = archive.name(0)
+            info["last"] = archive.name(len(archive) - 1)
+        return info
+
+def _parse_shard(text: str) -> Sequence[int]:
+    """Parse K/N into (K, N)"""
+    try:
+        shard, shards = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like K/N, got {text}")
+    if shards < 1 or not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError(f"Shard {text} out of range")
+    return shard, shards
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Pack images into a memory-mapped archive and detect faces from it",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python image_archive.py pack photos/ photos.fpak
+  python image_archive.py pack manifest.txt photos.fpak
+  python image_archive.py pack-gray photos.fpak photos_gray.npy
+  python image_archive.py detect photos.fpak --shard 0/4 > shard0.jsonl
+  python image_archive.py detect photos_gray.npy --unordered
+  python face_detector.py --batch photos.fpak --workers 8 > results.jsonl
+        """
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack = subparsers.add_parser('pack', help='Pack a directory tree or manifest into an archive')
+    pack.add_argument('source', help='Directory to walk or manifest file with one path per line')
+    pack.add_argument('archive', help='Archive file to write')
+
+    gray = subparsers.add_parser('pack-gray', help='Store the archive pre-decoded as grayscale frames')
+    gray.add_argument('archive', help='Archive written by pack')
+    gray.add_argument('output', help='.npy frame file to write (the index goes next to it)')
+
+    info = subparsers.add_parser('info', help='Describe an archive or frame file')
+    info.add_argument('archive', help='Archive or .npy frame file')
+
+    detect = subparsers.add_parser('detect', help='Detect faces in an archive or frame file')
+    detect.add_argument('archive', help='Archive or .npy frame file')
+    detect.add_argument('--cascade', '-c', help='Path to Haar Cascade XML file (optional)')
+    detect.add_argument('--shard', type=_parse_shard, default=(0, 1), metavar='K/N',
+                        help='Process only shard K of N (default: 0/1)')
+    detect.add_argument('--unordered', action='store_true',
+                        help='Emit results as they finish instead of in index order')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        if args.command == "pack":
+            from batch_detector import iter_inputs
+            root = args.source if os.path.isdir(args.source) else os.path.dirname(os.path.abspath(args.source))
+            print(json.dumps(pack_archive(iter_inputs(args.source), args.archive, root), indent=2))
+        elif args.command == "pack-gray":
+            print(json.dumps(pack_grayscale(args.archive, args.output), indent=2))
+        elif args.command == "info":
+            print(json.dumps(archive_info(args.archive), indent=2))
+        else:
+            from face_detector import FaceDetector
+            detector = FaceDetector(cascade_path=args.cascade)
+            shard, shards = args.shard
+            for result in detect_archive(args.archive, detector, shard, shards, ordered=not args.unordered):
+                sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "message": str(e), "data": {"face_count": 0, "faces": []}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
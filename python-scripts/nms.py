@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Vectorized non-maximum suppression for face boxes
+Author: Nguyen Tuan Khanh
+Description: Greedy suppression over an (N, 4) array of (x, y, w, h) boxes.
+             Boxes are visited in input order (or by descending score when
+             scores are given); a box is kept unless it overlaps an already
+             kept box by more than the threshold.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+# Overlap criteria
+OVERLAP_MIN_AREA = "min_area"  # intersection / area of the smaller box
+OVERLAP_IOU = "iou"            # intersection / union
+
+def as_box_array(boxes) -> np.ndarray:
+    """Convert a sequence of (x, y, w, h) boxes to an (N, 4) int32 array"""
+    array = np.asarray(boxes, dtype=np.int32)
+    if array.size == 0:
+        return np.empty((0, 4), dtype=np.int32)
+    return array.reshape(-1, 4)
+
+def overlap_matrix(boxes: np.ndarray, criterion: str = OVERLAP_MIN_AREA) -> np.ndarray:
+    """
+    Pairwise overlap ratios between all boxes
+
+    Args:
+        boxes: (N, 4) array of (x, y, w, h)
+        criterion: OVERLAP_MIN_AREA or OVERLAP_IOU
+
+    Returns:
+        (N, N) float64 matrix of overlap ratios
+    """
+    boxes = boxes.astype(np.int64)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    overlap_x = np.maximum(0, np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]))
+    overlap_y = np.maximum(0, np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]))
+    intersection = overlap_x * overlap_y
+
+    if criterion == OVERLAP_MIN_AREA:
+        denominator = np.minimum(areas[:, None], areas[None, :])
+    elif criterion == OVERLAP_IOU:
+        denominator = areas[:, None] + areas[None, :] - intersection
+    else:
+        raise ValueError(f"Unknown overlap criterion: {criterion}")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = intersection / denominator
+    return np.nan_to_num(ratio, nan=0.0, posinf=0.0)
+
+def non_max_suppression(boxes, threshold: float = 0.3, criterion: str = OVERLAP_MIN_AREA,
+                        scores: Optional[np.ndarray] = None, merge: bool = False,
+                        return_indices: bool = False):
+    """
+    Suppress overlapping boxes
+
+    Args:
+        boxes: (N, 4) array or sequence of (x, y, w, h)
+        threshold: Boxes overlapping a kept box by more than this are dropped
+        criterion: OVERLAP_MIN_AREA (legacy behaviour) or OVERLAP_IOU
+        scores: Optional per-box scores; boxes are visited by descending score
+            instead of input order, and scores weight merged boxes
+        merge: Replace each kept box by the weighted average of itself and
+            the boxes it suppressed
+        return_indices: Also return the input index of each kept box
+
+    Returns:
+        (K, 4) int32 array of kept (or merged) boxes, or (boxes, indices)
+        when return_indices is set
+    """
+    boxes = as_box_array(boxes)
+    order = np.arange(len(boxes))
+    if len(boxes) == 0:
+        return (boxes, order) if return_indices else boxes
+
+    if scores is not None:
+        scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+        order = np.argsort(-scores, kind='stable')
+        boxes, scores = boxes[order], scores[order]
+
+    overlaps = overlap_matrix(boxes, criterion) > threshold
+
+    # Sequential greedy pass; each step is a single vectorized row update
+    count = len(boxes)
+    suppressed = np.zeros(count, dtype=bool)
+    keep = []
+    groups = []
+    for i in range(count):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        members = overlaps[i] & ~suppressed
+        members[i] = True
+        suppressed |= members
+        groups.append(members)
+
+    if not merge:
+        return (boxes[keep], order[keep]) if return_indices else boxes[keep]
+
+    weights = scores if scores is not None else np.ones(count)
+    merged = np.empty((len(keep), 4), dtype=np.int32)
+    for k, members in enumerate(groups):
+        member_weights = weights[members]
+        if member_weights.sum() <= 0:
+            member_weights = np.ones_like(member_weights)
+        merged[k] = np.rint(np.average(boxes[members], axis=0, weights=member_weights))
+    return (merged, order[keep]) if return_indices else merged
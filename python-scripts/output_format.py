@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Detection result encodings
+Author: Nguyen Tuan Khanh
+Description: Encodes detection results for stdout and the worker pipe. Every
+             encoding carries the same schema and decodes back to the same
+             dictionary.
+
+               pretty   indented JSON (the historical CLI output)
+               json     compact single-line JSON; a stream of results is
+                        JSON lines ("jsonl" is accepted as an alias)
+               binary   self-delimiting record: fixed header, int32 box
+                        array, then the remaining fields as compact JSON
+               msgpack  MessagePack (needs the optional msgpack package)
+
+             Binary record layout (little endian):
+               magic "FDR1", version u8, flags u8 (bit 0: success),
+               reserved u16, face count u32, image width u32,
+               image height u32, metadata length u32
+               (face count, 4) int32 array of x, y, width, height
+               metadata: the result without box coordinates, as JSON
+Output: bytes
+"""
+
+import json
+import struct
+import time
+from typing import Any, BinaryIO, Dict, Optional
+
+MAGIC = b"FDR1"
+VERSION = 1
+FLAG_SUCCESS = 0x01
+
+# magic, version, flags, reserved, face count, image width, image height, metadata length
+HEADER = struct.Struct("<4sBBHIIII")
+BOX = struct.Struct("<4i")
+BOX_KEYS = ("x", "y", "width", "height")
+
+FORMATS = ("pretty", "json", "jsonl", "binary", "msgpack")
+
+# Formats read_record() can frame on a pipe: single-line JSON and binary records
+STREAM_FORMATS = ("json", "jsonl", "binary")
+
+# Stand-in for timings.serialize_ms while the result is encoded; no measured
+# duration rounds to it, so it can be found and replaced in the output
+SERIALIZE_PLACEHOLDER = 1.2345678901234567e-300
+
+def _encode_json(result: Dict[str, Any]) -> bytes:
+    return json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+def _encode_pretty(result: Dict[str, Any]) -> bytes:
+    return json.dumps(result, indent=2, ensure_ascii=False).encode("utf-8") + b"\n"
+
+def _encode_binary(result: Dict[str, Any]) -> bytes:
+    data = result.get("data") or {}
+    faces = data.get("faces") or []
+    image_info = data.get("image_info") or {}
+
+    # Everything except the box coordinates goes into the JSON metadata
+    metadata = dict(result)
+    metadata["data"] = {key: value for key, value in data.items() if key not in ("faces", "face_count")}
+    if any(len(face) > len(BOX_KEYS) for face in faces):
+        metadata["data"]["face_extras"] = [
+            {key: value for key, value in face.items() if key not in BOX_KEYS} for face in faces
+        ]
+    meta_bytes = json.dumps(metadata, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    flags = FLAG_SUCCESS if result.get("success") else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, 0, len(faces),
+                         int(image_info.get("width", 0)), int(image_info.get("height", 0)), len(meta_bytes))
+    boxes = struct.pack(f"<{4 * len(faces)}i", *[
+        value for face in faces for value in (face["x"], face["y"], face["width"], face["height"])
+    ])
+    return header + boxes + meta_bytes
+
+def _encode_msgpack(result: Dict[str, Any]) -> bytes:
+    try:
+        import msgpack
+    except ImportError:
+        raise ValueError("The msgpack output format needs the msgpack package (pip install msgpack)")
+    return msgpack.packb(result, use_bin_type=True)
+
+_ENCODERS = {
+    "pretty": _encode_pretty,
+    "json": _encode_json,
+    "jsonl": _encode_json,
+    "binary": _encode_binary,
+    "msgpack": _encode_msgpack,
+}
+
+def encode(result: Dict[str, Any], output_format: str = "json") -> bytes:
+    """
+    Encode a detection result
+
+    When the result carries timings, the encoding is timed and the cost is
+    patched into the encoded bytes as timings.serialize_ms, so the result
+    is still encoded only once.
+
+    Raises:
+        ValueError: For an unknown format, or msgpack without the package
+    """
+    encoder = _ENCODERS.get(output_format)
+    if encoder is None:
+        raise ValueError(f"Unknown output format: {output_format} (choose from {', '.join(FORMATS)})")
+    timings = result.get("processing_info", {}).get("timings")
+    if timings is None:
+        return encoder(result)
+
+    timings["serialize_ms"] = SERIALIZE_PLACEHOLDER
+    started = time.perf_counter()
+    encoded = encoder(result)
+    timings["serialize_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    return _patch_serialize_ms(encoded, output_format, timings["serialize_ms"])
+
+def _patch_serialize_ms(encoded: bytes, output_format: str, value: float) -> bytes:
+    """Replace the placeholder serialize_ms in an encoded result with the measured value"""
+    if output_format == "msgpack":
+        # Floats are packed as fixed-size float64, so the length is unchanged
+        return encoded.replace(b"\xcb" + struct.pack(">d", SERIALIZE_PLACEHOLDER),
+                               b"\xcb" + struct.pack(">d", value), 1)
+
+    placeholder = json.dumps(SERIALIZE_PLACEHOLDER).encode("ascii")
+    measured = json.dumps(value).encode("ascii")
+    patched = encoded.replace(placeholder, measured, 1)
+    if output_format == "binary":
+        # The metadata JSON is the tail of the record; fix its length in the header
+        fields = list(HEADER.unpack_from(patched))
+        fields[-1] += len(measured) - len(placeholder)
+        patched = HEADER.pack(*fields) + patched[HEADER.size:]
+    return patched
+
+def decode_binary(record: bytes) -> Dict[str, Any]:
+    """
+    Decode one binary record back to the result dictionary
+
+    Raises:
+        ValueError: If the bytes are not a complete record of this version
+    """
+    view = memoryview(record)
+    if len(view) < HEADER.size:
+        raise ValueError("Truncated binary detection record")
+    magic, version, flags, _, count, _, _, meta_length = HEADER.unpack_from(view)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a binary detection record (version {VERSION})")
+    boxes_end = HEADER.size + count * BOX.size
+    if len(view) < boxes_end + meta_length:
+        raise ValueError("Truncated binary detection record")
+
+    result = json.loads(bytes(view[boxes_end:boxes_end + meta_length]).decode("utf-8"))
+    data = result.setdefault("data", {})
+    extras = data.pop("face_extras", None)
+    values = struct.unpack_from(f"<{4 * count}i", view, HEADER.size)
+    faces = [
+        {"x": values[i], "y": values[i + 1], "width": values[i + 2], "height": values[i + 3]}
+        for i in range(0, 4 * count, 4)
+    ]
+    if extras:
+        for face, extra in zip(faces, extras):
+            face.update(extra)
+    # Keep the schema's key order: face_count and faces first
+    result["data"] = {"face_count": count, "faces": faces, **data}
+    result["success"] = bool(flags & FLAG_SUCCESS)
+    return result
+
+def decode(record: bytes) -> Dict[str, Any]:
+    """Decode a record of any format, recognized by its first bytes"""
+    if record[:len(MAGIC)] == MAGIC:
+        return decode_binary(record)
+    if record[:1] in (b"{", b"[", b" ", b"\n"):
+        return json.loads(bytes(record).decode("utf-8"))
+    try:
+        import msgpack
+    except ImportError:
+        raise ValueError("Record is neither JSON nor binary, and msgpack is not installed")
+    return msgpack.unpackb(record, raw=False)
+
+def read_record(stream: BinaryIO) -> Optional[bytes]:
+    """
+    Read one encoded record from a stream of binary records or JSON lines
+    (see STREAM_FORMATS; pretty JSON and msgpack have no framing)
+
+    Returns:
+        The record's bytes, or None at end of stream
+    """
+    first = stream.read(len(MAGIC))
+    if not first:
+        return None
+    if first != MAGIC:
+        return first + stream.readline()
+    header = first + stream.read(HEADER.size - len(MAGIC))
+    if len(header) < HEADER.size:
+        raise ValueError("Truncated binary detection record")
+    _, _, _, _, count, _, _, meta_length = HEADER.unpack(header)
+    body_length = count * BOX.size + meta_length
+    body = stream.read(body_length)
+    if len(body) < body_length:
+        raise ValueError("Truncated binary detection record")
+    return header + body
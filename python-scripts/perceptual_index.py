@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection reuse
+Author: Nguyen Tuan Khanh
+Description: Keeps perceptual hashes (dHash or pHash of a tiny grayscale
+             thumbnail) of recently processed images together with their
+             face boxes. A new image whose hash is within a Hamming distance
+             threshold of a stored one (a re-encoded, resized or lightly
+             cropped copy) gets the stored boxes rescaled to its own
+             geometry instead of a full detection run. Optionally detection
+             is re-run inside the transferred regions only, to confirm them.
+             The exact-bytes ResultCache is consulted first; this index only
+             sees images that missed it.
+Output: NearDuplicate matches and hit counters (stats())
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+import nms
+
+HASH_METHODS = ("dhash", "phash")
+
+def dhash(gray: np.ndarray) -> int:
+    """
+    64-bit difference hash: sign of the horizontal gradient on a 9x8 thumbnail
+
+    Args:
+        gray: Grayscale image of any size
+    """
+    thumb = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack_bits(thumb[:, 1:] > thumb[:, :-1])
+
+def phash(gray: np.ndarray) -> int:
+    """
+    64-bit perceptual hash: low DCT frequencies of a 32x32 thumbnail
+    compared with their median (the DC term is left out of the median)
+
+    Args:
+        gray: Grayscale image of any size
+    """
+    thumb = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(thumb)[:8, :8]
+    return _pack_bits(low > np.median(low.flatten()[1:]))
+
+def image_hash(gray: np.ndarray, method: str = "dhash") -> int:
+    """Hash a grayscale image with one of HASH_METHODS"""
+    if method == "dhash":
+        return dhash(gray)
+    if method == "phash":
+        return phash(gray)
+    raise ValueError(f"Unknown hash method: {method} (choose from {', '.join(HASH_METHODS)})")
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.flatten()).tobytes(), "big")
+
+def transfer_boxes(faces, source_size: Tuple[int, int], target_size: Tuple[int, int]) -> np.ndarray:
+    """
+    Rescale (x, y, w, h) boxes from one image geometry to another
+
+    Args:
+        faces: Boxes found on the source image
+        source_size: (width, height) of the source image
+        target_size: (width, height) of the image the boxes are moved to
+
+    Returns:
+        (N, 4) int32 array clipped to the target image
+    """
+    boxes = nms.as_box_array(faces).astype(np.float64)
+    if len(boxes) == 0:
+        return boxes.astype(np.int32)
+    sx = target_size[0] / source_size[0]
+    sy = target_size[1] / source_size[1]
+    boxes *= np.array([sx, sy, sx, sy])
+    boxes = np.rint(boxes).astype(np.int32)
+    boxes[:, 0] = np.clip(boxes[:, 0], 0, target_size[0] - 1)
+    boxes[:, 1] = np.clip(boxes[:, 1], 0, target_size[1] - 1)
+    boxes[:, 2] = np.minimum(boxes[:, 2], target_size[0] - boxes[:, 0])
+    boxes[:, 3] = np.minimum(boxes[:, 3], target_size[1] - boxes[:, 1])
+    return boxes
+
+def verification_regions(faces, image_size: Tuple[int, int],
+                         padding: float = 0.5) -> List[Tuple[int, int, int, int]]:
+    """
+    Padded (x, y, w, h) regions around transferred boxes for re-detection
+
+    The padding (a fraction of the box size on each side) absorbs the shift
+    a light crop causes, since boxes are only rescaled, not re-aligned.
+    """
+    width, height = image_size
+    regions = []
+    for x, y, w, h in nms.as_box_array(faces):
+        pad_x, pad_y = int(w * padding), int(h * padding)
+        x0, y0 = max(0, int(x) - pad_x), max(0, int(y) - pad_y)
+        x1, y1 = min(width, int(x + w) + pad_x), min(height, int(y + h) + pad_y)
+        if x1 > x0 and y1 > y0:
+            regions.append((x0, y0, x1 - x0, y1 - y0))
+    return regions
+
+class NearDuplicate(NamedTuple):
+    """A stored image matching the one being processed"""
+    distance: int
+    # Boxes rescaled to the new image
+    faces: np.ndarray
+    source_size: Tuple[int, int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "hit",
+            "distance": self.distance,
+            "source_size": list(self.source_size),
+            "transferred": len(self.faces)
+        }
+
+class PerceptualIndex:
+    """Thread-safe LRU of perceptual hashes and face boxes with hit counters"""
+
+    def __init__(self, max_entries: int = 256, threshold: int = 6, method: str = "dhash",
+                 verify: bool = False, max_aspect_change: float = 0.1):
+        """
+        Initialize index
+
+        Args:
+            max_entries: Images remembered; the least recently matched or
+                added one is evicted first
+            threshold: Largest Hamming distance (of 64 bits) accepted as a
+                near-duplicate; 0 accepts only identical hashes
+            method: "dhash" (gradient signs, cheapest) or "phash" (DCT,
+                more robust to re-encoding and contrast changes)
+            verify: Re-run detection inside the transferred regions instead
+                of returning the transferred boxes as they are
+            max_aspect_change: Relative aspect ratio difference above which
+                a hash match is rejected; the thumbnails ignore aspect, so a
+                crop beyond this would misplace rescaled boxes
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if not 0 <= threshold <= 64:
+            raise ValueError("threshold must be between 0 and 64")
+        image_hash(np.zeros((8, 8), dtype=np.uint8), method)
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.method = method
+        self.verify = verify
+        self.max_aspect_change = max_aspect_change
+        # id -> (params key, hash, (width, height), boxes)
+        self._entries: "OrderedDict[int, Tuple[str, int, Tuple[int, int], np.ndarray]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "rejected_aspect": 0, "evictions": 0}
+
+    def hash(self, gray: np.ndarray) -> int:
+        return image_hash(gray, self.method)
+
+    def lookup(self, value: int, size: Tuple[int, int], params: Dict[str, Any]) -> Optional[NearDuplicate]:
+        """
+        Find the closest stored image detected with the same parameters
+
+        Args:
+            value: Hash of the new image, see hash()
+            size: (width, height) of the new image
+            params: Every detection input that affects the boxes; only
+                entries stored with equal params can match
+
+        Returns:
+            The match with boxes rescaled to size, or None
+        """
+        key = _params_key(params)
+        with self._lock:
+            best = None
+            for entry_id, (entry_key, entry_hash, entry_size, _) in self._entries.items():
+                if entry_key != key:
+                    continue
+                distance = hamming(value, entry_hash)
+                if distance <= self.threshold and (best is None or distance < best[1]):
+                    best = (entry_id, distance)
+
+            if best is None:
+                self._counters["misses"] += 1
+                return None
+
+            entry_id, distance = best
+            _, _, source_size, boxes = self._entries[entry_id]
+            source_aspect = source_size[0] / source_size[1]
+            if abs(size[0] / size[1] - source_aspect) > self.max_aspect_change * source_aspect:
+                self._counters["rejected_aspect"] += 1
+                self._counters["misses"] += 1
+                return None
+
+            self._entries.move_to_end(entry_id)
+            self._counters["hits"] += 1
+        return NearDuplicate(distance, transfer_boxes(boxes, source_size, size), source_size)
+
+    def add(self, value: int, size: Tuple[int, int], faces, params: Dict[str, Any]) -> None:
+        """Remember the boxes found on an image, evicting the oldest entry when full"""
+        boxes = nms.as_box_array(faces).copy()
+        with self._lock:
+            self._entries[self._next_id] = (_params_key(params), value, tuple(size), boxes)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "method": self.method,
+                "threshold": self.threshold,
+                "verify": self.verify
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+def _params_key(params: Dict[str, Any]) -> str:
+    return json.dumps(params, sort_keys=True, default=str)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Face candidate pre-filter
+Author: Nguyen Tuan Khanh
+Description: Cheap gate run before the cascade. On a low-resolution copy of
+             the image it builds a candidate mask from skin tone (YCrCb, color
+             images only), local contrast (standard deviation) and edge
+             density over face-sized windows. If no face-sized candidate
+             region exists, detection is skipped; otherwise detectMultiScale
+             can be restricted to the padded candidate regions.
+Output: GateDecision objects and hit counters (stats())
+"""
+
+import threading
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import cv2
+import numpy as np
+
+# Skin range in YCrCb (Chai & Ngan); wide enough for most skin tones
+SKIN_CR = (133, 173)
+SKIN_CB = (77, 127)
+
+DECISION_SKIP = "skip"
+DECISION_ROI = "roi"
+DECISION_FULL = "full"
+
+class GateDecision(NamedTuple):
+    """Outcome of the gate for one image"""
+    decision: str
+    # (x, y, w, h) regions in image coordinates; empty unless decision is "roi"
+    rois: List[Tuple[int, int, int, int]]
+    candidate_fraction: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "decision": self.decision,
+            "rois": [list(roi) for roi in self.rois],
+            "candidate_fraction": round(self.candidate_fraction, 4)
+        }
+
+class FaceGate:
+    """Skin / contrast / edge-density gate with hit counters"""
+
+    def __init__(self, min_face: int = 30, work_size: int = 160, recall_margin: float = 0.25,
+                 min_skin_fraction: float = 0.3, min_std: float = 12.0, min_edge_density: float = 0.04,
+                 max_roi_fraction: float = 0.5, use_rois: bool = True):
+        """
+        Initialize gate
+
+        Args:
+            min_face: Smallest face (pixels, full resolution) the detector looks for
+            work_size: Long edge of the low-resolution copy the masks are built on
+            recall_margin: Safety margin in [0, 1). Every threshold is scaled by
+                (1 - recall_margin) and ROIs are padded by this fraction of
+                their size on each side; larger values skip less often
+            min_skin_fraction: Skin pixels a face-sized window needs
+            min_std: Gray-level standard deviation a face-sized window needs
+            min_edge_density: Edge pixels a face-sized window needs
+            max_roi_fraction: Above this candidate area, scan the full image
+            use_rois: Restrict detection to ROIs; otherwise only skip or run in full
+        """
+        if not 0.0 <= recall_margin < 1.0:
+            raise ValueError("recall_margin must be in [0, 1)")
+        self.min_face = min_face
+        self.work_size = work_size
+        self.recall_margin = recall_margin
+        keep = 1.0 - recall_margin
+        self.min_skin_fraction = min_skin_fraction * keep
+        self.min_std = min_std * keep
+        self.min_edge_density = min_edge_density * keep
+        self.max_roi_fraction = max_roi_fraction
+        self.use_rois = use_rois
+
+        self._lock = threading.Lock()
+        self._counters = {"evaluated": 0, DECISION_SKIP: 0, DECISION_ROI: 0, DECISION_FULL: 0}
+
+    def _window_mean(self, values: np.ndarray, window: int) -> np.ndarray:
+        return cv2.boxFilter(values, cv2.CV_32F, (window, window), borderType=cv2.BORDER_REFLECT)
+
+    def candidate_mask(self, image: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Low-resolution mask of pixels whose face-sized neighborhood passes every test
+
+        Returns:
+            (uint8 mask, scale from image to mask coordinates)
+        """
+        height, width = image.shape[:2]
+        scale = min(1.0, self.work_size / max(height, width))
+        small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else image
+        window = max(3, int(round(self.min_face * scale)) | 1)
+
+        gray = small if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray_f = gray.astype(np.float32)
+        mean = self._window_mean(gray_f, window)
+        variance = self._window_mean(gray_f * gray_f, window) - mean * mean
+        mask = np.sqrt(np.maximum(variance, 0)) >= self.min_std
+
+        edges = cv2.Canny(gray, 50, 150) > 0
+        mask &= self._window_mean(edges.astype(np.float32), window) >= self.min_edge_density
+
+        if small.ndim == 3:
+            ycrcb = cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb)
+            skin = cv2.inRange(ycrcb, (0, SKIN_CR[0], SKIN_CB[0]), (255, SKIN_CR[1], SKIN_CB[1])) > 0
+            mask &= self._window_mean(skin.astype(np.float32), window) >= self.min_skin_fraction
+
+        return mask.astype(np.uint8), scale
+
+    def evaluate(self, image: np.ndarray) -> GateDecision:
+        """Decide whether (and where) to run the cascade on an image"""
+        height, width = image.shape[:2]
+        mask, scale = self.candidate_mask(image)
+        fraction = float(mask.mean()) if mask.size else 0.0
+
+        rois = []
+        if fraction > 0:
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            for x, y, w, h, _ in stats[1:count]:
+                # Back to full resolution, padded by the face size and the margin
+                x0, y0 = x / scale, y / scale
+                w, h = w / scale, h / scale
+                pad_x = self.min_face + self.recall_margin * w
+                pad_y = self.min_face + self.recall_margin * h
+                x1, y1 = min(width, int(x0 + w + pad_x)), min(height, int(y0 + h + pad_y))
+                x0, y0 = max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y))
+                if x1 - x0 >= self.min_face and y1 - y0 >= self.min_face:
+                    rois.append((x0, y0, x1 - x0, y1 - y0))
+            rois = merge_rois(rois)
+
+        roi_area = sum(w * h for _, _, w, h in rois)
+        if not rois:
+            decision = GateDecision(DECISION_SKIP, [], fraction)
+        elif self.use_rois and roi_area <= self.max_roi_fraction * width * height:
+            decision = GateDecision(DECISION_ROI, rois, fraction)
+        else:
+            decision = GateDecision(DECISION_FULL, [], fraction)
+
+        with self._lock:
+            self._counters["evaluated"] += 1
+            self._counters[decision.decision] += 1
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        """How often the gate skipped, restricted or passed through detection"""
+        with self._lock:
+            evaluated = self._counters["evaluated"]
+            return {
+                **self._counters,
+                "skip_rate": round(self._counters[DECISION_SKIP] / evaluated, 4) if evaluated else 0.0,
+                "recall_margin": self.recall_margin,
+                "min_face": self.min_face
+            }
+
+def merge_rois(rois: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    """Union overlapping rectangles until none overlap"""
+    rois = list(rois)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                ax, ay, aw, ah = rois[i]
+                bx, by, bw, bh = rois[j]
+                if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                    x0, y0 = min(ax, bx), min(ay, by)
+                    x1, y1 = max(ax + aw, bx + bw), max(ay + ah, by + bh)
+                    rois[i] = (x0, y0, x1 - x0, y1 - y0)
+                    del rois[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return rois
+
+def detect_in_rois(gray: np.ndarray, rois: List[Tuple[int, int, int, int]],
+                   detect: Callable[[np.ndarray], np.ndarray], scale: float = 1.0) -> np.ndarray:
+    """
+    Run a detector on each ROI and return boxes in image coordinates
+
+    Args:
+        gray: Image the detector runs on
+        rois: Regions in original image coordinates
+        detect: Function mapping an image crop to an (N, 4) box array
+        scale: Size of gray relative to the original image (for downscaled detection)
+    """
+    results = []
+    for x, y, w, h in rois:
+        x0, y0 = int(x * scale), int(y * scale)
+        x1, y1 = int(np.ceil((x + w) * scale)), int(np.ceil((y + h) * scale))
+        boxes = np.array(detect(gray[y0:y1, x0:x1]), dtype=np.int32).reshape(-1, 4)
+        boxes[:, 0] += x0
+        boxes[:, 1] += y0
+        results.append(boxes)
+    return np.concatenate(results) if results else np.empty((0, 4), dtype=np.int32)
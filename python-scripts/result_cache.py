@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Content-addressed detection result cache
+Author: Nguyen Tuan Khanh
+Description: Caches detection results keyed by a hash of the encoded image
+             bytes, the cascade identity and every detection parameter.
+             Results live in an in-memory LRU bounded by entry count and/or
+             bytes, optionally backed by a SQLite file that survives restarts.
+             A hit returns the stored result without decoding the image.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+def cascade_identity(cascade_path: str) -> str:
+    """Identify a cascade file by name, size and modification time"""
+    stat = os.stat(cascade_path)
+    return f"{os.path.basename(cascade_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def make_key(image_bytes, cascade_id: str, params: Dict[str, Any]) -> str:
+    """Cache key for an encoded image, a cascade and detection parameters"""
+    digest = hashlib.sha256(image_bytes)
+    digest.update(b"\0" + cascade_id.encode("utf-8"))
+    digest.update(b"\0" + json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+class ResultCache:
+    """Thread-safe LRU of serialized results with an optional SQLite store"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = None, store_path: str = None):
+        """
+        Initialize cache
+
+        Args:
+            max_entries: Maximum results kept in memory (None for no limit)
+            max_bytes: Maximum serialized size kept in memory (None for no limit)
+            store_path: SQLite file for a persistent second level (optional)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "store_hits": 0, "misses": 0, "evictions": 0}
+
+        self._store = None
+        if store_path:
+            self._store = sqlite3.connect(store_path, check_same_thread=False)
+            self._store.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._store.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached result, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return json.loads(value)
+
+            if self._store is not None:
+                row = self._store.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._counters["store_hits"] += 1
+                    self._remember(key, row[0])
+                    return json.loads(row[0])
+
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result in memory and in the persistent store"""
+        value = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, value)
+            if self._store is not None:
+                self._store.execute("INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)", (key, value))
+                self._store.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return the cached result or compute and cache it
+
+        Only successful results are cached. The returned result carries
+        processing_info.cache set to "hit" or "miss".
+        """
+        result = self.get(key)
+        if result is not None:
+            status = "hit"
+        else:
+            status = "miss"
+            result = compute()
+            if result.get("success"):
+                self.put(key, result)
+
+        result.setdefault("processing_info", {})["cache"] = status
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current memory usage"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["store_hits"] + self._counters["misses"]
+            hits = self._counters["hits"] + self._counters["store_hits"]
+            return {
+                **self._counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "persistent": self._store is not None
+            }
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the persistent store is kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def close(self) -> None:
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def _remember(self, key: str, value: str) -> None:
+        """Insert into the LRU and evict down to the limits; caller holds the lock"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = value
+        self._bytes += len(value)
+
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._counters["evictions"] += 1
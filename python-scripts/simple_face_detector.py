@@ -1,43 +1,34 @@
 #!/usr/bin/env python3
 """
 Simplified Face Detection Script - Working Version
+Runs detection_engine.py with the legacy profile by default
 """
 import cv2
 import json
-import sys
+import argparse
 import os
 
-def detect_faces_simple(image_path):
+import cascade_registry
+import detection_engine
+
+CASCADE_CANDIDATES = [
+    'haarcascade_frontalface_default.xml',
+    'haarcascade_frontalface_alt.xml',
+    cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+]
+
+def detect_faces_simple(image_path, profile="legacy"):
     """Simple face detection function"""
-    
-    # Try to find cascade file
-    cascade_files = [
-        'haarcascade_frontalface_default.xml',
-        'haarcascade_frontalface_alt.xml'
-    ]
-    
-    face_cascade = None
-    for cascade_file in cascade_files:
-        if os.path.exists(cascade_file):
-            try:
-                face_cascade = cv2.CascadeClassifier(cascade_file)
-                if not face_cascade.empty():
-                    break
-            except:
-                continue
-    
-    # If no local file works, try using cv2 data
-    if face_cascade is None or face_cascade.empty():
-        try:
-            # This should work with OpenCV installation
-            face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-        except:
-            return {
-                "success": False,
-                "message": "Could not load face cascade",
-                "data": {"face_count": 0, "faces": []}
-            }
-    
+
+    # Try local cascade files first, then the copy shipped with OpenCV
+    face_cascade, _ = cascade_registry.find_cascade(CASCADE_CANDIDATES)
+    if face_cascade is None:
+        return {
+            "success": False,
+            "message": "Could not load face cascade",
+            "data": {"face_count": 0, "faces": []}
+        }
+
     # Check if image exists
     if not os.path.exists(image_path):
         return {
@@ -45,7 +36,7 @@ def detect_faces_simple(image_path):
             "message": f"Image not found: {image_path}",
             "data": {"face_count": 0, "faces": []}
         }
-    
+
     # Read and process image
     try:
         image = cv2.imread(image_path)
@@ -55,22 +46,13 @@ def detect_faces_simple(image_path):
                 "message": f"Could not read image: {image_path}",
                 "data": {"face_count": 0, "faces": []}
             }
-        
+
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
+
         # Detect faces
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
-        
-        # Format results
-        face_list = []
-        for (x, y, w, h) in faces:
-            face_list.append({
-                "x": int(x),
-                "y": int(y), 
-                "width": int(w),
-                "height": int(h)
-            })
-        
+        faces, _ = detection_engine.detect(face_cascade, gray, profile)
+        face_list = detection_engine.faces_to_list(faces)
+
         return {
             "success": True,
             "message": "Face detection completed",
@@ -79,7 +61,7 @@ def detect_faces_simple(image_path):
                 "faces": face_list
             }
         }
-        
+
     except Exception as e:
         return {
             "success": False,
@@ -88,13 +70,15 @@ def detect_faces_simple(image_path):
         }
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python simple_face_detector.py <image_path>")
-        sys.exit(1)
-    
-    image_path = sys.argv[1]
-    result = detect_faces_simple(image_path)
-    
+    parser = argparse.ArgumentParser(description='Simple face detection')
+    parser.add_argument('image_path', help='Path to the image file')
+    parser.add_argument('--detection-profile', default='legacy',
+                        help='Speed/recall preset (default: legacy, i.e. 1.1 / 4 on the full image; '
+                             'see detection_engine.py)')
+    args = parser.parse_args()
+
+    result = detect_faces_simple(args.image_path, args.detection_profile)
+
     print(json.dumps(result, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
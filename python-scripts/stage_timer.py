@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Detection stage timing and profiling helpers
+Author: Nguyen Tuan Khanh
+Description: Opt-in instrumentation for the detection hot path. A StageTimer
+             records monotonic (perf_counter) durations per named stage;
+             NULL_TIMER has the same interface and does nothing, so disabled
+             timing costs one attribute lookup and a shared no-op context
+             manager per stage.
+"""
+
+import cProfile
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Tuple
+
+class StageTimer:
+    """Accumulates wall-clock time per stage, in insertion order"""
+
+    enabled = True
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block; repeated stages are summed"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stages[name] = self._stages.get(name, 0.0) + time.perf_counter() - started
+
+    def record(self, name: str, seconds: float) -> None:
+        """Add an externally measured duration"""
+        self._stages[name] = self._stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage durations in milliseconds, plus total_ms since the timer was created"""
+        timings = {f"{name}_ms": round(seconds * 1000.0, 3) for name, seconds in self._stages.items()}
+        timings["total_ms"] = round((time.perf_counter() - self._started) * 1000.0, 3)
+        return timings
+
+class _NullTimer:
+    """StageTimer stand-in used when timing is disabled"""
+
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name: str):
+        return self._context
+
+    def record(self, name: str, seconds: float) -> None:
+        pass
+
+    def as_dict(self) -> Dict[str, float]:
+        return {}
+
+NULL_TIMER = _NullTimer()
+
+def make_timer(enabled: bool):
+    """Return a fresh StageTimer if enabled, else the shared NULL_TIMER"""
+    return StageTimer() if enabled else NULL_TIMER
+
+def pyramid_levels(image_size: Tuple[int, int], window_size: Tuple[int, int], scale_factor: float,
+                   min_size: Tuple[int, int] = (0, 0), max_size: Tuple[int, int] = (0, 0)) -> int:
+    """
+    Number of pyramid levels detectMultiScale evaluates
+
+    Mirrors the scale loop of cv::CascadeClassifier::detectMultiScale:
+    levels whose window is smaller than min_size are skipped, and the loop
+    stops once the scaled image no longer fits the window or the window
+    exceeds max_size.
+
+    Args:
+        image_size: (width, height) of the detection image
+        window_size: Cascade training window, cascade.getOriginalWindowSize()
+        scale_factor: detectMultiScale scaleFactor
+        min_size: minSize passed to detectMultiScale
+        max_size: maxSize passed to detectMultiScale ((0, 0) for the image size)
+    """
+    width, height = image_size
+    max_w, max_h = max_size if max_size and max_size[0] > 0 and max_size[1] > 0 else image_size
+    min_w, min_h = min_size or (0, 0)
+    levels = 0
+    factor = 1.0
+    while True:
+        window_w, window_h = round(window_size[0] * factor), round(window_size[1] * factor)
+        if round(width / factor) - window_size[0] <= 0 or round(height / factor) - window_size[1] <= 0:
+            break
+        if window_w > max_w or window_h > max_h:
+            break
+        if window_w >= min_w and window_h >= min_h:
+            levels += 1
+        factor *= scale_factor
+    return levels
+
+def attach_timings(result: Dict[str, Any], timer, **details) -> Dict[str, Any]:
+    """Add timer stages and extra details under processing_info.timings"""
+    if timer.enabled:
+        timings = timer.as_dict()
+        timings.update(details)
+        result.setdefault("processing_info", {})["timings"] = timings
+    return result
+
+@contextmanager
+def profile_to(path: str = None):
+    """
+    Run the enclosed block under cProfile and dump stats to path
+
+    Does nothing when path is None. Inspect the dump with
+    `python -m pstats <path>` or snakeviz.
+    """
+    if not path:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+def dumps_timed(result: Dict[str, Any], **kwargs) -> str:
+    """
+    json.dumps that also reports serialization time when timings are present
+
+    The result is serialized once to measure the cost, which is then added
+    as timings.serialize_ms before the final serialization. Without timings
+    this is a plain json.dumps.
+    """
+    timings = result.get("processing_info", {}).get("timings")
+    if timings is None:
+        return json.dumps(result, **kwargs)
+    started = time.perf_counter()
+    json.dumps(result, **kwargs)
+    timings["serialize_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    return json.dumps(result, **kwargs)
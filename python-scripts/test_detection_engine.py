@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for the detection profiles and pass planning in detection_engine.py
+"""
+import os
+
+import cv2
+import pytest
+
+import cascade_registry
+import detection_engine
+import nms
+from detection_engine import PROFILES, get_profile, pass_params, profile_from_dict, profile_to_dict
+
+def test_get_profile_by_name_and_default():
+    assert get_profile("thorough") is PROFILES["thorough"]
+    assert get_profile(None) is PROFILES[detection_engine.DEFAULT_PROFILE]
+    assert get_profile(PROFILES["fast"]) is PROFILES["fast"]
+    with pytest.raises(ValueError):
+        get_profile("no-such-profile")
+
+def test_profile_dict_round_trip():
+    for profile in PROFILES.values():
+        assert profile_from_dict(profile_to_dict(profile)) == profile
+
+def test_profile_from_dict_fills_in_from_base():
+    profile = profile_from_dict({"name": "custom", "base": "thorough", "min_neighbors": 3})
+    assert profile.min_neighbors == 3
+    assert profile.extra_passes == PROFILES["thorough"].extra_passes
+    assert profile.nms_threshold == PROFILES["thorough"].nms_threshold
+
+def test_profile_from_dict_rejects_bad_entries():
+    with pytest.raises(ValueError):
+        profile_from_dict({"description": "no name"})
+    with pytest.raises(ValueError):
+        profile_from_dict({"name": "bad", "scale_factor": 1.0})
+    with pytest.raises(ValueError):
+        profile_from_dict({"name": "bad", "min_neighbors": "many"})
+
+def test_pass_params_clamps_extra_passes():
+    assert pass_params(PROFILES["balanced"]) == [(1.1, 5)]
+    params = pass_params(PROFILES["thorough"])
+    assert [mn for _, mn in params] == [5, 4, 7]
+    assert [sf for sf, _ in params] == pytest.approx([1.1, 1.05, 1.2])
+    # Extra passes stay inside the pass ranges even when the first pass does not
+    params = pass_params(PROFILES["thorough"], min_neighbors=1)
+    assert params[0] == (1.1, 1)
+    low, high = detection_engine.PASS_NEIGHBOR_RANGE
+    assert all(low <= mn <= high for _, mn in params[1:])
+
+def test_saved_profiles_load_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(detection_engine, "PROFILES", dict(PROFILES))
+    tuned = profile_from_dict({"name": "tuned", "base": "balanced", "scale_factor": 1.15, "min_neighbors": 3})
+    path = str(tmp_path / "profiles.json")
+    detection_engine.save_profiles([tuned], path, extra=[{"metrics": {"recall": 0.9}}], source="sweep")
+
+    assert detection_engine.load_profiles(path) == ["tuned"]
+    assert get_profile("tuned") == tuned
+
+def test_load_profiles_refuses_builtin_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(detection_engine, "PROFILES", dict(PROFILES))
+    path = str(tmp_path / "profiles.json")
+    detection_engine.save_profiles([PROFILES["fast"]._replace(min_neighbors=2)], path)
+    with pytest.raises(ValueError):
+        detection_engine.load_profiles(path)
+    assert get_profile("fast") == PROFILES["fast"]
+
+def test_load_profiles_rejects_other_versions(tmp_path):
+    path = tmp_path / "profiles.json"
+    path.write_text('{"version": 99, "profiles": []}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        detection_engine.load_profiles(str(path))
+
+def test_size_bounds_without_ratios_keeps_the_absolute_minimum():
+    assert detection_engine.size_bounds((480, 640), 30) == ((30, 30), None)
+
+def test_size_bounds_from_ratios():
+    # The minimum follows the shorter side, the maximum the longer one
+    assert detection_engine.size_bounds((480, 640), 30, 0.1, 0.5) == ((48, 48), (320, 320))
+    # A relative minimum never goes below the absolute one
+    assert detection_engine.size_bounds((100, 200), 30, 0.1) == ((30, 30), None)
+    # The maximum never goes below the minimum
+    assert detection_engine.size_bounds((100, 100), 40, None, 0.2) == ((40, 40), (40, 40))
+
+def test_validate_face_ratios():
+    assert detection_engine.validate_face_ratios(0.05, 0.8) is None
+    assert detection_engine.validate_face_ratios(None, None) is None
+    assert detection_engine.validate_face_ratios(0.0, None) is not None
+    assert detection_engine.validate_face_ratios(None, 1.5) is not None
+    assert detection_engine.validate_face_ratios(0.5, 0.2) is not None
+
+GROUP_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "face-detection-frontend", "samples", "group.jpg")
+
+@pytest.mark.skipif(not os.path.exists(GROUP_IMAGE), reason="sample image not available")
+@pytest.mark.parametrize("min_neighbors", [1, 4])
+def test_multi_pass_matches_separate_detect_multi_scale_calls(min_neighbors):
+    cascade = cascade_registry.get_cascade(cascade_registry.DEFAULT_CASCADE)
+    gray = cv2.imread(GROUP_IMAGE, cv2.IMREAD_GRAYSCALE)
+    params = pass_params(PROFILES["thorough"], min_neighbors=min_neighbors)
+    # A repeated scale factor takes the shared-candidate path
+    params.append(params[0][:1] + (params[0][1] + 2,))
+
+    found = detection_engine.detect_multi_pass(cascade, gray, params, 10)
+    for (sf, mn), boxes in zip(params, found):
+        expected = cascade.detectMultiScale(gray, scaleFactor=sf, minNeighbors=mn, minSize=(10, 10))
+        assert sorted(boxes.tolist()) == sorted(nms.as_box_array(expected).tolist())
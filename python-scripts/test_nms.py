@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the vectorized non-maximum suppression in nms.py
+"""
+import numpy as np
+
+import nms
+
+def reference_filter(faces, threshold):
+    """The pure-Python overlap filter nms.py replaced"""
+    keep = []
+    for x1, y1, w1, h1 in faces:
+        for x2, y2, w2, h2 in keep:
+            overlap_x = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
+            overlap_y = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
+            if overlap_x * overlap_y / min(w1 * h1, w2 * h2) > threshold:
+                break
+        else:
+            keep.append((x1, y1, w1, h1))
+    return keep
+
+def test_as_box_array_shapes():
+    assert nms.as_box_array([]).shape == (0, 4)
+    boxes = nms.as_box_array([(1, 2, 3, 4), (5, 6, 7, 8)])
+    assert boxes.dtype == np.int32
+    assert boxes.tolist() == [[1, 2, 3, 4], [5, 6, 7, 8]]
+
+def test_overlap_matrix_criteria():
+    boxes = nms.as_box_array([(0, 0, 10, 10), (5, 0, 10, 10), (0, 0, 5, 5)])
+    min_area = nms.overlap_matrix(boxes, nms.OVERLAP_MIN_AREA)
+    iou = nms.overlap_matrix(boxes, nms.OVERLAP_IOU)
+    assert min_area[0, 1] == 0.5
+    assert abs(iou[0, 1] - 50 / 150) < 1e-12
+    # A box inside another overlaps it fully by the min-area criterion
+    assert min_area[0, 2] == 1.0
+    assert iou[0, 2] == 0.25
+
+def test_zero_area_boxes_do_not_produce_nan():
+    overlaps = nms.overlap_matrix(nms.as_box_array([(0, 0, 0, 0), (0, 0, 0, 0)]))
+    assert not np.isnan(overlaps).any()
+
+def test_matches_reference_filter_on_random_boxes():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        count = int(rng.integers(0, 30))
+        xy = rng.integers(0, 200, size=(count, 2))
+        wh = rng.integers(1, 80, size=(count, 2))
+        faces = [tuple(map(int, box)) for box in np.hstack([xy, wh])]
+        for threshold in (0.0, 0.3, 0.5):
+            expected = reference_filter(faces, threshold)
+            assert nms.non_max_suppression(faces, threshold).tolist() == [list(box) for box in expected]
+
+def test_scores_change_visiting_order():
+    boxes = [(0, 0, 10, 10), (1, 1, 10, 10)]
+    assert nms.non_max_suppression(boxes, 0.3).tolist() == [[0, 0, 10, 10]]
+    kept, indices = nms.non_max_suppression(boxes, 0.3, scores=[1, 5], return_indices=True)
+    assert kept.tolist() == [[1, 1, 10, 10]]
+    assert indices.tolist() == [1]
+
+def test_merge_averages_suppressed_boxes():
+    merged = nms.non_max_suppression([(0, 0, 10, 10), (2, 2, 10, 10)], 0.3, merge=True)
+    assert merged.tolist() == [[1, 1, 10, 10]]
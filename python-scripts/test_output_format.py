@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the detection result encodings
+"""
+import copy
+import io
+
+import pytest
+
+import output_format
+
+RESULT = {
+    "success": True,
+    "message": "Face detection completed successfully",
+    "data": {
+        "face_count": 2,
+        "faces": [
+            {"x": 10, "y": 20, "width": 30, "height": 30},
+            {"x": 100, "y": 5, "width": 48, "height": 48, "cascade": "alt2"}
+        ],
+        "image_info": {"width": 640, "height": 480, "channels": 3}
+    },
+    "processing_info": {"scaleFactor": 1.1, "minNeighbors": 4}
+}
+
+def _formats():
+    formats = list(output_format.FORMATS)
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        formats.remove("msgpack")
+    return formats
+
+@pytest.mark.parametrize("name", _formats())
+def test_round_trip(name):
+    assert output_format.decode(output_format.encode(copy.deepcopy(RESULT), name)) == RESULT
+
+@pytest.mark.parametrize("name", _formats())
+def test_timed_result_reports_serialize_ms(name):
+    result = copy.deepcopy(RESULT)
+    result["processing_info"]["timings"] = {"total_ms": 12.5}
+    decoded = output_format.decode(output_format.encode(result, name))
+    serialize_ms = decoded["processing_info"]["timings"]["serialize_ms"]
+    assert serialize_ms == result["processing_info"]["timings"]["serialize_ms"]
+    assert serialize_ms != output_format.SERIALIZE_PLACEHOLDER
+    assert decoded == result
+
+def test_failed_result_round_trips_through_binary():
+    failure = {"success": False, "message": "Failed to read image", "data": {"face_count": 0, "faces": []}}
+    assert output_format.decode(output_format.encode(failure, "binary")) == failure
+
+def test_read_record_frames_a_mixed_stream():
+    records = [output_format.encode(RESULT, "binary"), output_format.encode(RESULT, "json"),
+               output_format.encode(RESULT, "binary")]
+    stream = io.BytesIO(b"".join(records))
+    assert [output_format.read_record(stream) for _ in records] == records
+    assert output_format.read_record(stream) is None
+
+def test_truncated_binary_record_is_rejected():
+    record = output_format.encode(RESULT, "binary")
+    with pytest.raises(ValueError):
+        output_format.decode_binary(record[:-1])
+    with pytest.raises(ValueError):
+        output_format.read_record(io.BytesIO(record[:output_format.HEADER.size + 3]))
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        output_format.encode(RESULT, "xml")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Tests for perceptual hashing and the near-duplicate index
+"""
+import cv2
+import numpy as np
+import pytest
+
+from perceptual_index import PerceptualIndex, dhash, hamming, image_hash, phash, transfer_boxes
+
+PARAMS = {"profile": "balanced", "min_size": 30}
+
+def _image(seed=0, size=(120, 160)):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, size=(12, 16), dtype=np.uint8)
+    return cv2.resize(small, (size[1], size[0]), interpolation=cv2.INTER_LINEAR)
+
+def test_hamming():
+    assert hamming(0, 0) == 0
+    assert hamming(0b1011, 0b0001) == 2
+    assert hamming(0, (1 << 64) - 1) == 64
+
+def test_hashes_are_64_bit_and_stable_under_resizing():
+    gray = _image()
+    for function in (dhash, phash):
+        value = function(gray)
+        assert 0 <= value < 1 << 64
+        resized = cv2.resize(gray, (320, 240), interpolation=cv2.INTER_LINEAR)
+        assert hamming(value, function(resized)) <= 6
+        assert hamming(value, function(_image(seed=1))) > 6
+
+def test_dhash_follows_horizontal_gradient():
+    ramp = np.tile(np.arange(0, 256, 16, dtype=np.uint8), (16, 1))
+    assert dhash(ramp) == (1 << 64) - 1
+    assert dhash(ramp[:, ::-1]) == 0
+
+def test_unknown_hash_method():
+    with pytest.raises(ValueError):
+        image_hash(_image(), "ahash")
+    with pytest.raises(ValueError):
+        PerceptualIndex(method="ahash")
+
+def test_transfer_boxes_rescales_and_clips():
+    boxes = transfer_boxes([(10, 20, 30, 40), (90, 90, 20, 20)], (100, 100), (200, 50))
+    assert boxes.tolist() == [[20, 10, 60, 20], [180, 45, 20, 5]]
+
+def test_lookup_transfers_boxes_to_the_new_size():
+    index = PerceptualIndex(threshold=6)
+    gray = _image()
+    index.add(index.hash(gray), (160, 120), [(10, 20, 30, 30)], PARAMS)
+
+    resized = cv2.resize(gray, (320, 240), interpolation=cv2.INTER_LINEAR)
+    match = index.lookup(index.hash(resized), (320, 240), PARAMS)
+    assert match is not None
+    assert match.faces.tolist() == [[20, 40, 60, 60]]
+    assert match.source_size == (160, 120)
+
+def test_lookup_needs_equal_params_and_aspect():
+    index = PerceptualIndex()
+    value = index.hash(_image())
+    index.add(value, (160, 120), [(10, 20, 30, 30)], PARAMS)
+    assert index.lookup(value, (160, 120), {**PARAMS, "min_size": 20}) is None
+    assert index.lookup(value, (160, 60), PARAMS) is None
+    stats = index.stats()
+    assert stats["misses"] == 2
+    assert stats["rejected_aspect"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    index = PerceptualIndex(max_entries=2, threshold=0)
+    values = [index.hash(_image(seed)) for seed in range(3)]
+    index.add(values[0], (160, 120), [], PARAMS)
+    index.add(values[1], (160, 120), [], PARAMS)
+    assert index.lookup(values[0], (160, 120), PARAMS) is not None
+    index.add(values[2], (160, 120), [], PARAMS)
+
+    assert index.lookup(values[1], (160, 120), PARAMS) is None
+    assert index.lookup(values[0], (160, 120), PARAMS) is not None
+    assert index.stats()["evictions"] == 1
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed detection result cache
+"""
+from result_cache import ResultCache, make_key
+
+def _result(face_count):
+    return {"success": True, "data": {"face_count": face_count, "faces": []}}
+
+def test_key_depends_on_bytes_cascade_and_params():
+    key = make_key(b"image", "cascade.xml:1:2", {"scale_factor": 1.1, "min_neighbors": 4})
+    assert key == make_key(b"image", "cascade.xml:1:2", {"min_neighbors": 4, "scale_factor": 1.1})
+    assert key != make_key(b"image2", "cascade.xml:1:2", {"scale_factor": 1.1, "min_neighbors": 4})
+    assert key != make_key(b"image", "cascade.xml:1:3", {"scale_factor": 1.1, "min_neighbors": 4})
+    assert key != make_key(b"image", "cascade.xml:1:2", {"scale_factor": 1.2, "min_neighbors": 4})
+
+def test_get_returns_a_fresh_copy():
+    cache = ResultCache()
+    cache.put("a", _result(1))
+    cache.get("a")["data"]["face_count"] = 99
+    assert cache.get("a") == _result(1)
+
+def test_lru_eviction_by_entry_count():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", _result(1))
+    cache.put("b", _result(2))
+    cache.get("a")
+    cache.put("c", _result(3))
+    assert cache.get("b") is None
+    assert cache.get("a") == _result(1)
+    assert cache.stats()["evictions"] == 1
+
+def test_eviction_by_bytes():
+    cache = ResultCache(max_entries=None, max_bytes=100)
+    for index in range(5):
+        cache.put(str(index), _result(index))
+    stats = cache.stats()
+    assert 0 < stats["bytes"] <= 100
+    assert stats["entries"] < 5
+    assert cache.get("4") == _result(4)
+
+def test_get_or_compute_caches_successes_only():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return _result(2)
+
+    assert cache.get_or_compute("a", compute)["processing_info"]["cache"] == "miss"
+    assert cache.get_or_compute("a", compute)["processing_info"]["cache"] == "hit"
+    assert len(calls) == 1
+
+    failure = {"success": False, "message": "bad image", "data": {"face_count": 0, "faces": []}}
+    cache.get_or_compute("b", lambda: dict(failure))
+    assert cache.get("b") is None
+
+def test_persistent_store_survives_a_new_cache(tmp_path):
+    store = str(tmp_path / "results.sqlite")
+    cache = ResultCache(store_path=store)
+    cache.put("a", _result(3))
+    cache.close()
+
+    reopened = ResultCache(store_path=store)
+    assert reopened.get("a") == _result(3)
+    assert reopened.stats()["store_hits"] == 1
+    reopened.close()
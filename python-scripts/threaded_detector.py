@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Thread-pool Face Detection
+Author: Nguyen Tuan Khanh
+Description: Runs FaceDetector on a thread pool inside one process. imread,
+             imdecode, cvtColor and detectMultiScale release the GIL, so
+             threads detect in parallel without a process per worker and
+             without pickling results. detectMultiScale keeps scratch state
+             in the classifier, so each thread uses its own classifier from
+             cascade_registry.get_thread_cascade (one XML parse per thread);
+             sharing one instance between concurrent calls is not safe.
+
+             OpenCV parallelizes detectMultiScale internally as well; by
+             default cv2.setNumThreads is lowered so that pool threads times
+             OpenCV threads does not exceed the CPU count.
+Output: Same JSON schema as FaceDetector.detect_faces(); --scaling prints a
+        throughput comparison of thread and process pools
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List
+
+import cv2
+
+import cascade_registry
+from face_detector import FaceDetector
+
+# Tasks queued per worker thread by map(); bounds decoded images in memory
+IN_FLIGHT_PER_WORKER = 2
+
+class _ThreadLocalDetector(FaceDetector):
+    """FaceDetector whose classifier belongs to the thread that created it"""
+
+    def _load_cascade(self) -> cv2.CascadeClassifier:
+        return cascade_registry.get_thread_cascade(self.cascade_path)
+
+def default_opencv_threads(workers: int) -> int:
+    """OpenCV threads per detection so that workers x threads fits the cores"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+class ThreadedFaceDetector:
+    """Concurrent face detection on a thread pool"""
+
+    def __init__(self, cascade_path: str = None, workers: int = None, opencv_threads: int = None, **detector_options):
+        """
+        Initialize the pool
+
+        Args:
+            cascade_path: Path to Haar Cascade XML file
+            workers: Pool threads (default: CPU count)
+            opencv_threads: Value for cv2.setNumThreads, which is process-wide
+                (default: CPU count // workers; 0 lets OpenCV decide)
+            **detector_options: Passed to each thread's FaceDetector (e.g. timings)
+        """
+        self.cascade_path = cascade_path or cascade_registry.DEFAULT_CASCADE
+        self.workers = workers or os.cpu_count() or 1
+        self.opencv_threads = default_opencv_threads(self.workers) if opencv_threads is None else opencv_threads
+        self._detector_options = detector_options
+        self._local = threading.local()
+
+        # Fail fast on a bad cascade path instead of in every worker
+        cascade_registry.get_cascade(self.cascade_path)
+
+        self._previous_opencv_threads = cv2.getNumThreads()
+        cv2.setNumThreads(self.opencv_threads)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="face-detect")
+
+    def _detector(self) -> FaceDetector:
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self._local.detector = _ThreadLocalDetector(self.cascade_path, **self._detector_options)
+        return detector
+
+    def _run(self, item: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Decode and detect one input on a pool thread"""
+        detector = self._detector()
+        _, kind, payload, timer, _ = detector._prepare_batch_item(0, item)
+        return detector._detect_prepared(kind, payload, timer, options)
+
+    def submit(self, item: Any, **options) -> Future:
+        """
+        Queue one image array, file path or encoded bytes
+
+        Returns:
+            Future resolving to the detection result
+        """
+        return self._executor.submit(self._run, item, options)
+
+    def detect(self, item: Any, **options) -> Dict[str, Any]:
+        """Detect faces in one input on the pool and wait for the result"""
+        return self.submit(item, **options).result()
+
+    def map(self, images: Iterable[Any], ordered: bool = True, **options) -> Iterator[Dict[str, Any]]:
+        """
+        Detect faces in many inputs with a bounded number in flight
+
+        Args:
+            images: List or iterator of image arrays, file paths or encoded bytes
+            ordered: Yield in input order; otherwise in completion order
+            **options: Detection options, see FaceDetector.detect_faces_in_image()
+
+        Yields:
+            Results with "index" (input position) added
+        """
+        max_in_flight = self.workers * IN_FLIGHT_PER_WORKER
+        inputs = enumerate(images)
+        pending = deque()
+        done_queue = deque()
+        condition = threading.Condition()
+
+        def on_done(future):
+            with condition:
+                done_queue.append(future)
+                condition.notify()
+
+        def submit_next() -> bool:
+            for index, item in inputs:
+                future = self.submit(item, **options)
+                future.index = index
+                if not ordered:
+                    future.add_done_callback(on_done)
+                pending.append(future)
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                with condition:
+                    while not done_queue:
+                        condition.wait()
+                    future = done_queue.popleft()
+                pending.remove(future)
+
+            result = future.result()
+            result["index"] = future.index
+            yield result
+            submit_next()
+
+    def close(self) -> None:
+        """Stop the pool and restore the previous cv2.setNumThreads value"""
+        self._executor.shutdown(wait=True)
+        cv2.setNumThreads(self._previous_opencv_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _init_process_worker(cascade_path: str, opencv_threads: int) -> None:
+    """Process pool initializer applying the same OpenCV thread budget"""
+    from batch_detector import _init_worker
+    cv2.setNumThreads(opencv_threads)
+    _init_worker(cascade_path)
+
+def _process_pool_run(paths: List[str], workers: int, cascade_path: str, opencv_threads: int) -> float:
+    """Time a process pool (one detector per process) over the inputs"""
+    from batch_detector import _detect_chunk
+
+    # The pool is started before timing so both pools are measured warm
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker,
+                             initargs=(cascade_path, opencv_threads)) as executor:
+        list(executor.map(_detect_chunk, [[(0, paths[0])]] * workers))
+        started = time.perf_counter()
+        list(executor.map(_detect_chunk, [[(i, path)] for i, path in enumerate(paths)]))
+        return time.perf_counter() - started
+
+def _thread_pool_run(paths: List[str], workers: int, cascade_path: str, opencv_threads: int = None) -> float:
+    """Time the thread pool over the inputs"""
+    with ThreadedFaceDetector(cascade_path, workers, opencv_threads) as detector:
+        list(detector.map([paths[0]] * workers))
+        started = time.perf_counter()
+        for _ in detector.map(paths):
+            pass
+        return time.perf_counter() - started
+
+def measure_scaling(paths: List[str], worker_counts: List[int], cascade_path: str = None,
+                    opencv_threads: int = None) -> Dict[str, Any]:
+    """
+    Throughput of thread and process pools for each worker count
+
+    Both pools load their classifiers before timing starts and use the
+    same cv2.setNumThreads budget. Speedup is relative to the same pool
+    type at the first worker count.
+
+    Returns:
+        Report with images per second, speedup and efficiency per pool
+    """
+    cascade_path = cascade_path or cascade_registry.DEFAULT_CASCADE
+    rows = []
+    baseline = {}
+    for workers in worker_counts:
+        threads = default_opencv_threads(workers) if opencv_threads is None else opencv_threads
+        for pool, run in (("threads", lambda: _thread_pool_run(paths, workers, cascade_path, threads)),
+                          ("processes", lambda: _process_pool_run(paths, workers, cascade_path, threads))):
+            elapsed = run()
+            throughput = len(paths) / elapsed if elapsed > 0 else 0.0
+            if workers == worker_counts[0]:
+                baseline[pool] = throughput
+            base = baseline[pool]
+            rows.append({
+                "pool": pool,
+                "workers": workers,
+                "opencv_threads": threads,
+                "images": len(paths),
+                "elapsed_seconds": round(elapsed, 3),
+                "images_per_second": round(throughput, 3),
+                "speedup": round(throughput / base, 3) if base else None,
+                "efficiency": round(throughput / base / workers * worker_counts[0], 3) if base else None
+            })
+    return {"cpu_count": os.cpu_count(), "results": rows}
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Face detection on a thread pool sharing one process",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python threaded_detector.py photos/*.jpg --workers 4 > results.jsonl
+  python threaded_detector.py photos/*.jpg --workers 4 --opencv-threads 1 --unordered
+  python threaded_detector.py photos/*.jpg --scaling 1 2 4 8
+        """
+    )
+
+    parser.add_argument('images', nargs='+', help='Image files to process')
+    parser.add_argument('--cascade', '-c', help='Path to Haar Cascade XML file (optional)')
+    parser.add_argument('--workers', '-w', type=int, help='Pool threads (default: CPU count)')
+    parser.add_argument('--opencv-threads', type=int,
+                        help='cv2.setNumThreads value (default: CPU count // workers)')
+    parser.add_argument('--unordered', action='store_true',
+                        help='Emit results as they finish instead of in input order')
+    parser.add_argument('--scaling', type=int, nargs='+', metavar='WORKERS',
+                        help='Measure thread vs process pool throughput for these worker counts')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        if args.scaling:
+            report = measure_scaling(args.images, args.scaling, args.cascade, args.opencv_threads)
+            print(json.dumps(report, indent=2))
+            return
+
+        with ThreadedFaceDetector(args.cascade, args.workers, args.opencv_threads) as detector:
+            for result in detector.map(args.images, ordered=not args.unordered):
+                result["image_path"] = args.images[result["index"]]
+                sys.stdout.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    except (OSError, ValueError) as e:
+        print(json.dumps({"success": False, "message": str(e), "data": {"face_count": 0, "faces": []}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Tiled Face Detection for very large images
+Author: Nguyen Tuan Khanh
+Description: Decodes the image straight to grayscale and runs the cascade on
+             overlapping tiles, optionally on a thread pool, so the cascade's
+             pyramid and integral images are only ever built for one tile per
+             worker. Faces larger than the tile overlap are found by one
+             more pass over a copy downscaled to a single tile. Boxes found
+             in several tiles are merged with NMS.
+Output: Same JSON schema as FaceDetector.detect_faces()
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+import cascade_registry
+import detection_engine
+import nms
+
+# Rough working memory of detectMultiScale per tile pixel: the scaled image
+# pyramid plus integral images for every level
+CASCADE_BYTES_PER_PIXEL = 80
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+def plan_tiles(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Split an image into overlapping tiles
+
+    Adjacent tiles share `overlap` pixels, so any face up to that size lies
+    entirely inside at least one tile.
+
+    Returns:
+        List of (x0, y0, x1, y1) tile bounds
+    """
+    tile_size = max(tile_size, overlap + 1)
+    step = tile_size - overlap
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(width, x + tile_size), min(height, y + tile_size))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+def tile_size_for_budget(image_pixels: int, memory_budget: int, workers: int, overlap: int) -> int:
+    """
+    Largest square tile whose cascade working memory fits the budget
+
+    The decoded grayscale image itself (one byte per pixel) is charged to
+    the budget first; the rest is shared by the concurrently running tiles.
+    """
+    available = memory_budget - image_pixels
+    if available <= 0:
+        raise MemoryError(f"Memory budget of {memory_budget} bytes cannot hold the decoded image "
+                          f"({image_pixels} bytes)")
+    side = int((available / (workers * CASCADE_BYTES_PER_PIXEL)) ** 0.5)
+    if side <= overlap:
+        raise MemoryError(f"Memory budget of {memory_budget} bytes is too small for tiles "
+                          f"larger than the {overlap} px overlap")
+    return side
+
+def detect_boxes_tiled(detector, gray: np.ndarray, max_face_size: int = 400, tile_size: int = None,
+                       memory_budget: int = DEFAULT_MEMORY_BUDGET, workers: int = 1) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Detect faces tile by tile
+
+    Args:
+        detector: Loaded FaceDetector (its cascade file and parameters are used)
+        gray: Grayscale image, already preprocessed for the detector's profile
+        max_face_size: Largest face the tiles are scanned for; also the tile
+            overlap. Larger faces come from a pass over a copy shrunk to the
+            size of one tile, which finds them from max_face_size or
+            coarse_min_face (see the tiling info), whichever is larger
+        tile_size: Tile side length (default: derived from memory_budget)
+        memory_budget: Peak memory target in bytes when tile_size is not given
+        workers: Tiles processed concurrently
+
+    Returns:
+        Tuple of ((N, 4) int32 boxes in image coordinates, tiling info)
+    """
+    height, width = gray.shape[:2]
+    if tile_size is None:
+        tile_size = tile_size_for_budget(gray.size, memory_budget, workers, max_face_size)
+    tiles = plan_tiles(width, height, tile_size, max_face_size)
+    # A single tile covers the image; it needs no size cap and no coarse pass
+    max_size = (max_face_size, max_face_size) if len(tiles) > 1 else None
+
+    def detect_tile(bounds):
+        x0, y0, x1, y1 = bounds
+        cascade = cascade_registry.get_thread_cascade(detector.cascade_path) if workers > 1 else None
+        boxes = detector.detect_boxes(
+            gray[y0:y1, x0:x1],
+            max_size=max_size,
+            cascade=cascade
+        )
+        boxes[:, 0] += x0
+        boxes[:, 1] += y0
+        return boxes
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(detect_tile, tiles))
+    else:
+        results = [detect_tile(bounds) for bounds in tiles]
+
+    coarse_scale = None
+    coarse_min_face = None
+    if max_size is not None:
+        # Faces above the overlap may be cut by every tile; find them on a one-tile copy
+        coarse_scale = min(1.0, tile_size / max(width, height))
+        coarse = cv2.resize(gray, None, fx=coarse_scale, fy=coarse_scale, interpolation=cv2.INTER_AREA)
+        coarse_min = max(detector.MIN_SIZE[0], int(max_face_size * coarse_scale))
+        boxes = detector.detect_boxes(coarse, min_size=(coarse_min, coarse_min))
+        # First, so whole large faces win over the fragments tiles found of them
+        results.insert(0, np.rint(boxes / coarse_scale).astype(np.int32))
+        coarse_min_face = int(np.ceil(coarse_min / coarse_scale))
+
+    boxes = np.concatenate(results) if results else nms.as_box_array([])
+
+    # A face near a border can be found whole in one tile and cut in the
+    # next; the min-area criterion also removes such contained fragments
+    merged = nms.non_max_suppression(boxes, threshold=0.5, criterion=nms.OVERLAP_MIN_AREA)
+
+    info = {
+        "tile_size": tile_size,
+        "overlap": max_face_size,
+        "tile_count": len(tiles),
+        "workers": workers,
+        "raw_detections": int(len(boxes)),
+        "coarse_scale": round(coarse_scale, 6) if coarse_scale is not None else None,
+        "coarse_min_face": coarse_min_face
+    }
+    return merged, info
+
+def detect_faces_tiled(detector, image_path: str, **options) -> Dict[str, Any]:
+    """
+    Tiled variant of FaceDetector.detect_faces()
+
+    Args:
+        detector: Loaded FaceDetector
+        image_path: Path to input image
+        **options: Passed to detect_boxes_tiled()
+
+    Returns:
+        Dictionary with detection results in the detect_faces() format,
+        with tiling details under processing_info.tiling
+    """
+    try:
+        if not os.path.exists(image_path):
+            return detector._create_error_response(f"Image file not found: {image_path}")
+
+        # Decoding straight to grayscale avoids the BGR copy and cvtColor
+        gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return detector._create_error_response(f"Failed to read image: {image_path}")
+        gray = detection_engine.preprocess(gray, detector.profile)
+
+        faces, tiling = detect_boxes_tiled(detector, gray, **options)
+        # Report the shape detect_faces() sees: cv2.imread decodes to 3-channel BGR
+        response = detector._create_response(faces, gray.shape + (3,))
+        response["processing_info"]["tiling"] = tiling
+        return response
+
+    except Exception as e:
+        return detector._create_error_response(f"Error during face detection: {str(e)}")
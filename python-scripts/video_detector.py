@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Video Face Detection Script
+Author: Nguyen Tuan Khanh
+Description: Streams a video file through cv2.VideoCapture, runs the Haar
+             cascade only on keyframes (every K frames, or when tracking
+             confidence drops) and follows faces in between by template
+             matching inside the previous face regions.
+Output: One JSON object per frame (JSON lines)
+"""
+
+import cv2
+import numpy as np
+import json
+import sys
+import time
+import argparse
+from typing import Any, Dict, Iterator, List
+
+from face_detector import FaceDetector
+import nms
+
+class FaceTrack:
+    """A face followed across frames by template matching"""
+
+    def __init__(self, track_id: int, box: np.ndarray, gray: np.ndarray):
+        x, y, w, h = (int(v) for v in box)
+        self.track_id = track_id
+        self.box = (x, y, w, h)
+        self.template = gray[y:y + h, x:x + w].copy()
+        # A zero-variance template has no normalized correlation (NaN or a
+        # spurious 1.0 depending on the OpenCV build), so it cannot be tracked
+        self.trackable = self.template.size > 0 and float(self.template.std()) > 0.0
+        self.confidence = 1.0
+
+    def update(self, gray: np.ndarray, search_margin: float) -> float:
+        """
+        Locate the face in a new frame within a padded search window
+
+        Returns:
+            Normalized match score in [-1, 1]; the box is moved to the best match.
+            -1 means the track is lost (window too small or flat template)
+        """
+        x, y, w, h = self.box
+        pad_x, pad_y = int(w * search_margin), int(h * search_margin)
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1 = min(gray.shape[1], x + w + pad_x)
+        y1 = min(gray.shape[0], y + h + pad_y)
+
+        window = gray[y0:y1, x0:x1]
+        if not self.trackable or window.shape[0] < h or window.shape[1] < w:
+            self.confidence = -1.0
+            return self.confidence
+
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        # Flat window regions can still divide by zero
+        scores = np.nan_to_num(scores, nan=-1.0, posinf=1.0, neginf=-1.0)
+        _, max_score, _, (best_x, best_y) = cv2.minMaxLoc(scores)
+        self.box = (x0 + best_x, y0 + best_y, w, h)
+        self.confidence = float(max_score)
+        return self.confidence
+
+class VideoFaceDetector:
+    """Keyframe detection plus inter-frame tracking"""
+
+    def __init__(self, detector: FaceDetector, detect_interval: int = 10,
+                 min_confidence: float = 0.6, search_margin: float = 0.5):
+        """
+        Initialize video detector
+
+        Args:
+            detector: Loaded FaceDetector used on keyframes
+            detect_interval: Run the cascade at least every this many frames
+            min_confidence: Re-detect as soon as any track scores below this
+            search_margin: Search window padding as a fraction of the face size
+        """
+        self.detector = detector
+        self.detect_interval = max(1, detect_interval)
+        self.min_confidence = min_confidence
+        self.search_margin = search_margin
+        self.tracks: List[FaceTrack] = []
+        self._next_id = 0
+        self._frames_since_detect = None
+
+    def process_frame(self, gray: np.ndarray) -> str:
+        """
+        Update tracks for one grayscale frame
+
+        Returns:
+            "detect" if the cascade ran on this frame, otherwise "track"
+        """
+        needs_detection = (
+            self._frames_since_detect is None
+            or self._frames_since_detect + 1 >= self.detect_interval
+        )
+
+        if not needs_detection:
+            for track in self.tracks:
+                if track.update(gray, self.search_margin) < self.min_confidence:
+                    needs_detection = True
+                    break
+
+        if needs_detection:
+            self._detect(gray)
+            self._frames_since_detect = 0
+            return "detect"
+
+        self._frames_since_detect += 1
+        return "track"
+
+    def _detect(self, gray: np.ndarray) -> None:
+        """Run the cascade and keep track ids for faces that overlap a previous track"""
+        boxes = self.detector.detect_boxes(gray)
+        previous = self.tracks
+        self.tracks = []
+
+        if len(previous) > 0 and len(boxes) > 0:
+            previous_boxes = nms.as_box_array([track.box for track in previous])
+            overlaps = nms.overlap_matrix(np.concatenate([boxes, previous_boxes]), nms.OVERLAP_IOU)
+            overlaps = overlaps[:len(boxes), len(boxes):]
+        else:
+            overlaps = None
+
+        claimed = set()
+        for i, box in enumerate(boxes):
+            track_id = None
+            if overlaps is not None:
+                best = int(np.argmax(overlaps[i]))
+                if overlaps[i, best] > 0.3 and best not in claimed:
+                    claimed.add(best)
+                    track_id = previous[best].track_id
+            if track_id is None:
+                track_id = self._next_id
+                self._next_id += 1
+            self.tracks.append(FaceTrack(track_id, box, gray))
+
+    def faces(self) -> List[Dict[str, Any]]:
+        """Current faces in the response format"""
+        return [
+            {
+                "id": track.track_id,
+                "x": int(track.box[0]),
+                "y": int(track.box[1]),
+                "width": int(track.box[2]),
+                "height": int(track.box[3]),
+                "confidence": round(track.confidence, 4)
+            }
+            for track in self.tracks
+        ]
+
+    def iter_video(self, video_path: str, max_frames: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process a video file frame by frame
+
+        Yields:
+            Per-frame result dictionaries
+        """
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise IOError(f"Could not open video: {video_path}")
+
+        try:
+            frame_index = 0
+            while max_frames is None or frame_index < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+
+                timestamp_ms = capture.get(cv2.CAP_PROP_POS_MSEC)
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                source = self.process_frame(gray)
+                faces = self.faces()
+
+                yield {
+                    "frame": frame_index,
+                    "timestamp_ms": round(timestamp_ms, 2),
+                    "source": source,
+                    "face_count": len(faces),
+                    "faces": faces
+                }
+                frame_index += 1
+        finally:
+            capture.release()
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Video face detection with keyframe detection and tracking",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python video_detector.py clip.mp4 > faces.jsonl
+  python video_detector.py clip.mp4 --interval 15 --min-confidence 0.5
+  python create_test_video.py test_720p.mp4 && python video_detector.py test_720p.mp4 --benchmark
+        """
+    )
+
+    parser.add_argument('video_path', help='Path to input video file')
+    parser.add_argument('--cascade', '-c', help='Path to Haar Cascade XML file (optional)')
+    parser.add_argument('--interval', '-k', type=int, default=10,
+                        help='Run the cascade at least every K frames (default: 10)')
+    parser.add_argument('--min-confidence', type=float, default=0.6,
+                        help='Re-detect when a track match score drops below this (default: 0.6)')
+    parser.add_argument('--search-margin', type=float, default=0.5,
+                        help='Tracking search padding relative to face size (default: 0.5)')
+    parser.add_argument('--max-frames', type=int, help='Stop after this many frames')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Skip per-frame output and print a throughput summary')
+
+    return parser.parse_args()
+
+def main():
+    """Main function"""
+    args = parse_arguments()
+
+    try:
+        video = VideoFaceDetector(
+            FaceDetector(cascade_path=args.cascade),
+            detect_interval=args.interval,
+            min_confidence=args.min_confidence,
+            search_margin=args.search_margin
+        )
+
+        frames = 0
+        detect_frames = 0
+        started = time.perf_counter()
+        for result in video.iter_video(args.video_path, args.max_frames):
+            frames += 1
+            detect_frames += result["source"] == "detect"
+            if not args.benchmark:
+                sys.stdout.write(json.dumps(result) + "\n")
+        elapsed = time.perf_counter() - started
+
+    except Exception as e:
+        print(json.dumps({"success": False, "message": f"Video processing failed: {str(e)}"}))
+        sys.exit(1)
+
+    capture = cv2.VideoCapture(args.video_path)
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    capture.release()
+
+    fps = frames / elapsed if elapsed > 0 else 0.0
+    summary = {
+        "frames": frames,
+        "detect_frames": detect_frames,
+        "elapsed_seconds": round(elapsed, 3),
+        "fps": round(fps, 2),
+        "source_fps": round(source_fps, 2),
+        "realtime": bool(source_fps) and fps >= source_fps
+    }
+
+    if args.benchmark:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"✅ {frames} frames ({detect_frames} keyframes) at {fps:.1f} fps", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()